@@ -0,0 +1,117 @@
+"""
+Микробенчмарк разбора команд @gpt
+
+Сравнивает прежний разбор (четыре регулярных выражения по очереди со
+strip() на каждое, цепочка startswith для подкоманды и словарь из пяти
+промптов) с pl.commands.parse_command на корпусе исходящих сообщений, где
+команды - небольшая доля обычной переписки. Перед замером проверяет, что
+оба варианта дают одинаковый результат.
+
+Запуск: python benchmarks/bench_commands.py
+"""
+
+import os
+import re
+import sys
+import random
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pl.commands import parse_command  # noqa: E402
+
+
+LEGACY_PATTERNS = {
+    'context_hide': re.compile(r'^@gpt-context(?P<count>\d+)-hide(?P<nocache>-nocache)?\s+(?P<text>.+)', re.IGNORECASE | re.DOTALL),
+    'context': re.compile(r'^@gpt-context(?P<count>\d+)(?P<nocache>-nocache)?\s+(?P<text>.+)', re.IGNORECASE | re.DOTALL),
+    'hide': re.compile(r'^@gpt-hide(?P<nocache>-nocache)?\s+(?P<text>.+)', re.IGNORECASE | re.DOTALL),
+    'general': re.compile(r'^@gpt(?P<nocache>-nocache)?\s+(?P<text>.+)', re.IGNORECASE | re.DOTALL),
+}
+
+
+def legacy_parse(message_text: str):
+    """Прежний разбор из _process_message и _handle_*: (kind, count, use_cache, подкоманда, промпт)"""
+    for command_type, pattern in LEGACY_PATTERNS.items():
+        match = pattern.match(message_text.strip())
+        if match:
+            command_text = match.group('text').strip()
+            use_cache = match.group('nocache') is None
+            count = int(match.group('count')) if command_type.startswith('context') else None
+            sub = 'general'
+            content = command_text
+            if command_text.startswith('rewrite '):
+                sub, content = 'rewrite', command_text[8:].strip()
+            elif command_text.startswith('translate '):
+                sub, content = 'translate', command_text[10:].strip()
+            elif command_text.startswith('explain '):
+                sub, content = 'explain', command_text[8:].strip()
+            elif command_text.startswith('fix '):
+                sub, content = 'fix', command_text[4:].strip()
+            elif command_text.startswith('short '):
+                sub, content = 'short', command_text[6:].strip()
+            prompts = {
+                'rewrite': f"Переформулируй этот текст, чтобы он звучал более естественно и грамотно:\n\n{content}",
+                'translate': f"Переведи этот текст на русский язык:\n\n{content}",
+                'explain': f"Объясни простыми словами:\n\n{content}",
+                'fix': f"Исправь ошибки в этом тексте:\n\n{content}",
+                'short': f"Сократи этот текст, сохранив основную мысль:\n\n{content}",
+                'general': content
+            }
+            return command_type, count, use_cache, sub, prompts.get(sub, content)
+    return None
+
+
+def new_parse(message_text: str):
+    command = parse_command(message_text)
+    if command is None:
+        return None
+    return command.kind, command.context_count, command.use_cache, command.subcommand, command.prompt
+
+
+def build_corpus(size: int = 10_000, command_share: float = 0.05, seed: int = 1):
+    """Обычная переписка с примесью команд всех видов"""
+    rng = random.Random(seed)
+    chat = [
+        "привет", "ок", "да, давай завтра", "Созвонимся вечером?", "👍",
+        "Скинь, пожалуйста, ссылку на документ", "ахаха", "ну такое",
+        "Я сегодня не успею, давай перенесем на пятницу, если ты не против",
+        "https://example.com/some/long/link?utm_source=telegram",
+        "  отступ в начале", "@username глянь", "@gptbot это не команда",
+        "Длинное сообщение " * 40,
+    ]
+    commands = [
+        "@gpt как дела?", "@gpt rewrite привет я тут короче подумал",
+        "@gpt translate Hello, how are you?", "@GPT explain что такое DNS",
+        "@gpt-hide fix я не знаю че делать", "@gpt-nocache short " + "текст " * 50,
+        "@gpt-context15 о чем мы говорили?", "@gpt-context50-hide ответь коротко",
+        "@gpt-context10-nocache short итоги", "@gpt-hide-nocache explain ну и что",
+        "@gpt rewrite", "  @gpt   fix  ашибка  ", "@gpt\nмногострочный\nзапрос",
+    ]
+    return [
+        rng.choice(commands) if rng.random() < command_share else rng.choice(chat)
+        for _ in range(size)
+    ]
+
+
+def main():
+    corpus = build_corpus()
+    checks = build_corpus(size=2000, command_share=0.5, seed=2)
+    mismatches = [text for text in checks if legacy_parse(text) != new_parse(text)]
+    if mismatches:
+        raise SystemExit(f"Результаты разбора расходятся: {mismatches[:3]}")
+
+    print(f"Корпус: {len(corpus)} сообщений, команд {sum(1 for t in corpus if new_parse(t))}")
+    print(f"{'':>22} {'мкс на сообщение':>18}")
+    for title, parse in (("4 регулярки + цепочка", legacy_parse), ("parse_command", new_parse)):
+        elapsed = min(timeit.repeat(lambda: [parse(text) for text in corpus], number=5, repeat=5)) / 5
+        print(f"{title:>22} {elapsed / len(corpus) * 1e6:>18.3f}")
+
+    only_commands = [text for text in checks if new_parse(text)]
+    print(f"\nТолько команды ({len(only_commands)} сообщений):")
+    for title, parse in (("4 регулярки + цепочка", legacy_parse), ("parse_command", new_parse)):
+        elapsed = min(timeit.repeat(lambda: [parse(text) for text in only_commands], number=5, repeat=5)) / 5
+        print(f"{title:>22} {elapsed / len(only_commands) * 1e6:>18.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Бенчмарк защиты от повторной обработки сообщений автоответа
+
+Поток сообщений из CHATS чатов с id, растущими внутри каждого чата (как в
+Telegram). Сравнивает прежнее множество id с пересборкой
+set(list(...)[-500:]) при переполнении и RecentKeys по (chat_id, message_id):
+- среднюю стоимость сообщения при росте объема потока (у RecentKeys постоянна);
+- задержку одного сообщения по перцентилям (у прежнего варианта - пересборка множества);
+- сколько новых сообщений прежний вариант ошибочно принял за повторы.
+
+Запуск: python benchmarks/bench_dedupe.py
+"""
+
+import gc
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pl.dedupe import RecentKeys  # noqa: E402
+
+
+CHATS = 200
+CAPACITY = 5000
+
+
+def stream(total: int):
+    """(chat_id, message_id): чаты по очереди, id сообщений - свои в каждом чате"""
+    return [(i % CHATS, i // CHATS) for i in range(total)]
+
+
+class LegacyProcessed:
+    """Прежняя реализация из _process_auto_reply"""
+
+    def __init__(self):
+        self.processed = set()
+
+    def seen(self, chat_id: int, message_id: int) -> bool:
+        if message_id in self.processed:
+            return True
+        self.processed.add(message_id)
+        if len(self.processed) > 1000:
+            self.processed = set(list(self.processed)[-500:])
+        return False
+
+
+class RecentProcessed:
+
+    def __init__(self):
+        self.processed = RecentKeys(CAPACITY)
+
+    def seen(self, chat_id: int, message_id: int) -> bool:
+        return not self.processed.add((chat_id, message_id))
+
+
+def run(impl, messages) -> int:
+    dropped = 0
+    for chat_id, message_id in messages:
+        if impl.seen(chat_id, message_id):
+            dropped += 1
+    return dropped
+
+
+def tail_latency_us(impl, messages, quantile: float = 0.999) -> float:
+    """Задержка одного сообщения на заданном перцентиле (без пауз сборщика мусора)"""
+    samples = []
+    clock = time.perf_counter_ns
+    gc.disable()
+    try:
+        for chat_id, message_id in messages:
+            started = clock()
+            impl.seen(chat_id, message_id)
+            samples.append(clock() - started)
+    finally:
+        gc.enable()
+    samples.sort()
+    return samples[int(len(samples) * quantile)] / 1000
+
+
+def main():
+    print("Средняя стоимость сообщения, мкс")
+    print(f"{'сообщений':>10} {'set + пересборка':>18} {'RecentKeys':>12}")
+    for total in (10_000, 100_000, 1_000_000):
+        messages = stream(total)
+        runs = max(1, 1_000_000 // total)
+        legacy = min(timeit.repeat(lambda: run(LegacyProcessed(), messages), number=runs, repeat=3))
+        recent = min(timeit.repeat(lambda: run(RecentProcessed(), messages), number=runs, repeat=3))
+        print(f"{total:>10} {legacy / runs / total * 1e6:>18.3f} {recent / runs / total * 1e6:>12.3f}")
+
+    # Уникальные id: прежний вариант пересобирает множество каждые ~500 сообщений
+    unique = [(0, i) for i in range(200_000)]
+    print("\nЗадержка одного сообщения (уникальные id), мкс")
+    print(f"{'':>18} {'p50':>8} {'p99':>8} {'p99.9':>8}")
+    for title, impl in (("set + пересборка", LegacyProcessed), ("RecentKeys", RecentProcessed)):
+        row = [tail_latency_us(impl(), unique, q) for q in (0.5, 0.99, 0.999)]
+        print(f"{title:>18} " + " ".join(f"{value:>8.2f}" for value in row))
+
+    messages = stream(100_000)
+    print("\nНовые сообщения, принятые за повторы (из 100000)")
+    print(f"  set + пересборка: {run(LegacyProcessed(), messages)}")
+    print(f"  RecentKeys:       {run(RecentProcessed(), messages)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Время холодного старта CLI
+
+Для каждой команды CLI запускает отдельный интерпретатор с
+python -X importtime, импортирует то же, что импортирует команда
+(без сетевых запросов), и берет медиану нескольких запусков. Показывает
+самые дорогие модули команды ask и полное время python -m pl.cli --help.
+Код возврата 1, если импорт для ask/balance дольше порога.
+
+Запуск: python benchmarks/bench_import_time.py [--runs 7] [--budget-ms 150]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+from typing import List, Tuple
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Что импортирует каждая команда CLI
+COMMANDS = {
+    "--help": "import pl.cli",
+    "ask/balance": "import pl.cli; from pl.proxy_api import ProxyAPIClient",
+    "telegram": "import pl.cli; from pl.telegram_client import TelegramUserBot",
+}
+
+
+def import_times(code: str) -> List[Tuple[str, int, int, int]]:
+    """(модуль, глубина вложенности, собственное мкс, накопленное мкс) для каждого импорта"""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name[1:]
+        depth = (len(name) - len(name.lstrip())) // 2
+        times.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return times
+
+
+def command_ms(code: str, runs: int) -> float:
+    """Медиана времени импортов из строки code, мс"""
+    targets = {statement.split()[1] for statement in code.split(";")}
+    samples = []
+    for _ in range(runs):
+        samples.append(sum(cumulative for name, depth, _, cumulative in import_times(code)
+                           if depth == 0 and name in targets) / 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время холодного старта CLI")
+    parser.add_argument("--runs", type=int, default=7, help="Запусков на команду (медиана)")
+    parser.add_argument("--budget-ms", type=float, default=150.0,
+                        help="Порог времени импорта для ask/balance, мс")
+    args = parser.parse_args()
+
+    print(f"{'команда':>12} {'импорт, мс':>12}")
+    results = {}
+    for command, code in COMMANDS.items():
+        results[command] = command_ms(code, args.runs)
+        print(f"{command:>12} {results[command]:>12.1f}")
+
+    times = import_times(COMMANDS["ask/balance"])
+    print("\nСамые дорогие модули ask/balance (собственное время, мс):")
+    for name, _, self_us, _ in sorted(times, key=lambda item: -item[2])[:10]:
+        print(f"  {self_us / 1000:>8.1f}  {name}")
+
+    samples = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "pl.cli", "--help"], cwd=ROOT,
+                       capture_output=True, check=True)
+        samples.append((time.perf_counter() - started) * 1000)
+    print(f"\npython -m pl.cli --help: {statistics.median(samples):.1f} мс (вместе с запуском интерпретатора)")
+
+    if results["ask/balance"] > args.budget_ms:
+        print(f"❌ Импорт ask/balance {results['ask/balance']:.1f} мс больше порога {args.budget_ms:.0f} мс")
+        sys.exit(1)
+    print(f"✅ Импорт ask/balance укладывается в {args.budget_ms:.0f} мс")
+
+
+if __name__ == "__main__":
+    main()
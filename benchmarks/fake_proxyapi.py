@@ -0,0 +1,189 @@
+"""
+Локальный стенд ProxyAPI для нагрузочного тестирования
+
+Отвечает на те же запросы, что и api.proxyapi.ru, без обращения к модели:
+- POST /openai/v1/chat/completions - ответ целиком или SSE поток (stream: true);
+- GET /proxyapi/balance - фиксированный баланс;
+- GET /_stats - счетчики запросов стенда (для отчета нагрузочного теста).
+
+Задержка ответа берется из логнормального распределения с медианой
+--latency-ms и разбросом --latency-sigma (0 - постоянная задержка), в потоке
+она делится между первым фрагментом и остальными. Доли ответов 429 (с
+Retry-After) и 5xx задаются --error-429 и --error-5xx.
+
+Бот направляется на стенд переменной PROXY_API_BASE_URL:
+    python benchmarks/fake_proxyapi.py --port 8081 --latency-ms 400 --error-429 0.05
+    PROXY_API_BASE_URL=http://127.0.0.1:8081 python -m pl.web_main
+"""
+
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter
+from typing import Dict, Any
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+
+class FakeProxyAPI:
+    """Приложение стенда с настраиваемыми задержкой, ошибками и длиной ответа"""
+
+    def __init__(self, latency_ms: float = 300.0, latency_sigma: float = 0.5, error_429: float = 0.0,
+                 error_5xx: float = 0.0, retry_after: float = 1.0, reply_tokens: int = 60,
+                 stream_chunks: int = 10, seed: int = 0):
+        """
+        Args:
+            latency_ms: Медиана задержки ответа, мс
+            latency_sigma: Разброс логнормального распределения задержки (0 - без разброса)
+            error_429: Доля ответов 429 Too Many Requests
+            error_5xx: Доля ответов 500/502/503
+            retry_after: Значение Retry-After для 429, секунды
+            reply_tokens: Примерная длина ответа в словах
+            stream_chunks: На сколько фрагментов делить ответ в потоке
+            seed: Начальное значение генератора случайных чисел
+        """
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_429 = error_429
+        self.error_5xx = error_5xx
+        self.retry_after = retry_after
+        self.reply_tokens = reply_tokens
+        self.stream_chunks = max(1, stream_chunks)
+        self.rng = random.Random(seed)
+
+        self.responses: Counter = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.started = time.time()
+
+        self.app = Starlette(routes=[
+            Route("/openai/v1/chat/completions", self.completions, methods=["POST"]),
+            Route("/proxyapi/balance", self.balance, methods=["GET"]),
+            Route("/_stats", self.stats, methods=["GET"]),
+        ])
+
+    def _latency(self) -> float:
+        """Задержка очередного ответа, секунды"""
+        if self.latency_sigma <= 0:
+            return self.latency_ms / 1000
+        return self.rng.lognormvariate(0.0, self.latency_sigma) * self.latency_ms / 1000
+
+    def _error(self):
+        """Ответ с ошибкой или None, если запрос нужно обслужить"""
+        roll = self.rng.random()
+        if roll < self.error_429:
+            self.responses["429"] += 1
+            return JSONResponse({"error": {"message": "Rate limit exceeded"}}, status_code=429,
+                                headers={"Retry-After": str(self.retry_after)})
+        if roll < self.error_429 + self.error_5xx:
+            status = self.rng.choice((500, 502, 503))
+            self.responses[str(status)] += 1
+            return JSONResponse({"error": {"message": "Upstream error"}}, status_code=status)
+        return None
+
+    def _reply(self, prompt: str) -> str:
+        words = ["ответ", "стенда", "на", "запрос", "из", f"{len(prompt)}", "символов"]
+        return " ".join(words[i % len(words)] for i in range(self.reply_tokens))
+
+    async def completions(self, request: Request):
+        payload = await request.json()
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            latency = self._latency()
+            error = self._error()
+            if error is not None:
+                await asyncio.sleep(latency / 4)
+                return error
+
+            prompt = payload["messages"][-1]["content"]
+            text = self._reply(prompt)
+            usage = {
+                "prompt_tokens": len(prompt) // 4,
+                "completion_tokens": self.reply_tokens,
+                "total_tokens": len(prompt) // 4 + self.reply_tokens,
+            }
+
+            if payload.get("stream"):
+                self.responses["200 stream"] += 1
+                # Первый фрагмент - после половины задержки, остальные равномерно
+                await asyncio.sleep(latency / 2)
+                return StreamingResponse(self._stream(text, usage, latency / 2),
+                                         media_type="text/event-stream")
+
+            await asyncio.sleep(latency)
+            self.responses["200"] += 1
+            return JSONResponse({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "model": payload.get("model"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": text}}],
+                "usage": usage,
+            })
+        finally:
+            self.in_flight -= 1
+
+    async def _stream(self, text: str, usage: Dict[str, int], duration: float):
+        words = text.split(" ")
+        size = max(1, len(words) // self.stream_chunks)
+        for i in range(0, len(words), size):
+            if i:
+                await asyncio.sleep(duration / self.stream_chunks)
+            delta = " ".join(words[i:i + size]) + " "
+            chunk = {"choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        yield f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    async def balance(self, request: Request):
+        self.responses["balance"] += 1
+        return JSONResponse({"balance": 1000.0})
+
+    async def stats(self, request: Request):
+        return JSONResponse(self.get_stats())
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "responses": dict(self.responses),
+            "max_in_flight": self.max_in_flight,
+            "uptime_seconds": round(time.time() - self.started, 1),
+        }
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Параметры стенда (общие со скриптом нагрузочного теста)"""
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Медиана задержки ответа, мс")
+    parser.add_argument("--latency-sigma", type=float, default=0.5,
+                        help="Разброс логнормальной задержки (0 - постоянная)")
+    parser.add_argument("--error-429", type=float, default=0.0, help="Доля ответов 429")
+    parser.add_argument("--error-5xx", type=float, default=0.0, help="Доля ответов 500/502/503")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After для 429, секунды")
+    parser.add_argument("--reply-tokens", type=int, default=60, help="Длина ответа в словах")
+    parser.add_argument("--stream-chunks", type=int, default=10, help="Фрагментов в потоковом ответе")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный стенд ProxyAPI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    fake = FakeProxyAPI(
+        latency_ms=args.latency_ms, latency_sigma=args.latency_sigma,
+        error_429=args.error_429, error_5xx=args.error_5xx, retry_after=args.retry_after,
+        reply_tokens=args.reply_tokens, stream_chunks=args.stream_chunks
+    )
+    print(f"🧪 Стенд ProxyAPI: http://{args.host}:{args.port}")
+    uvicorn.run(fake.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
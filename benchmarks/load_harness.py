@@ -0,0 +1,407 @@
+"""
+Нагрузочный тест TelegramUserBotWithAutoReply без Telegram и платного API
+
+Бот работает против локального стенда ProxyAPI (benchmarks/fake_proxyapi.py,
+запускается отдельным процессом, адрес передается через PROXY_API_BASE_URL),
+а события NewMessage строятся как обновления Telegram (UpdateNewMessage с
+сущностями отправителя) и проходят через диспетчер Telethon - те же
+фильтры и обработчики, что и в работе. Вызовы Telegram API (правка и
+отправка сообщений, индикатор набора, загрузка истории) подменяются
+заглушками, которые только фиксируют время.
+
+Режимы:
+- general, hide, context - исходящие команды @gpt, @gpt-hide, @gpt-context10;
+  задержка - от события до окончания обработчика (последней правки);
+- auto_reply - входящие сообщения в чатах с автоответом; задержка - от
+  сообщения до отправки ответа (сообщения, объединенные в один ход,
+  получают ответ вместе). Окно накопления и случайная задержка ответа
+  задаются --debounce и --reply-delay; имитация набора (1 с) остается.
+
+События приходят с интенсивностью --rate в секунду (пуассоновский поток)
+в течение --duration секунд в --chats чатов. Для каждого режима выводятся
+пропускная способность, перцентили задержки и доля ошибок, а также ответы
+стенда (429/5xx), повторы и очередь планировщика.
+
+Запуск:
+    python benchmarks/load_harness.py --rate 5 --duration 20
+    python benchmarks/load_harness.py --modes auto_reply --chats 50 --rate 20 --error-429 0.05
+    python benchmarks/load_harness.py --no-stream --latency-ms 800 --json report.json
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import random
+import asyncio
+import argparse
+import contextlib
+import subprocess
+import statistics
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Dict, List, Any, Optional, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_proxyapi import add_arguments  # noqa: E402
+
+MODES = ("general", "hide", "context", "auto_reply")
+COMMANDS = {
+    "general": "@gpt как дела, вопрос {n}?",
+    "hide": "@gpt-hide ответь коротко на {n}",
+    "context": "@gpt-context10 о чем мы говорили, {n}?",
+}
+SELF_ID = 1
+FIRST_CHAT_ID = 1000
+HISTORY_SIZE = 50
+
+
+class FakeAction:
+    """Заглушка client.action(chat_id, 'typing')"""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class ModeStats:
+    """Задержки и исходы событий одного режима"""
+
+    def __init__(self):
+        self.sent = 0
+        self.completed = 0
+        self.errors = 0
+        self.latencies: List[float] = []
+
+    def done(self, latency: float, ok: bool = True):
+        self.completed += 1
+        if ok:
+            self.latencies.append(latency)
+        else:
+            self.errors += 1
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+
+        def percentile(q: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 1)
+
+        return {
+            "events": self.sent,
+            "completed": self.completed,
+            "errors": self.errors,
+            "unfinished": self.sent - self.completed,
+            "error_rate": round(self.errors / self.completed, 4) if self.completed else 0.0,
+            "throughput_per_s": round((self.completed - self.errors) / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": {
+                "p50": percentile(0.5),
+                "p90": percentile(0.9),
+                "p99": percentile(0.99),
+                "max": round(latencies[-1] * 1000, 1) if latencies else None,
+                "mean": round(statistics.mean(latencies) * 1000, 1) if latencies else None,
+            },
+        }
+
+
+class SyntheticTelegram:
+    """
+    Источник событий Telegram для бота
+
+    Подменяет сетевые методы TelegramClient бота, регистрирует обработчики
+    и отдает боту обновления UpdateNewMessage через диспетчер Telethon.
+    """
+
+    def __init__(self, bot, chats: int):
+        from telethon.tl import types
+
+        self.types = types
+        self.bot = bot
+        self.chat_ids = [FIRST_CHAT_ID + i for i in range(chats)]
+        self.users = {
+            chat_id: types.User(id=chat_id, first_name=f"Собеседник{chat_id}", access_hash=chat_id)
+            for chat_id in self.chat_ids
+        }
+        self.me = types.User(id=SELF_ID, first_name="Я", access_hash=SELF_ID, is_self=True)
+        self._next_id = HISTORY_SIZE + 1
+
+        # Входящие сообщения, ожидающие автоответа: чат -> [время получения]
+        self.awaiting_reply: Dict[int, List[float]] = {}
+        self.auto_reply_stats = ModeStats()
+        # Правки исходящих команд: id сообщения -> тексты правок
+        self._edits_by_message: Dict[int, List[str]] = {}
+        self.edits = 0
+
+        client = bot.client
+        client._mb_entity_cache.set_self_user(SELF_ID, False, SELF_ID)
+        client.action = lambda *args, **kwargs: FakeAction()
+        client.edit_message = self._edit_message
+        client.send_message = self._send_message
+        client.iter_messages = self._iter_messages
+        client.get_entity = self._get_entity
+
+    def install(self, auto_reply_settings: Dict[str, Any]):
+        """Зарегистрировать обработчики и включить автоответ во всех чатах"""
+        self.bot._register_handlers()
+        self.bot.auto_reply_settings.update(auto_reply_settings)
+        for chat_id in self.chat_ids:
+            self.bot.add_auto_reply_chat(chat_id, self.users[chat_id].first_name)
+
+    def _message(self, chat_id: int, text: str, out: bool):
+        types = self.types
+        self._next_id += 1
+        message = types.Message(
+            id=self._next_id,
+            peer_id=types.PeerUser(chat_id),
+            date=datetime.now(timezone.utc),
+            message=text,
+            out=out,
+            from_id=types.PeerUser(SELF_ID if out else chat_id),
+        )
+        update = types.UpdateNewMessage(message=message, pts=self._next_id, pts_count=1)
+        update._entities = {chat_id: self.users[chat_id], SELF_ID: self.me}
+        return update
+
+    async def command(self, chat_id: int, text: str) -> bool:
+        """Исходящая команда; True, если обработчик закончил без ошибки"""
+        update = self._message(chat_id, text, out=True)
+        edits: List[str] = []
+        self._edits_by_message[update.message.id] = edits
+        try:
+            await self.bot.client._dispatch_update(update)
+        finally:
+            self._edits_by_message.pop(update.message.id, None)
+        return bool(edits) and not edits[-1].startswith("❌")
+
+    async def incoming(self, chat_id: int, text: str):
+        """Входящее сообщение в чат с автоответом"""
+        self.auto_reply_stats.sent += 1
+        self.awaiting_reply.setdefault(chat_id, []).append(time.monotonic())
+        await self.bot.client._dispatch_update(self._message(chat_id, text, out=False))
+
+    def fail_awaiting(self, chat_id: int):
+        """Ход автоответа чата завершился ошибкой"""
+        for _ in self.awaiting_reply.pop(chat_id, []):
+            self.auto_reply_stats.done(0.0, ok=False)
+
+    async def _edit_message(self, entity, message, text=None, *args, **kwargs):
+        self.edits += 1
+        edits = self._edits_by_message.get(message if isinstance(message, int) else message.id)
+        if edits is not None:
+            edits.append(text or "")
+
+    async def _send_message(self, entity, message, *args, **kwargs):
+        chat_id = entity if isinstance(entity, int) else getattr(entity, "id", entity)
+        now = time.monotonic()
+        for received in self.awaiting_reply.pop(chat_id, []):
+            self.auto_reply_stats.done(now - received)
+
+    async def _iter_messages(self, entity, limit=None, **kwargs):
+        # История чата: собеседник и пользователь по очереди
+        chat_id = entity if isinstance(entity, int) else getattr(entity, "id", entity)
+        for msg_id in range(min(limit or HISTORY_SIZE, HISTORY_SIZE), 0, -1):
+            out = msg_id % 2 == 0
+            yield SimpleNamespace(
+                id=msg_id, out=out, sender_id=SELF_ID if out else chat_id,
+                sender=self.me if out else self.users.get(chat_id),
+                message=f"сообщение истории {msg_id}: " + "слово " * (5 + msg_id % 15),
+            )
+
+    async def _get_entity(self, ids):
+        if isinstance(ids, list):
+            return [self.users.get(i, self.me) for i in ids]
+        return self.users.get(ids, self.me)
+
+
+def free_port() -> int:
+    with contextlib.closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_fake_server(args) -> Tuple[subprocess.Popen, str]:
+    """Запустить стенд ProxyAPI отдельным процессом и дождаться готовности"""
+    import httpx
+
+    port = free_port()
+    command = [
+        sys.executable, os.path.join(BENCH_DIR, "fake_proxyapi.py"), "--port", str(port),
+        "--latency-ms", str(args.latency_ms), "--latency-sigma", str(args.latency_sigma),
+        "--error-429", str(args.error_429), "--error-5xx", str(args.error_5xx),
+        "--retry-after", str(args.retry_after), "--reply-tokens", str(args.reply_tokens),
+        "--stream-chunks", str(args.stream_chunks),
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{base_url}/_stats", timeout=1)
+            return process, base_url
+        except httpx.HTTPError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+    process.kill()
+    raise Exception("Стенд ProxyAPI не запустился")
+
+
+async def run_mode(source: SyntheticTelegram, mode: str, args, rng: random.Random) -> Dict[str, Any]:
+    """Подать поток событий одного режима и собрать статистику"""
+    stats = ModeStats() if mode != "auto_reply" else source.auto_reply_stats
+    errors_before = source.bot.event_log.count(_auto_reply_error_kind())
+    tasks = []
+
+    async def command(chat_id: int, text: str):
+        started = time.monotonic()
+        ok = await source.command(chat_id, text)
+        stats.done(time.monotonic() - started, ok)
+
+    started = time.monotonic()
+    n = 0
+    while time.monotonic() - started < args.duration:
+        n += 1
+        chat_id = rng.choice(source.chat_ids)
+        if mode == "auto_reply":
+            await source.incoming(chat_id, f"привет, сообщение {n}")
+        else:
+            stats.sent += 1
+            tasks.append(asyncio.create_task(command(chat_id, COMMANDS[mode].format(n=n))))
+        await asyncio.sleep(rng.expovariate(args.rate))
+
+    # Дожидаемся завершения начатых обработок
+    drain_deadline = time.monotonic() + args.drain
+    if tasks:
+        await asyncio.wait(tasks, timeout=args.drain)
+    while mode == "auto_reply" and source.awaiting_reply and time.monotonic() < drain_deadline:
+        # Ходы, завершившиеся ошибкой, не отправляют ответ: снимаем их ожидание
+        for chat_id in list(source.awaiting_reply):
+            if chat_id not in source.bot._reply_tasks:
+                source.fail_awaiting(chat_id)
+        await asyncio.sleep(0.05)
+    elapsed = time.monotonic() - started
+
+    report = stats.report(elapsed)
+    if mode == "auto_reply":
+        report["error_events"] = source.bot.event_log.count(_auto_reply_error_kind()) - errors_before
+    return report
+
+
+def _auto_reply_error_kind():
+    from pl.events import EventKind
+    return EventKind.AUTO_REPLY_ERROR
+
+
+async def run(args) -> Dict[str, Any]:
+    from telethon.sessions import MemorySession
+    from pl import http_pool
+    from pl.accounts import AccountConfig
+    from pl.retry import get_retry_executor
+    from pl.llm_scheduler import get_scheduler
+    from pl.telegram_client import TelegramUserBotWithAutoReply
+
+    account = AccountConfig(name="load", api_id="1", api_hash="load", phone=None, session=MemorySession())
+    bot = TelegramUserBotWithAutoReply(account)
+    bot.stream_responses = args.stream
+    source = SyntheticTelegram(bot, args.chats)
+
+    rng = random.Random(args.seed)
+    results = {}
+    # Журнал бота (print) не смешивается с отчетом
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        source.install({
+            "enabled": True,
+            "debounce_seconds": args.debounce,
+            "delay_min": args.reply_delay,
+            "delay_max": args.reply_delay,
+        })
+        for mode in args.modes:
+            print(f"▶️ Режим {mode}: {args.rate}/с, {args.duration} с, чатов {args.chats}", file=sys.stderr)
+            results[mode] = await run_mode(source, mode, args, rng)
+
+    for task in list(bot._reply_tasks.values()):
+        task.cancel()
+    await http_pool.aclose()
+
+    return {
+        "modes": results,
+        "retry": get_retry_executor().get_stats(),
+        "scheduler": get_scheduler().get_stats(),
+        "telegram_edits": source.edits,
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"{'режим':<11} {'событий':>8} {'готово':>7} {'ошибки':>7} {'в сек':>7} "
+          f"{'p50 мс':>8} {'p90 мс':>8} {'p99 мс':>8} {'max мс':>8}")
+    for mode, data in report["modes"].items():
+        latency = data["latency_ms"]
+        cells = [latency[key] if latency[key] is not None else "-" for key in ("p50", "p90", "p99", "max")]
+        print(f"{mode:<11} {data['events']:>8} {data['completed']:>7} "
+              f"{data['error_rate'] * 100:>6.1f}% {data['throughput_per_s']:>7} "
+              f"{cells[0]:>8} {cells[1]:>8} {cells[2]:>8} {cells[3]:>8}")
+
+    server = report["server"]
+    retry = report["retry"]
+    print(f"\nСтенд ProxyAPI: {server['responses']}, одновременно до {server['max_in_flight']}")
+    print(f"Повторы: {retry['retries']} {retry['retries_by_reason']}, сдались: {retry['gave_up']}, "
+          f"отклонено circuit breaker: {retry['rejected_by_breaker']}, breaker: {retry['breaker']['state']}")
+    print(f"Планировщик: до {report['scheduler']['max_in_flight']} запросов одновременно")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота против локального стенда ProxyAPI")
+    parser.add_argument("--modes", default=",".join(MODES),
+                        help=f"Режимы через запятую ({', '.join(MODES)})")
+    parser.add_argument("--rate", type=float, default=5.0, help="Событий в секунду")
+    parser.add_argument("--duration", type=float, default=10.0, help="Длительность режима, секунды")
+    parser.add_argument("--drain", type=float, default=30.0,
+                        help="Сколько ждать завершения начатых обработок, секунды")
+    parser.add_argument("--chats", type=int, default=20, help="Число чатов")
+    parser.add_argument("--stream", action=argparse.BooleanOptionalAction, default=True,
+                        help="Потоковые ответы на команды (STREAM_RESPONSES)")
+    parser.add_argument("--debounce", type=float, default=0.0, help="Окно накопления автоответа, секунды")
+    parser.add_argument("--reply-delay", type=int, default=0, help="Задержка перед автоответом, секунды")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_path", help="Записать отчет в JSON файл")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    args.modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in args.modes if mode not in MODES]
+    if unknown:
+        parser.error(f"Неизвестные режимы: {', '.join(unknown)}")
+
+    process, base_url = start_fake_server(args)
+    try:
+        os.environ["PROXY_API_BASE_URL"] = base_url
+        os.environ.setdefault("PROXY_API_KEY", "load")
+        os.environ.setdefault("TELEGRAM_API_ID", "1")
+        os.environ.setdefault("TELEGRAM_API_HASH", "load")
+        os.environ["BOT_STATE_PATH"] = ""
+
+        report = asyncio.run(run(args))
+
+        import httpx
+        report["server"] = httpx.get(f"{base_url}/_stats", timeout=5).json()
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Отчет записан в {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
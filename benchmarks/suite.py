@@ -0,0 +1,311 @@
+"""
+Набор микробенчмарков горячих путей бота с сохраненными базовыми значениями
+
+Случаи (время на одну операцию, мкс):
+- commands.process_message - фильтр и разбор исходящих сообщений в
+  TelegramUserBotAdvanced._process_message (корпус из bench_commands.py,
+  ответ модели не запрашивается);
+- prompts.handle_general/hide/context - сборка промпта в _handle_* до
+  вызова модели (с контекстом из кэша истории для -context<N>);
+- context.command/auto_reply - строка контекста в _get_context_messages
+  и _get_auto_reply_context из кэша истории с фейковыми сообщениями;
+- dedupe.churn - processed_messages автоответа на потоке из bench_dedupe.py;
+- events.add_log - add_log веб интерфейса при заполненном журнале;
+- proxy_api.generate_text - сборка запроса и разбор ответа
+  ProxyAPIClient.generate_text через httpx.MockTransport (без сети).
+
+Результаты сравниваются с benchmarks/baseline.json: случай медленнее
+базового значения больше чем на --tolerance процентов считается регрессией
+(код возврата 1). Базовые значения зависят от машины - после смены окружения
+их нужно перезаписать через --save.
+
+Запуск:
+    python benchmarks/suite.py                    # замер и сравнение
+    python benchmarks/suite.py --save             # записать базовые значения
+    python benchmarks/suite.py -k context         # только случаи с "context" в имени
+"""
+
+import os
+import sys
+import json
+import asyncio
+import argparse
+import platform
+import contextlib
+import timeit
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+# Учетные данные не используются: сеть подменяется, сессия Telegram в памяти
+os.environ.setdefault("PROXY_API_KEY", "bench")
+os.environ.setdefault("TELEGRAM_API_ID", "1")
+os.environ.setdefault("TELEGRAM_API_HASH", "bench")
+os.environ["BOT_STATE_PATH"] = ""
+
+import httpx  # noqa: E402
+from telethon.sessions import MemorySession  # noqa: E402
+
+from pl import http_pool  # noqa: E402
+from pl.accounts import AccountConfig  # noqa: E402
+from pl.commands import parse_command  # noqa: E402
+from pl.dedupe import RecentKeys  # noqa: E402
+from pl.proxy_api import ProxyAPIClient  # noqa: E402
+from pl.telegram_client import TelegramUserBotWithAutoReply  # noqa: E402
+from bench_commands import build_corpus  # noqa: E402
+from bench_dedupe import stream, CAPACITY  # noqa: E402
+
+
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+CHAT_ID = 1000
+
+# Случай: имя -> функция подготовки, возвращающая (замеряемая функция, операций за вызов)
+Case = Callable[[], Tuple[Callable[[], None], int]]
+CASES: Dict[str, Case] = {}
+
+
+def case(name: str):
+    def register(setup: Case) -> Case:
+        CASES[name] = setup
+        return setup
+    return register
+
+
+class FakeAction:
+    """Заглушка client.action(chat_id, 'typing')"""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def fake_message(msg_id: int, text: str, out: bool = False, sender_id: int = 42):
+    sender = SimpleNamespace(first_name=f"Собеседник{sender_id}")
+    return SimpleNamespace(id=msg_id, out=out, sender_id=sender_id, sender=sender, message=text)
+
+
+def fake_event(text: str, msg_id: int = 10_000, out: bool = True):
+    message = fake_message(msg_id, text, out=out)
+    return SimpleNamespace(chat_id=CHAT_ID, message=message, out=out)
+
+
+def make_bot(history: int = 200) -> TelegramUserBotWithAutoReply:
+    """Бот без сети: сессия в памяти, история чата CHAT_ID в кэше, ответы модели не запрашиваются"""
+    account = AccountConfig(name="bench", api_id="1", api_hash="bench", phone=None, session=MemorySession())
+    bot = TelegramUserBotWithAutoReply(account)
+    bot.client.action = lambda *args, **kwargs: FakeAction()
+    bot.history.backfill(CHAT_ID, [
+        fake_message(i, f"сообщение {i}: " + "слово " * (5 + i % 20), out=i % 3 == 0, sender_id=40 + i % 4)
+        for i in range(history)
+    ])
+    return bot
+
+
+def run_async(make_coro: Callable[[], object], times: int) -> Callable[[], None]:
+    """Замеряемая функция: times раз выполнить корутину в одном event loop"""
+    loop = asyncio.new_event_loop()
+
+    async def batch():
+        for _ in range(times):
+            await make_coro()
+
+    return lambda: loop.run_until_complete(batch())
+
+
+@case("commands.process_message")
+def bench_process_message():
+    bot = make_bot()
+
+    async def dispatched(event, command):
+        return command
+
+    bot._dispatch_command = dispatched
+    events = [fake_event(text) for text in build_corpus(size=2000)]
+
+    async def batch():
+        for event in events:
+            if bot._command_filter(event):
+                await bot._process_message(event)
+
+    loop = asyncio.new_event_loop()
+    return lambda: loop.run_until_complete(batch()), len(events)
+
+
+def _handler_case(handler_name: str, text: str):
+    bot = make_bot()
+
+    async def generate_and_edit(event, client, prompt, **kwargs):
+        return prompt
+
+    bot._generate_and_edit = generate_and_edit
+    handler = getattr(bot, handler_name)
+    command = parse_command(text)
+    event = fake_event(text)
+    return run_async(lambda: handler(event, command), 200), 200
+
+
+@case("prompts.handle_general")
+def bench_handle_general():
+    return _handler_case("_handle_command", "@gpt rewrite " + "короче я тут подумал " * 10)
+
+
+@case("prompts.handle_hide")
+def bench_handle_hide():
+    return _handler_case("_handle_hide_command", "@gpt-hide explain что такое DNS")
+
+
+@case("prompts.handle_context")
+def bench_handle_context():
+    return _handler_case("_handle_context_command", "@gpt-context20 о чем мы говорили?")
+
+
+@case("context.command")
+def bench_context_command():
+    bot = make_bot()
+    event = fake_event("@gpt-context30 итоги")
+    reserved = bot.normal_client.system_prompt + "итоги"
+    return run_async(lambda: bot._get_context_messages(event, 30, reserved_text=reserved), 200), 200
+
+
+@case("context.auto_reply")
+def bench_context_auto_reply():
+    bot = make_bot()
+    event = fake_event("как дела?", out=False)
+    reserved = bot.auto_reply_client.system_prompt + "как дела?"
+    return run_async(lambda: bot._get_auto_reply_context(event, reserved_text=reserved), 200), 200
+
+
+@case("dedupe.churn")
+def bench_dedupe_churn():
+    messages = stream(50_000)
+
+    def churn():
+        processed = RecentKeys(CAPACITY)
+        for key in messages:
+            processed.add(key)
+
+    return churn, len(messages)
+
+
+@case("events.add_log")
+def bench_add_log():
+    from pl.web_interface import add_log, bot_logs
+
+    for i in range(bot_logs.capacity):
+        add_log("INFO", f"заполнение {i}")
+    messages = [f"🤖 Автоответ в чат {i % 50}: " + "текст " * (i % 10) for i in range(5000)]
+    levels = ["INFO", "INFO", "INFO", "WARNING", "ERROR"]
+
+    def load():
+        for i, message in enumerate(messages):
+            add_log(levels[i % 5], message)
+
+    return load, len(messages)
+
+
+@case("proxy_api.generate_text")
+def bench_generate_text():
+    body = json.dumps({
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": " Ответ модели " * 40},
+        }],
+        "usage": {"prompt_tokens": 120, "completion_tokens": 160, "total_tokens": 280},
+    }).encode()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=body, headers={"Content-Type": "application/json"})
+
+    http_pool.configure(transport=httpx.MockTransport(handler))
+    http_pool.close()
+    client = ProxyAPIClient()
+    prompt = "Переведи этот текст на русский язык:\n\n" + "Hello, how are you? " * 20
+
+    def generate():
+        for _ in range(200):
+            client.generate_text(prompt, max_tokens=500)
+
+    return generate, 200
+
+
+def measure(setup: Case, repeat: int) -> float:
+    """Лучшее время одной операции, мкс (print из кода бота уходит в /dev/null)"""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        func, ops = setup()
+        timer = timeit.Timer(func)
+        number, _ = timer.autorange()  # Прогрев и число вызовов на замер (от 0.2 с)
+        timings = timer.repeat(repeat=repeat, number=number)
+    return min(timings) / number / ops * 1e6
+
+
+def load_baseline() -> Dict[str, float]:
+    try:
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            return json.load(f)["cases"]
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(results: Dict[str, float]):
+    cases = load_baseline()
+    cases.update({name: round(value, 3) for name, value in results.items()})
+    data = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cases": dict(sorted(cases.items())),
+    }
+    with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки горячих путей бота")
+    parser.add_argument("-k", dest="filter", default="", help="Только случаи, имя которых содержит строку")
+    parser.add_argument("--repeat", type=int, default=7, help="Повторов замера (берется лучший)")
+    parser.add_argument("--tolerance", type=float, default=30.0,
+                        help="Допустимое замедление относительно базового значения, %%")
+    parser.add_argument("--save", action="store_true", help="Записать результаты как базовые значения")
+    args = parser.parse_args()
+
+    baseline = load_baseline()
+    results: Dict[str, float] = {}
+    regressions: List[str] = []
+
+    print(f"{'случай':<28} {'мкс/оп':>10} {'база':>10} {'изменение':>10}")
+    for name, setup in CASES.items():
+        if args.filter not in name:
+            continue
+        results[name] = value = measure(setup, args.repeat)
+        base = baseline.get(name)
+        if base:
+            change = (value / base - 1) * 100
+            mark = " ❌" if change > args.tolerance else ""
+            if mark:
+                regressions.append(name)
+            print(f"{name:<28} {value:>10.2f} {base:>10.2f} {change:>+9.1f}%{mark}")
+        else:
+            print(f"{name:<28} {value:>10.2f} {'-':>10} {'-':>10}")
+
+    http_pool.close()
+
+    if args.save:
+        save_baseline(results)
+        print(f"\n💾 Базовые значения записаны в {os.path.relpath(BASELINE_PATH)}")
+        return
+
+    if regressions:
+        print(f"\n❌ Регрессии (медленнее базы больше чем на {args.tolerance:.0f}%): {', '.join(regressions)}")
+        sys.exit(1)
+    if baseline:
+        print(f"\n✅ Регрессий нет (допуск {args.tolerance:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Аккаунты Telegram, которые обслуживает один процесс
+"""
+
+import os
+import re
+import json
+from typing import Optional, List, NamedTuple
+
+from .config import load_config
+
+
+DEFAULT_ACCOUNT = "default"
+
+
+class AccountConfig(NamedTuple):
+    """Учетные данные и файл сессии одного аккаунта"""
+    name: str
+    api_id: Optional[str]
+    api_hash: Optional[str]
+    phone: Optional[str]
+    session: str
+
+
+def default_account() -> AccountConfig:
+    """Аккаунт из TELEGRAM_API_ID, TELEGRAM_API_HASH и TELEGRAM_PHONE с сессией 'session'"""
+    load_config()
+    return AccountConfig(
+        name=DEFAULT_ACCOUNT,
+        api_id=os.getenv('TELEGRAM_API_ID'),
+        api_hash=os.getenv('TELEGRAM_API_HASH'),
+        phone=os.getenv('TELEGRAM_PHONE'),
+        session='session',
+    )
+
+
+def load_accounts(path: Optional[str] = None) -> List[AccountConfig]:
+    """
+    Список аккаунтов
+
+    Если задан TELEGRAM_ACCOUNTS_FILE, аккаунты читаются из JSON файла:
+    [{"name": "work", "phone": "+7...", "session": "session_data/work"}, ...].
+    api_id и api_hash можно не указывать - берутся из TELEGRAM_API_ID и
+    TELEGRAM_API_HASH (одно приложение Telegram обслуживает несколько аккаунтов).
+    Без файла используется один аккаунт из переменных окружения.
+    """
+    load_config()
+    path = path if path is not None else os.getenv('TELEGRAM_ACCOUNTS_FILE', '')
+    if not path:
+        return [default_account()]
+
+    try:
+        with open(path, encoding='utf-8') as f:
+            items = json.load(f)
+    except (OSError, ValueError) as e:
+        raise Exception(f"Не удалось прочитать список аккаунтов {path}: {e}")
+
+    if not isinstance(items, list) or not items:
+        raise Exception(f"В {path} должен быть непустой список аккаунтов")
+
+    accounts = []
+    names = set()
+    for item in items:
+        name = str(item.get("name", "")).strip()
+        if not re.fullmatch(r'[\w-]+', name):
+            raise Exception(f"Некорректное имя аккаунта: '{name}' (допустимы буквы, цифры, '_' и '-')")
+        if name in names:
+            raise Exception(f"Аккаунт '{name}' указан дважды")
+        names.add(name)
+
+        accounts.append(AccountConfig(
+            name=name,
+            api_id=str(item.get("api_id") or os.getenv('TELEGRAM_API_ID') or '') or None,
+            api_hash=item.get("api_hash") or os.getenv('TELEGRAM_API_HASH'),
+            phone=item.get("phone"),
+            session=item.get("session") or f"session_{name}",
+        ))
+    return accounts
@@ -0,0 +1,130 @@
+"""
+Кэшированный баланс ProxyAPI с фоновым обновлением
+"""
+
+import os
+import time
+import asyncio
+from datetime import datetime
+from typing import Optional, Dict, Any, Callable
+
+from .proxy_api import AsyncProxyAPIClient
+
+
+class BalanceService:
+    """
+    Баланс аккаунта ProxyAPI для веб интерфейса
+
+    Значение обновляется фоновой задачей и по запросу. Чтение никогда
+    не ждет ProxyAPI: если значение устарело, возвращается последнее
+    известное, а обновление запускается в фоне (stale-while-revalidate).
+    Одновременные обновления объединяются в один запрос.
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        refresh_interval: Optional[float] = None,
+        client_factory: Callable[[], AsyncProxyAPIClient] = AsyncProxyAPIClient
+    ):
+        """
+        Args:
+            ttl: Через сколько секунд значение считается устаревшим (BALANCE_TTL, по умолчанию 60)
+            refresh_interval: Период фонового обновления (BALANCE_REFRESH_INTERVAL, по умолчанию 300)
+            client_factory: Фабрика клиента ProxyAPI
+        """
+        self.ttl = ttl or float(os.getenv('BALANCE_TTL', '60'))
+        self.refresh_interval = refresh_interval or float(os.getenv('BALANCE_REFRESH_INTERVAL', '300'))
+        self.client_factory = client_factory
+
+        self.balance: Optional[float] = None
+        self.as_of: Optional[float] = None
+        self.error: Optional[str] = None
+
+        self._client: Optional[AsyncProxyAPIClient] = None
+        self._refresh: Optional[asyncio.Task] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def is_stale(self) -> bool:
+        return self.as_of is None or time.time() - self.as_of >= self.ttl
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Текущее значение без ожидания; устаревшее значение обновляется в фоне"""
+        if self.is_stale():
+            self._start_refresh()
+        return self._to_dict()
+
+    async def get(self, force: bool = False, timeout: float = 10.0) -> Dict[str, Any]:
+        """
+        Значение баланса с ожиданием обновления не дольше timeout
+
+        Args:
+            force: Обновить, даже если значение еще свежее
+            timeout: Сколько ждать ответа ProxyAPI; по истечении отдается последнее значение
+        """
+        if force or self.is_stale():
+            task = self._start_refresh()
+            try:
+                await asyncio.wait_for(asyncio.shield(task), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._to_dict()
+
+    async def refresh(self):
+        """Запросить баланс у ProxyAPI (ошибки сохраняются, а не выбрасываются)"""
+        try:
+            if self._client is None:
+                self._client = self.client_factory()
+            self.balance = await self._client.aget_balance()
+            self.as_of = time.time()
+            self.error = None
+        except Exception as e:
+            self.error = str(e)
+            print(f"⚠️ Не удалось обновить баланс: {e}")
+
+    def start(self):
+        """Запустить фоновое обновление"""
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        """Остановить фоновое обновление"""
+        for task in (self._loop_task, self._refresh):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._loop_task = None
+        self._refresh = None
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.create_task(self.refresh())
+        return self._refresh
+
+    async def _refresh_loop(self):
+        while True:
+            await self._start_refresh()
+            await asyncio.sleep(self.refresh_interval)
+
+    def _to_dict(self) -> Dict[str, Any]:
+        return {
+            "balance": self.balance,
+            "as_of": datetime.fromtimestamp(self.as_of).strftime("%Y-%m-%d %H:%M:%S") if self.as_of else None,
+            "stale": self.is_stale(),
+            "refreshing": self._refresh is not None and not self._refresh.done(),
+            "error": self.error,
+        }
+
+
+_service: Optional[BalanceService] = None
+
+
+def get_balance_service() -> BalanceService:
+    """Общий сервис баланса процесса"""
+    global _service
+    if _service is None:
+        _service = BalanceService()
+    return _service
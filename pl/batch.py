@@ -0,0 +1,295 @@
+"""
+Пакетная обработка запросов из файла или stdin (python -m pl.cli batch)
+"""
+
+import sys
+import json
+import time
+import asyncio
+from typing import Optional, Dict, Set, Any, Iterable, Iterator, TextIO, NamedTuple
+
+from . import http_pool
+from .proxy_api import AsyncProxyAPIClient
+from .llm_scheduler import LLMScheduler
+from .retry import CircuitOpenError
+
+
+class BatchItem(NamedTuple):
+    """Один запрос пакета"""
+    index: int          # Порядковый номер во входных данных
+    id: Any             # Ключ для сопоставления результата (по умолчанию index)
+    prompt: str
+    temperature: float
+    max_tokens: int
+    top_p: float
+
+
+def iter_items(lines: Iterable[str], temperature: float = 0.7, max_tokens: int = 300,
+               top_p: float = 0.95, fmt: str = "auto") -> Iterator[BatchItem]:
+    """
+    Разбирать входные данные пакета по мере чтения
+
+    Каждая непустая строка - запрос: обычный текст или (для fmt="jsonl" и
+    строк, начинающихся с '{', при fmt="auto") JSON объект
+    {"prompt": ..., "id": ..., "temperature": ..., "max_tokens": ..., "top_p": ...},
+    где все поля, кроме prompt, необязательны и по умолчанию берутся из аргументов.
+    """
+    index = 0
+    for line_no, line in enumerate(lines, 1):
+        line = line.rstrip("\r\n")
+        if not line.strip():
+            continue
+
+        if fmt == "jsonl" or (fmt == "auto" and line.lstrip().startswith("{")):
+            try:
+                data = json.loads(line)
+            except ValueError as e:
+                raise Exception(f"Строка {line_no}: некорректный JSON ({e})")
+            if not isinstance(data, dict) or not str(data.get("prompt") or "").strip():
+                raise Exception(f"Строка {line_no}: нужен объект с непустым полем prompt")
+            yield BatchItem(
+                index=index,
+                id=data.get("id", index),
+                prompt=str(data["prompt"]),
+                temperature=float(data.get("temperature", temperature)),
+                max_tokens=int(data.get("max_tokens", max_tokens)),
+                top_p=float(data.get("top_p", top_p)),
+            )
+        else:
+            yield BatchItem(index, index, line, temperature, max_tokens, top_p)
+        index += 1
+
+
+def load_completed(path: str) -> Set[str]:
+    """
+    id успешно обработанных запросов из вывода прошлого запуска
+
+    Запросы с ошибкой не учитываются и выполняются заново; оборванная
+    последняя строка (прерванный запуск) пропускается.
+    """
+    done = set()
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and record.get("status") == "ok":
+                    done.add(json.dumps(record.get("id")))
+    except FileNotFoundError:
+        pass
+    return done
+
+
+class BatchRunner:
+    """
+    Выполнение пакета с ограниченным параллелизмом
+
+    Входные строки читаются по мере того, как освобождаются рабочие задачи
+    (очередь не длиннее concurrency), поэтому пакет любого размера не
+    загружается в память целиком. concurrency рабочих задач отправляют
+    запросы через общий пул соединений http_pool (без нового TLS рукопожатия
+    на каждый запрос) с повторами и circuit breaker, как у остальных клиентов.
+    Результаты пишутся в out по строке JSON сразу после получения
+    (ordered=False) или в порядке входных данных (ordered=True).
+
+    Если ProxyAPI недоступен и circuit breaker разомкнут, запросы ждут его
+    пробного закрытия и повторяются; после breaker_waits размыканий подряд
+    без единого успешного ответа пакет останавливается, а невыполненные
+    запросы не записываются - их выполнит повторный запуск с --resume.
+    """
+
+    def __init__(self, client: AsyncProxyAPIClient, out: TextIO, concurrency: int = 4, ordered: bool = False,
+                 completed: Optional[Set[str]] = None, breaker_waits: int = 3):
+        """
+        Args:
+            client: Клиент ProxyAPI
+            out: Куда писать результаты (JSONL)
+            concurrency: Сколько запросов выполнять одновременно
+            ordered: Выводить результаты в порядке входных данных
+            completed: id (json.dumps) уже выполненных запросов - пропускаются
+            breaker_waits: Сколько размыканий circuit breaker подряд пережидать до остановки
+        """
+        self.client = client
+        self.out = out
+        self.concurrency = max(1, concurrency)
+        self.ordered = ordered
+        self.completed = completed or set()
+        self.breaker_waits = breaker_waits
+
+        self.ok = 0
+        self.errors = 0
+        self.skipped = 0
+        self.stopped = False        # Остановлен: ProxyAPI недоступен
+
+        # Порядковые номера отправленных запросов для вывода по порядку
+        self._buffer: Dict[int, Dict[str, Any]] = {}
+        self._next = 0
+        self._opened_at_success = 0
+
+    async def run(self, items: Iterable[BatchItem]):
+        """Выполнить запросы из items (итератор читается лениво, в пуле потоков)"""
+        loop = asyncio.get_running_loop()
+        source = iter(items)
+        queue: "asyncio.Queue[Optional[tuple]]" = asyncio.Queue(maxsize=self.concurrency)
+        self._opened_at_success = self.client.retry.breaker.times_opened
+
+        async def reader():
+            seq = 0
+            try:
+                while not self.stopped:
+                    # Чтение строки (stdin, файл) не блокирует цикл событий
+                    item = await loop.run_in_executor(None, next, source, None)
+                    if item is None:
+                        break
+                    if json.dumps(item.id) in self.completed:
+                        self.skipped += 1
+                        continue
+                    await queue.put((seq, item))
+                    seq += 1
+            finally:
+                for _ in range(self.concurrency):
+                    await queue.put(None)
+
+        async def worker():
+            while True:
+                entry = await queue.get()
+                if entry is None:
+                    return
+                if self.stopped:
+                    continue
+                seq, item = entry
+                record = await self._process(item)
+                if record is not None:
+                    self._emit(seq, record)
+
+        reading = asyncio.ensure_future(reader())
+        try:
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        finally:
+            # Ошибка разбора входа или остановка: выводим все, что успели получить
+            self._flush_buffer()
+        await reading
+
+    async def _process(self, item: BatchItem) -> Optional[Dict[str, Any]]:
+        """Результат запроса или None, если пакет остановлен и запрос не выполнен"""
+        started = time.monotonic()
+        record: Dict[str, Any] = {"id": item.id, "index": item.index}
+        breaker = self.client.retry.breaker
+        while True:
+            try:
+                record["response"] = await self.client.agenerate_text(
+                    item.prompt,
+                    temperature=item.temperature,
+                    max_tokens=item.max_tokens,
+                    top_p=item.top_p,
+                    mode="batch"
+                )
+                record["status"] = "ok"
+                self.ok += 1
+                self._opened_at_success = breaker.times_opened
+            except CircuitOpenError:
+                if self.stopped or breaker.times_opened - self._opened_at_success >= self.breaker_waits:
+                    self.stopped = True
+                    return None
+                # Ждем пробного запроса breaker и повторяем
+                await asyncio.sleep(breaker.to_dict().get("retry_in") or 0.5)
+                continue
+            except Exception as e:
+                record["status"] = "error"
+                record["error"] = str(e)
+                self.errors += 1
+            record["latency_ms"] = round((time.monotonic() - started) * 1000, 1)
+            return record
+
+    def _emit(self, seq: int, record: Dict[str, Any]):
+        if not self.ordered:
+            self._write(record)
+            return
+
+        # Придерживаем результат, пока не готовы все предыдущие
+        self._buffer[seq] = record
+        while self._next in self._buffer:
+            self._write(self._buffer.pop(self._next))
+            self._next += 1
+
+    def _flush_buffer(self):
+        """Записать придержанные результаты (после остановки в выводе будут пропуски)"""
+        for seq in sorted(self._buffer):
+            self._write(self._buffer.pop(seq))
+
+    def _write(self, record: Dict[str, Any]):
+        # Строка за строкой: прерванный запуск можно продолжить с --resume
+        self.out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.out.flush()
+
+
+def run_batch(
+    source: TextIO,
+    api_key: Optional[str] = None,
+    system_prompt: Optional[str] = None,
+    output: Optional[str] = None,
+    resume: bool = False,
+    concurrency: int = 4,
+    ordered: bool = False,
+    temperature: float = 0.7,
+    max_tokens: int = 300,
+    top_p: float = 0.95,
+    fmt: str = "auto",
+    breaker_waits: int = 3
+) -> bool:
+    """
+    Выполнить пакет запросов из source
+
+    Args:
+        output: Файл результатов (по умолчанию stdout)
+        resume: Пропустить запросы, уже успешно записанные в output, и дописать остальные
+        breaker_waits: Сколько размыканий circuit breaker подряд пережидать до остановки пакета
+
+    Returns:
+        True, если все запросы выполнены без ошибок
+    """
+    completed: Set[str] = set()
+    if resume:
+        if not output:
+            raise Exception("Для --resume нужен файл результатов --output")
+        completed = load_completed(output)
+
+    print(f"📦 Пакет запросов, параллельно: {concurrency}"
+          + (f" (уже выполнено: {len(completed)})" if completed else ""), file=sys.stderr)
+
+    # Пул соединений не меньше числа одновременных запросов
+    if http_pool.get_stats()["pool_size"] < concurrency:
+        http_pool.configure(pool_size=concurrency)
+
+    client = AsyncProxyAPIClient(
+        api_key=api_key,
+        system_prompt=system_prompt,
+        scheduler=LLMScheduler(max_in_flight=concurrency)
+    )
+
+    out = open(output, "a" if resume else "w", encoding="utf-8") if output else sys.stdout
+    started = time.monotonic()
+    try:
+        runner = BatchRunner(client, out, concurrency=concurrency, ordered=ordered,
+                             completed=completed, breaker_waits=breaker_waits)
+
+        async def main():
+            try:
+                await runner.run(iter_items(source, temperature, max_tokens, top_p, fmt))
+            finally:
+                await http_pool.aclose()
+
+        asyncio.run(main())
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"✅ Готово: {runner.ok}, ❌ ошибок: {runner.errors}"
+          + (f", пропущено выполненных: {runner.skipped}" if runner.skipped else "")
+          + f", за {time.monotonic() - started:.1f} с", file=sys.stderr)
+    if runner.stopped:
+        print("⛔ ProxyAPI недоступен (circuit breaker размыкается снова и снова), пакет остановлен. "
+              "Продолжите позже с --output <файл> --resume", file=sys.stderr)
+    return runner.errors == 0 and not runner.stopped
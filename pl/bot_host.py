@@ -0,0 +1,141 @@
+"""
+Запуск нескольких аккаунтов Telegram в одном процессе
+"""
+
+import time
+import asyncio
+from typing import Optional, Dict, List, Any
+
+from .accounts import AccountConfig, load_accounts
+from .telegram_client import TelegramUserBotWithAutoReply
+
+
+class BotHost:
+    """
+    Userbot'ы для нескольких аккаунтов
+
+    У каждого аккаунта своя сессия Telegram, кэш истории, список диалогов
+    и настройки автоответа. Клиенты ProxyAPI всех аккаунтов работают через
+    общие пул соединений, планировщик запросов к LLM, повторы и кэш
+    ответов, поэтому лимит LLM_MAX_IN_FLIGHT действует на процесс целиком.
+    """
+
+    def __init__(self, accounts: Optional[List[AccountConfig]] = None):
+        """
+        Args:
+            accounts: Аккаунты (по умолчанию - из load_accounts)
+        """
+        self.accounts: Dict[str, AccountConfig] = {
+            account.name: account for account in (accounts or load_accounts())
+        }
+        self.bots: Dict[str, TelegramUserBotWithAutoReply] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._started_at: Dict[str, float] = {}
+        self._errors: Dict[str, str] = {}
+
+    @property
+    def default_account(self) -> str:
+        """Первый аккаунт из списка"""
+        return next(iter(self.accounts))
+
+    def resolve(self, name: Optional[str] = None) -> str:
+        """Имя аккаунта (None - аккаунт по умолчанию)"""
+        name = name or self.default_account
+        if name not in self.accounts:
+            raise Exception(f"Аккаунт '{name}' не найден")
+        return name
+
+    def get(self, name: Optional[str] = None) -> Optional[TelegramUserBotWithAutoReply]:
+        """Запущенный бот аккаунта или None"""
+        return self.bots.get(self.resolve(name))
+
+    def is_running(self, name: Optional[str] = None) -> bool:
+        task = self._tasks.get(self.resolve(name))
+        return task is not None and not task.done()
+
+    def running_bots(self) -> List[TelegramUserBotWithAutoReply]:
+        return [bot for name, bot in self.bots.items() if self.is_running(name)]
+
+    async def start(self, name: Optional[str] = None) -> TelegramUserBotWithAutoReply:
+        """Запустить бота аккаунта в фоновой задаче"""
+        name = self.resolve(name)
+        if self.is_running(name):
+            raise Exception(f"Бот аккаунта '{name}' уже запущен")
+
+        bot = TelegramUserBotWithAutoReply(self.accounts[name])
+        self.bots[name] = bot
+        self._errors.pop(name, None)
+        self._started_at[name] = time.time()
+        self._tasks[name] = asyncio.create_task(self._run(name, bot))
+        return bot
+
+    async def stop(self, name: Optional[str] = None):
+        """Остановить бота аккаунта"""
+        name = self.resolve(name)
+        if not self.is_running(name):
+            raise Exception(f"Бот аккаунта '{name}' не запущен")
+
+        bot = self.bots.pop(name, None)
+        task = self._tasks.pop(name, None)
+        self._started_at.pop(name, None)
+        if bot:
+            await bot.stop()
+        if task and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def stop_all(self):
+        """Остановить ботов всех аккаунтов"""
+        for name in list(self._tasks):
+            if self.is_running(name):
+                await self.stop(name)
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Состояние каждого аккаунта для веб интерфейса"""
+        result = []
+        for name, account in self.accounts.items():
+            bot = self.bots.get(name)
+            running = self.is_running(name)
+            me = getattr(bot, 'me', None) if running else None
+            chats = bot.get_auto_reply_chats() if bot and running else {}
+            result.append({
+                "name": name,
+                "phone": self._mask_phone(account.phone),
+                "running": running,
+                "user": (f"@{me.username}" if me.username else me.first_name) if me else None,
+                "uptime_seconds": round(time.time() - self._started_at[name]) if running else None,
+                "auto_reply_chats": len(chats),
+                "auto_reply_enabled_chats": sum(1 for info in chats.values() if info.get("enabled")),
+                "dialogs": len(bot.dialogs) if bot and running else 0,
+                "error": self._errors.get(name),
+            })
+        return result
+
+    async def _run(self, name: str, bot: TelegramUserBotWithAutoReply):
+        try:
+            await bot.start()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._errors[name] = str(e)
+            print(f"❌ Ошибка бота аккаунта {name}: {e}")
+
+    @staticmethod
+    def _mask_phone(phone: Optional[str]) -> Optional[str]:
+        if not phone:
+            return None
+        return phone[:2] + "*" * max(0, len(phone) - 4) + phone[-2:]
+
+
+_host: Optional[BotHost] = None
+
+
+def get_bot_host() -> BotHost:
+    """Общий хост аккаунтов процесса"""
+    global _host
+    if _host is None:
+        _host = BotHost()
+    return _host
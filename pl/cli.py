@@ -4,7 +4,9 @@ CLI интерфейс для ProxyAPI утилиты
 
 import argparse
 import sys
-from pl.proxy_api import ProxyAPIClient
+
+# Модули команд (httpx, Telethon, asyncio) импортируются внутри main только
+# для выбранной команды: --help и ошибки аргументов не тратят на них время
 
 
 def main():
@@ -18,6 +20,8 @@ def main():
   python -m pl.cli balance                        # Проверить баланс
   python -m pl.cli ask "Привет, как дела?"        # Одиночный запрос
   python -m pl.cli ask "Объясни квантовую физику" --max-tokens 500
+  python -m pl.cli batch prompts.txt -c 8 > answers.jsonl  # Пакет запросов
+  python -m pl.cli batch prompts.jsonl -o answers.jsonl --resume
   python -m pl.cli telegram --advanced            # Telegram UserBot
         """
     )
@@ -50,6 +54,31 @@ def main():
     ask_parser.add_argument('--top-p', type=float, default=0.95,
                            help='Контроль разнообразия ответа (по умолчанию 0.95)')
     
+    # Команда batch
+    batch_parser = subparsers.add_parser('batch', help='Выполнить пакет запросов из файла или stdin')
+    batch_parser.add_argument('input', nargs='?', default='-',
+                             help='Файл с запросами: по строке на запрос или JSONL {"prompt": ..., "temperature": ..., '
+                                  '"max_tokens": ...} (по умолчанию stdin)')
+    batch_parser.add_argument('-c', '--concurrency', type=int, default=4,
+                             help='Сколько запросов выполнять одновременно (по умолчанию 4)')
+    batch_parser.add_argument('-o', '--output',
+                             help='Файл результатов JSONL (по умолчанию stdout)')
+    batch_parser.add_argument('--resume', action='store_true',
+                             help='Пропустить запросы, уже выполненные в --output, и дописать остальные')
+    batch_parser.add_argument('--ordered', action='store_true',
+                             help='Выводить результаты в порядке запросов, а не по готовности')
+    batch_parser.add_argument('--format', choices=['auto', 'text', 'jsonl'], default='auto',
+                             help='Формат входных данных (auto: строки с "{" - JSON, остальные - текст)')
+    batch_parser.add_argument('--breaker-waits', type=int, default=3,
+                             help='Сколько размыканий circuit breaker подряд пережидать, прежде чем остановить пакет '
+                                  '(по умолчанию 3)')
+    batch_parser.add_argument('--temperature', type=float, default=0.7,
+                             help='Степень креативности по умолчанию (0.0-1.0, по умолчанию 0.7)')
+    batch_parser.add_argument('--max-tokens', type=int, default=300,
+                             help='Максимальное количество токенов в ответе по умолчанию (по умолчанию 300)')
+    batch_parser.add_argument('--top-p', type=float, default=0.95,
+                             help='Контроль разнообразия ответа по умолчанию (по умолчанию 0.95)')
+    
     # Команда telegram
     telegram_parser = subparsers.add_parser('telegram', help='Запуск Telegram UserBot')
     telegram_parser.add_argument('--advanced', action='store_true',
@@ -62,8 +91,11 @@ def main():
         return
     
     try:
-        # Создаем клиент
-        client = ProxyAPIClient(api_key=args.api_key, system_prompt=args.system_prompt)
+        if args.command in ('chat', 'balance', 'ask'):
+            from pl.proxy_api import ProxyAPIClient
+            
+            # Создаем клиент
+            client = ProxyAPIClient(api_key=args.api_key, system_prompt=args.system_prompt)
         
         if args.command == 'chat':
             client.chat()
@@ -82,6 +114,31 @@ def main():
             )
             print(f"\n🤖 Ответ: {response}")
             
+        elif args.command == 'batch':
+            from pl.batch import run_batch
+            
+            source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+            try:
+                success = run_batch(
+                    source,
+                    api_key=args.api_key,
+                    system_prompt=args.system_prompt,
+                    output=args.output,
+                    resume=args.resume,
+                    concurrency=args.concurrency,
+                    ordered=args.ordered,
+                    temperature=args.temperature,
+                    max_tokens=args.max_tokens,
+                    top_p=args.top_p,
+                    fmt=args.format,
+                    breaker_waits=args.breaker_waits
+                )
+            finally:
+                if source is not sys.stdin:
+                    source.close()
+            if not success:
+                sys.exit(1)
+            
         elif args.command == 'telegram':
             import asyncio
             from pl.telegram_client import TelegramUserBot, TelegramUserBotAdvanced
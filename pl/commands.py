@@ -0,0 +1,108 @@
+"""
+Разбор команд @gpt за один проход
+"""
+
+import re
+from typing import Optional, NamedTuple
+
+
+# Подкоманды и начало промпта для них; текст команды дописывается в конец
+PROMPT_TEMPLATES = {
+    'rewrite': "Переформулируй этот текст, чтобы он звучал более естественно и грамотно:\n\n",
+    'translate': "Переведи этот текст на русский язык:\n\n",
+    'explain': "Объясни простыми словами:\n\n",
+    'fix': "Исправь ошибки в этом тексте:\n\n",
+    'short': "Сократи этот текст, сохранив основную мысль:\n\n",
+}
+
+# @gpt[-context<N>][-hide][-nocache] [подкоманда ]текст, флаги в любом порядке
+# Префикс команды регистронезависим, подкоманды - только в нижнем регистре и через пробел
+_COMMAND_RE = re.compile(
+    r'@gpt(?P<flags>(?:-(?:context\d+|hide|nocache))*)\s+'
+    r'(?:(?P<sub>(?-i:' + '|'.join(PROMPT_TEMPLATES) + r')) )?'
+    r'(?P<text>.+)',
+    re.IGNORECASE | re.DOTALL
+)
+
+# Один флаг команды
+_FLAG_RE = re.compile(r'-(?:context(?P<count>\d+)|(?P<hide>hide)|(?P<nocache>nocache))', re.IGNORECASE)
+
+# Начало команды - фильтр обработчика исходящих сообщений
+COMMAND_PREFIX = re.compile(r'\s*@gpt', re.IGNORECASE)
+
+
+def looks_like_command(message_text: str) -> bool:
+    """Сообщение начинается с @gpt и стоит его разбирать"""
+    return COMMAND_PREFIX.match(message_text) is not None
+
+
+class ParsedCommand(NamedTuple):
+    """Разобранная команда @gpt"""
+    kind: str                     # general, hide, context или context_hide
+    context_count: Optional[int]  # Число сообщений контекста для -context<N>
+    hide: bool                    # Ответ от лица пользователя
+    use_cache: bool               # False для суффикса -nocache
+    subcommand: str               # rewrite, translate, explain, fix, short или general
+    content: str                  # Текст после подкоманды
+
+    @property
+    def text(self) -> str:
+        """Текст команды целиком (после префикса)"""
+        if self.subcommand in PROMPT_TEMPLATES:
+            return f"{self.subcommand} {self.content}"
+        return self.content
+
+    @property
+    def prompt(self) -> str:
+        """Промпт для модели (без контекста беседы)"""
+        template = PROMPT_TEMPLATES.get(self.subcommand)
+        return template + self.content if template else self.content
+
+    @property
+    def cacheable(self) -> bool:
+        """Повторяемый результат: ответ можно брать из кэша"""
+        return self.use_cache and self.subcommand in PROMPT_TEMPLATES
+
+
+def parse_command(message_text: str) -> Optional[ParsedCommand]:
+    """
+    Разобрать сообщение как команду @gpt
+
+    Returns:
+        ParsedCommand или None, если сообщение не команда
+    """
+    # Быстрый отказ: команда начинается с '@' (возможно, после пробелов)
+    first = message_text[:1]
+    if first != '@' and not first.isspace():
+        return None
+
+    match = _COMMAND_RE.match(message_text.strip())
+    if match is None:
+        return None
+
+    flags, subcommand, content = match.group('flags', 'sub', 'text')
+    count = None
+    hide = nocache = False
+    if flags:
+        for digits, is_hide, is_nocache in _FLAG_RE.findall(flags):
+            # Повтор флага (-hide-hide, два -context) - не команда
+            if (digits and count is not None) or (is_hide and hide) or (is_nocache and nocache):
+                return None
+            if digits:
+                count = digits
+            hide = hide or bool(is_hide)
+            nocache = nocache or bool(is_nocache)
+
+    if count is not None:
+        kind = 'context_hide' if hide else 'context'
+    else:
+        kind = 'hide' if hide else 'general'
+
+    return ParsedCommand(
+        kind,
+        int(count) if count is not None else None,
+        hide,
+        not nocache,
+        subcommand or 'general',
+        content.strip()
+    )
@@ -0,0 +1,23 @@
+"""
+Загрузка конфигурации из .env
+"""
+
+_loaded = False
+
+
+def load_config():
+    """
+    Загрузить переменные окружения из .env (один раз на процесс)
+
+    Вызывается при создании клиентов и ботов, а не при импорте модулей,
+    поэтому команды CLI, которым конфигурация не нужна (--help), не
+    импортируют python-dotenv и не читают файл. Уже заданные переменные
+    окружения не перезаписываются.
+    """
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+
+    from dotenv import load_dotenv
+    load_dotenv()
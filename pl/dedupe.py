@@ -0,0 +1,50 @@
+"""
+Ограниченное множество последних ключей для защиты от повторной обработки
+"""
+
+from collections import OrderedDict
+from typing import Hashable, Iterator
+
+
+class RecentKeys:
+    """
+    Множество последних capacity ключей в порядке добавления
+
+    Проверка, добавление и вытеснение самого старого ключа - O(1):
+    OrderedDict хранит хэш-индекс и двусвязный список порядка.
+    """
+
+    def __init__(self, capacity: int = 5000):
+        """
+        Args:
+            capacity: Сколько последних ключей помнить
+        """
+        if capacity < 1:
+            raise ValueError("Емкость должна быть положительной")
+        self.capacity = capacity
+        self._keys: "OrderedDict[Hashable, None]" = OrderedDict()
+        self.evicted = 0
+
+    def add(self, key: Hashable) -> bool:
+        """
+        Запомнить ключ
+
+        Returns:
+            True, если ключ новый; False, если он уже встречался
+        """
+        if key in self._keys:
+            return False
+        self._keys[key] = None
+        if len(self._keys) > self.capacity:
+            self._keys.popitem(last=False)
+            self.evicted += 1
+        return True
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._keys)
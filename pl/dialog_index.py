@@ -0,0 +1,237 @@
+"""
+Кэшированный список диалогов аккаунта с обновлением по событиям
+"""
+
+import os
+import time
+import asyncio
+from bisect import bisect_right
+from datetime import datetime
+from typing import Optional, Dict, List, Tuple, Any
+
+from telethon import utils
+
+
+SortKey = Tuple[float, int]
+
+
+class DialogIndex:
+    """
+    Диалоги аккаунта для выбора чатов автоответа
+
+    Список загружается через iter_dialogs один раз и затем поддерживается
+    событиями: новые сообщения поднимают чат наверх и меняют счетчик
+    непрочитанных, переименования меняют название. Полная перезагрузка
+    идет в фоне раз в refresh_interval секунд; запросы веб интерфейса
+    отдаются из памяти с курсорной пагинацией и поиском.
+    """
+
+    def __init__(self, limit: Optional[int] = None, refresh_interval: Optional[float] = None):
+        """
+        Args:
+            limit: Сколько диалогов загружать (DIALOGS_LIMIT, по умолчанию 500)
+            refresh_interval: Период фоновой перезагрузки в секундах (DIALOGS_REFRESH_INTERVAL, по умолчанию 900)
+        """
+        self.limit = limit or int(os.getenv('DIALOGS_LIMIT', '500'))
+        self.refresh_interval = refresh_interval or float(os.getenv('DIALOGS_REFRESH_INTERVAL', '900'))
+
+        self._dialogs: Dict[int, Dict[str, Any]] = {}
+        self._order: Optional[List[SortKey]] = None  # Ключи сортировки, сбрасываются при изменениях
+
+        self.as_of: Optional[float] = None
+        self.error: Optional[str] = None
+        self.loads = 0
+        self.updates = 0
+
+        self._client = None
+        self._refresh: Optional[asyncio.Task] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.as_of is not None
+
+    def __len__(self) -> int:
+        return len(self._dialogs)
+
+    @staticmethod
+    def dialog_type(entity) -> str:
+        """Тип чата: user, group, channel или other"""
+        if hasattr(entity, 'is_user'):
+            # Диалог из iter_dialogs
+            if entity.is_user:
+                return "user"
+            if entity.is_group:
+                return "group"
+            if entity.is_channel:
+                return "channel"
+            return "other"
+        # Сущность Telethon (User, Chat, Channel)
+        kind = type(entity).__name__
+        if kind == "User":
+            return "user"
+        if kind in ("Chat", "ChatForbidden") or getattr(entity, 'megagroup', False):
+            return "group"
+        if kind in ("Channel", "ChannelForbidden"):
+            return "channel"
+        return "other"
+
+    async def refresh(self):
+        """Перезагрузить список диалогов (ошибки сохраняются, а не выбрасываются)"""
+        if self._client is None:
+            return
+        try:
+            dialogs: Dict[int, Dict[str, Any]] = {}
+            async for dialog in self._client.iter_dialogs(limit=self.limit):
+                chat_type = self.dialog_type(dialog)
+                dialogs[dialog.id] = {
+                    "chat_id": dialog.id,
+                    "name": dialog.name or f"{chat_type.capitalize()} {dialog.id}",
+                    "type": chat_type,
+                    "unread_count": dialog.unread_count,
+                    "last_activity": dialog.date.timestamp() if dialog.date else 0.0,
+                }
+            self._dialogs = dialogs
+            self._order = None
+            self.as_of = time.time()
+            self.error = None
+            self.loads += 1
+            print(f"📋 Загружено {len(dialogs)} диалогов")
+        except Exception as e:
+            self.error = str(e)
+            print(f"⚠️ Не удалось загрузить диалоги: {e}")
+
+    def start(self, client):
+        """Загрузить диалоги и запустить фоновое обновление"""
+        self._client = client
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        """Остановить фоновое обновление"""
+        for task in (self._loop_task, self._refresh):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._loop_task = None
+        self._refresh = None
+
+    def request_refresh(self) -> Optional[asyncio.Task]:
+        """Запустить перезагрузку в фоне (одновременные запросы объединяются)"""
+        if self._client is None:
+            return None
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.create_task(self.refresh())
+        return self._refresh
+
+    async def wait_ready(self, timeout: float = 15.0):
+        """Дождаться первой загрузки не дольше timeout"""
+        if self.ready:
+            return
+        task = self.request_refresh()
+        if task is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def on_message(self, chat_id: int, date: Optional[datetime], outgoing: bool, chat=None):
+        """Новое сообщение: чат поднимается наверх, меняется счетчик непрочитанных"""
+        dialog = self._dialogs.get(chat_id)
+        if dialog is None:
+            if chat is None or not self.ready:
+                return
+            chat_type = self.dialog_type(chat)
+            dialog = self._dialogs[chat_id] = {
+                "chat_id": chat_id,
+                "name": utils.get_display_name(chat) or f"{chat_type.capitalize()} {chat_id}",
+                "type": chat_type,
+                "unread_count": 0,
+                "last_activity": 0.0,
+            }
+        dialog["last_activity"] = date.timestamp() if date else time.time()
+        # Свое сообщение означает, что чат прочитан
+        dialog["unread_count"] = 0 if outgoing else dialog["unread_count"] + 1
+        self._order = None
+        self.updates += 1
+
+    def rename(self, chat_id: int, name: str):
+        """Чат переименован"""
+        dialog = self._dialogs.get(chat_id)
+        if dialog is not None and name:
+            dialog["name"] = name
+            self.updates += 1
+
+    def page(self, cursor: Optional[str] = None, limit: int = 50, query: str = "",
+             chat_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Страница диалогов от недавно активных к давним
+
+        Args:
+            cursor: next_cursor предыдущей страницы
+            limit: Размер страницы
+            query: Поиск по названию (без учета регистра)
+            chat_type: Только диалоги этого типа
+
+        Returns:
+            {"dialogs": [...], "next_cursor": str или None, "total": число подходящих}
+        """
+        order = self._sorted()
+        start = bisect_right(order, self._decode_cursor(cursor)) if cursor else 0
+        query = query.strip().lower()
+
+        def matches(dialog: Dict[str, Any]) -> bool:
+            if chat_type and dialog["type"] != chat_type:
+                return False
+            return not query or query in dialog["name"].lower()
+
+        if query or chat_type:
+            total = sum(1 for dialog in self._dialogs.values() if matches(dialog))
+        else:
+            total = len(order)
+
+        items: List[Dict[str, Any]] = []
+        next_cursor = None
+        for key in order[start:]:
+            dialog = self._dialogs[key[1]]
+            if not matches(dialog):
+                continue
+            if len(items) == limit:
+                last = items[-1]
+                next_cursor = f"{last['last_activity']!r}:{last['chat_id']}"
+                break
+            items.append(dialog)
+
+        return {"dialogs": [dict(item) for item in items], "next_cursor": next_cursor, "total": total}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "dialogs": len(self._dialogs),
+            "as_of": datetime.fromtimestamp(self.as_of).strftime("%Y-%m-%d %H:%M:%S") if self.as_of else None,
+            "refreshing": self._refresh is not None and not self._refresh.done(),
+            "loads": self.loads,
+            "updates": self.updates,
+            "error": self.error,
+        }
+
+    def _sorted(self) -> List[SortKey]:
+        if self._order is None:
+            self._order = sorted((-dialog["last_activity"], chat_id) for chat_id, dialog in self._dialogs.items())
+        return self._order
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> SortKey:
+        try:
+            last_activity, chat_id = cursor.rsplit(":", 1)
+            return -float(last_activity), int(chat_id)
+        except ValueError:
+            raise ValueError(f"Некорректный курсор: {cursor}")
+
+    async def _refresh_loop(self):
+        while True:
+            await self.request_refresh()
+            await asyncio.sleep(self.refresh_interval)
@@ -0,0 +1,236 @@
+"""
+Структурированный журнал событий бота и веб интерфейса
+"""
+
+import os
+import time
+import asyncio
+from collections import deque
+from datetime import datetime
+from enum import Enum
+from itertools import islice
+from typing import Optional, Dict, List, Set, Deque, Any, NamedTuple, Iterable
+
+
+class EventKind(str, Enum):
+    """Типы событий журнала"""
+    LOG = "log"                                   # Текстовая запись веб интерфейса
+    COMMAND = "command"                           # Обработана команда @gpt
+    AUTO_REPLY_RECEIVED = "auto_reply_received"   # Сообщение поставлено в очередь автоответа
+    AUTO_REPLY_SENT = "auto_reply_sent"           # Автоответ отправлен
+    AUTO_REPLY_SKIPPED = "auto_reply_skipped"     # GPT решил не отвечать (SKIP)
+    AUTO_REPLY_ERROR = "auto_reply_error"         # Ошибка подготовки автоответа
+
+
+AUTO_REPLY_KINDS = (
+    EventKind.AUTO_REPLY_RECEIVED,
+    EventKind.AUTO_REPLY_SENT,
+    EventKind.AUTO_REPLY_SKIPPED,
+    EventKind.AUTO_REPLY_ERROR,
+)
+
+
+class Event(NamedTuple):
+    """Одно событие журнала"""
+    seq: int
+    ts: float
+    kind: EventKind
+    level: str
+    message: str
+    chat_id: Optional[int] = None
+    latency_ms: Optional[float] = None
+    tokens: Optional[int] = None
+    account: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "seq": self.seq,
+            "timestamp": datetime.fromtimestamp(self.ts).strftime("%Y-%m-%d %H:%M:%S"),
+            "kind": self.kind.value,
+            "level": self.level,
+            "message": self.message,
+            "chat_id": self.chat_id,
+            "latency_ms": self.latency_ms,
+            "tokens": self.tokens,
+            "account": self.account,
+        }
+
+
+class _KindStats:
+    """Счетчики одного типа событий, обновляются при записи"""
+
+    def __init__(self):
+        self.count = 0
+        self.latency_count = 0
+        self.latency_total = 0.0
+        self.tokens_total = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "latency_avg_ms": round(self.latency_total / self.latency_count, 1) if self.latency_count else None,
+            "tokens_total": self.tokens_total,
+        }
+
+
+class EventLog:
+    """
+    Кольцевой буфер событий фиксированного размера
+
+    Статистика считается в момент записи, поэтому ее чтение не зависит
+    от размера буфера; для событий аккаунта она ведется и отдельно по
+    аккаунту. Номера seq возрастают непрерывно: клиенты
+    запрашивают только новые события, а подписчики потока просыпаются
+    лишь при появлении записи.
+    """
+
+    def __init__(self, capacity: Optional[int] = None, recent_per_kind: int = 20):
+        """
+        Args:
+            capacity: Сколько последних событий хранить (EVENT_LOG_SIZE, по умолчанию 1000)
+            recent_per_kind: Сколько последних событий каждого типа держать отдельно
+        """
+        self.capacity = capacity or int(os.getenv('EVENT_LOG_SIZE', '1000'))
+        self.recent_per_kind = recent_per_kind
+        self._events: Deque[Event] = deque(maxlen=self.capacity)
+        # Ключ None - все события, имя аккаунта - только события этого аккаунта
+        self._recent: Dict[Optional[str], Dict[EventKind, Deque[Event]]] = {}
+        self._stats: Dict[Optional[str], Dict[EventKind, _KindStats]] = {}
+        self._add_scope(None)
+        self._levels: Dict[str, int] = {}
+        self._waiters: Set[asyncio.Future] = set()
+        self.last_seq = 0
+
+    def record(
+        self,
+        kind: EventKind,
+        message: str = "",
+        level: str = "INFO",
+        chat_id: Optional[int] = None,
+        latency: Optional[float] = None,
+        tokens: Optional[int] = None,
+        account: Optional[str] = None
+    ) -> Event:
+        """
+        Записать событие
+
+        Args:
+            kind: Тип события
+            message: Текст для ленты логов
+            level: Уровень (INFO, WARNING, ERROR)
+            chat_id: Чат, к которому относится событие
+            latency: Длительность операции в секундах
+            tokens: Количество токенов ответа
+            account: Аккаунт Telegram, к которому относится событие
+        """
+        self.last_seq += 1
+        event = Event(
+            seq=self.last_seq,
+            ts=time.time(),
+            kind=kind,
+            level=level,
+            message=message,
+            chat_id=chat_id,
+            latency_ms=round(latency * 1000, 1) if latency is not None else None,
+            tokens=tokens,
+            account=account,
+        )
+        self._events.append(event)
+
+        scopes = (None,) if account is None else (None, account)
+        for scope in scopes:
+            if scope not in self._stats:
+                self._add_scope(scope)
+            self._recent[scope][kind].append(event)
+            stats = self._stats[scope][kind]
+            stats.count += 1
+            if event.latency_ms is not None:
+                stats.latency_count += 1
+                stats.latency_total += event.latency_ms
+            if tokens:
+                stats.tokens_total += tokens
+        self._levels[level] = self._levels.get(level, 0) + 1
+
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self._waiters.clear()
+        return event
+
+    def since(self, seq: int = 0) -> List[Event]:
+        """События с номером больше seq (не больше, чем хранится в буфере)"""
+        if seq >= self.last_seq or not self._events:
+            return []
+        first_seq = self._events[0].seq
+        return list(islice(self._events, max(0, seq - first_seq + 1), None))
+
+    def recent(self, limit: int, kinds: Optional[Iterable[EventKind]] = None,
+               account: Optional[str] = None) -> List[Event]:
+        """Последние limit событий (всех или только указанных типов, при account - только аккаунта)"""
+        if kinds is None and account is None:
+            return self.since(max(0, self.last_seq - limit))
+        recent = self._recent.get(account, {})
+        merged = sorted((e for kind in (kinds or EventKind) for e in recent.get(kind, ())), key=lambda e: e.seq)
+        return merged[-limit:] if limit else []
+
+    def count(self, kind: EventKind, account: Optional[str] = None) -> int:
+        """Сколько событий типа kind записано за все время (при account - только аккаунтом)"""
+        stats = self._stats.get(account)
+        return stats[kind].count if stats else 0
+
+    def kind_stats(self, kind: EventKind, account: Optional[str] = None) -> Dict[str, Any]:
+        """Счетчики одного типа событий: всех или только аккаунта"""
+        stats = self._stats.get(account)
+        return (stats[kind] if stats else _KindStats()).to_dict()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Счетчики по типам и уровням событий"""
+        return {
+            "total": self.last_seq,
+            "buffered": len(self._events),
+            "capacity": self.capacity,
+            "levels": dict(self._levels),
+            "kinds": {kind.value: self._stats[None][kind].to_dict() for kind in EventKind},
+        }
+
+    def _add_scope(self, account: Optional[str]):
+        self._recent[account] = {k: deque(maxlen=self.recent_per_kind) for k in EventKind}
+        self._stats[account] = {k: _KindStats() for k in EventKind}
+
+    async def wait(self, seq: int, timeout: float) -> bool:
+        """
+        Дождаться события с номером больше seq
+
+        Returns:
+            True, если новые события есть, False по таймауту
+        """
+        if self.last_seq > seq:
+            return True
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._waiters.discard(waiter)
+        return self.last_seq > seq
+
+    def subscribers(self) -> int:
+        """Сколько клиентов сейчас ждут новых событий"""
+        return len(self._waiters)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+
+_event_log: Optional[EventLog] = None
+
+
+def get_event_log() -> EventLog:
+    """Общий журнал событий процесса"""
+    global _event_log
+    if _event_log is None:
+        _event_log = EventLog()
+    return _event_log
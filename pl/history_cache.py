@@ -0,0 +1,169 @@
+"""
+Кэш последних сообщений чатов для построения контекста
+"""
+
+from collections import OrderedDict
+from typing import Optional, Dict, List, Iterable, NamedTuple, Collection
+
+from telethon import utils
+from telethon.tl.types import PeerChannel
+
+
+class CachedMessage(NamedTuple):
+    """Минимальный снимок текстового сообщения"""
+    id: int
+    out: bool
+    sender_id: Optional[int]
+    sender: object
+    message: str
+
+
+class ChatHistoryCache:
+    """
+    Ограниченный буфер последних текстовых сообщений для каждого чата
+
+    Чат заполняется один раз из истории (backfill), после чего
+    поддерживается в актуальном состоянии событиями NewMessage,
+    MessageEdited и MessageDeleted - повторные запросы контекста
+    обходятся без обращений к Telegram API.
+    """
+
+    def __init__(self, capacity_per_chat: int = 200, max_chats: int = 500, backfill_limit: int = 150):
+        """
+        Args:
+            capacity_per_chat: Сколько последних текстовых сообщений хранить на чат
+            max_chats: Сколько чатов держать в памяти (вытесняются давно не использованные)
+            backfill_limit: Сколько сообщений истории загружать при первом обращении
+        """
+        self.capacity_per_chat = capacity_per_chat
+        self.max_chats = max_chats
+        self.backfill_limit = backfill_limit
+
+        self._chats: "OrderedDict[int, OrderedDict[int, CachedMessage]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def snapshot(message) -> Optional[CachedMessage]:
+        """Снимок сообщения Telethon (None, если в нем нет текста)"""
+        text = message.message
+        if not text or not text.strip():
+            return None
+        return CachedMessage(
+            id=message.id,
+            out=bool(message.out),
+            sender_id=message.sender_id,
+            sender=getattr(message, 'sender', None),
+            message=text,
+        )
+
+    def is_tracked(self, chat_id: int) -> bool:
+        """Загружен ли чат из истории"""
+        return chat_id in self._chats
+
+    def backfill(self, chat_id: int, messages: Iterable):
+        """Заполнить буфер чата сообщениями из истории (в любом порядке)"""
+        buffer = self._chats.get(chat_id)
+        merged: Dict[int, CachedMessage] = dict(buffer) if buffer else {}
+
+        for message in messages:
+            cached = self.snapshot(message)
+            if cached is not None:
+                merged.setdefault(cached.id, cached)
+
+        ids = sorted(merged)[-self.capacity_per_chat:]
+        self._chats[chat_id] = OrderedDict((msg_id, merged[msg_id]) for msg_id in ids)
+        self._touch(chat_id)
+
+    def add(self, chat_id: int, message):
+        """Добавить новое сообщение (только для уже загруженных чатов)"""
+        buffer = self._chats.get(chat_id)
+        if buffer is None:
+            return
+
+        cached = self.snapshot(message)
+        if cached is None:
+            return
+
+        out_of_order = bool(buffer) and cached.id < next(reversed(buffer))
+        buffer[cached.id] = cached
+        if out_of_order:
+            self._chats[chat_id] = buffer = OrderedDict(sorted(buffer.items()))
+
+        while len(buffer) > self.capacity_per_chat:
+            buffer.popitem(last=False)
+
+    def edit(self, chat_id: int, message):
+        """Обновить текст отредактированного сообщения"""
+        buffer = self._chats.get(chat_id)
+        if buffer is None or message.id not in buffer:
+            return
+
+        cached = self.snapshot(message)
+        if cached is None:
+            del buffer[message.id]
+        else:
+            buffer[message.id] = cached
+
+    def delete(self, chat_id: Optional[int], message_ids: Iterable[int]):
+        """
+        Удалить сообщения
+
+        Telegram не сообщает chat_id для удалений в личных чатах и обычных
+        группах, но там id сообщений общие для аккаунта, поэтому удаляем
+        их из всех чатов, кроме каналов и супергрупп.
+        """
+        message_ids = list(message_ids)
+
+        if chat_id is not None:
+            buffers = [self._chats.get(chat_id)]
+        else:
+            buffers = [
+                buffer for cid, buffer in self._chats.items()
+                if utils.resolve_id(cid)[1] is not PeerChannel
+            ]
+
+        for buffer in buffers:
+            if not buffer:
+                continue
+            for msg_id in message_ids:
+                buffer.pop(msg_id, None)
+
+    def recent(self, chat_id: int, limit: int, skip_ids: Collection[int] = ()) -> Optional[List[CachedMessage]]:
+        """
+        Последние сообщения чата от новых к старым (кроме skip_ids)
+
+        Returns:
+            Список сообщений или None, если чат еще не загружен
+        """
+        buffer = self._chats.get(chat_id)
+        if buffer is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._touch(chat_id)
+
+        result = []
+        for msg_id in reversed(buffer):
+            if msg_id in skip_ids:
+                continue
+            result.append(buffer[msg_id])
+            if len(result) >= limit:
+                break
+        return result
+
+    def get_stats(self) -> Dict[str, int]:
+        """Статистика кэша"""
+        return {
+            "chats": len(self._chats),
+            "messages": sum(len(buffer) for buffer in self._chats.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _touch(self, chat_id: int):
+        self._chats.move_to_end(chat_id)
+        while len(self._chats) > self.max_chats:
+            self._chats.popitem(last=False)
@@ -0,0 +1,191 @@
+"""
+Общий пул HTTP соединений к ProxyAPI
+
+Все клиенты ProxyAPI (бот, веб интерфейс, CLI) используют один keep-alive
+пул вместо нового TCP + TLS рукопожатия на каждый запрос.
+"""
+
+import os
+import threading
+from typing import Optional, Dict, Any
+
+import httpx
+
+
+def _http2_available() -> bool:
+    """Проверка, установлен ли пакет h2 (нужен httpx для HTTP/2)"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class PoolStats:
+    """Счетчики использования пула: новые и переиспользованные соединения"""
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self._lock = threading.Lock()
+
+    def on_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def on_trace(self, event_name: str, info: Dict[str, Any]):
+        # Событие приходит только при открытии нового TCP соединения
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.new_connections += 1
+
+    def to_dict(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused_connections": max(0, self.requests - self.new_connections),
+            }
+
+
+# Настройки пула (можно переопределить через configure).
+# Читаются из окружения при первом обращении, а не при импорте,
+# чтобы учитывать .env, загруженный при создании клиента.
+_config: Dict[str, Any] = {}
+
+
+def _settings() -> Dict[str, Any]:
+    if not _config:
+        _config.update({
+            "pool_size": int(os.getenv("PROXY_API_POOL_SIZE", "20")),
+            "keepalive_expiry": float(os.getenv("PROXY_API_KEEPALIVE", "60")),
+            "http2": os.getenv("PROXY_API_HTTP2", "1") != "0",
+        })
+    return _config
+
+
+stats = PoolStats()
+
+_client: Optional[httpx.Client] = None
+_async_client: Optional[httpx.AsyncClient] = None
+_async_client_loop: Optional[Any] = None  # asyncio.AbstractEventLoop
+_client_lock = threading.Lock()
+
+# Транспорт вместо сети (бенчмарки): httpx.MockTransport и т.п.
+_transport: Optional[Any] = None
+
+
+def configure(
+    pool_size: Optional[int] = None,
+    keepalive_expiry: Optional[float] = None,
+    http2: Optional[bool] = None,
+    transport: Optional[Any] = None
+):
+    """
+    Изменить настройки пула
+
+    Применяются к клиентам, созданным после вызова (уже открытые
+    клиенты нужно закрыть через close()/aclose()). transport подменяет
+    сеть для обоих клиентов (например, httpx.MockTransport в бенчмарках).
+    """
+    global _transport
+    if transport is not None:
+        _transport = transport
+    config = _settings()
+    if pool_size is not None:
+        config["pool_size"] = max(1, int(pool_size))
+    if keepalive_expiry is not None:
+        config["keepalive_expiry"] = float(keepalive_expiry)
+    if http2 is not None:
+        config["http2"] = bool(http2)
+
+
+def _limits() -> httpx.Limits:
+    config = _settings()
+    return httpx.Limits(
+        max_connections=config["pool_size"],
+        max_keepalive_connections=config["pool_size"],
+        keepalive_expiry=config["keepalive_expiry"],
+    )
+
+
+def _use_http2() -> bool:
+    return _settings()["http2"] and _http2_available()
+
+
+def _sync_request_hook(request: httpx.Request):
+    stats.on_request()
+    request.extensions["trace"] = stats.on_trace
+
+
+async def _async_trace(event_name: str, info: Dict[str, Any]):
+    stats.on_trace(event_name, info)
+
+
+async def _async_request_hook(request: httpx.Request):
+    stats.on_request()
+    request.extensions["trace"] = _async_trace
+
+
+def get_client() -> httpx.Client:
+    """Общий синхронный клиент (CLI, интерактивный чат)"""
+    global _client
+    with _client_lock:
+        if _client is None or _client.is_closed:
+            _client = httpx.Client(
+                limits=_limits(),
+                http2=_use_http2(),
+                transport=_transport,
+                event_hooks={"request": [_sync_request_hook]},
+            )
+        return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Общий асинхронный клиент (бот и веб интерфейс)
+
+    Пул привязан к event loop, поэтому при смене цикла
+    (например, повторный asyncio.run) клиент пересоздается.
+    """
+    global _async_client, _async_client_loop
+    import asyncio  # Не нужен синхронному CLI, импортируется по требованию
+
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client.is_closed or _async_client_loop is not loop:
+        _async_client = httpx.AsyncClient(
+            limits=_limits(),
+            http2=_use_http2(),
+            transport=_transport,
+            event_hooks={"request": [_async_request_hook]},
+        )
+        _async_client_loop = loop
+    return _async_client
+
+
+def get_stats() -> Dict[str, Any]:
+    """Статистика пула для веб интерфейса"""
+    data = stats.to_dict()
+    data.update({
+        "pool_size": _settings()["pool_size"],
+        "http2": _use_http2(),
+    })
+    return data
+
+
+def close():
+    """Закрыть синхронный пул"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+async def aclose():
+    """Закрыть асинхронный пул (при остановке веб интерфейса)"""
+    global _async_client, _async_client_loop
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+        _async_client_loop = None
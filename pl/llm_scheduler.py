@@ -0,0 +1,146 @@
+"""
+Общий планировщик запросов к LLM с ограничением параллельности и приоритетами
+"""
+
+import os
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Optional, Dict, Deque, Any
+
+from .tracing import get_tracer
+
+
+class Priority(IntEnum):
+    """Полосы приоритета: чем меньше значение, тем раньше запрос получит слот"""
+    INTERACTIVE = 0   # Команды @gpt - пользователь ждет ответа
+    AUTO_REPLY = 1    # Автоответы - и так ждут 5-15 секунд
+    WEB = 2           # Тестовые запросы из веб интерфейса
+
+
+class _LaneStats:
+    """Счетчики одной полосы приоритета"""
+
+    def __init__(self):
+        self.requests = 0
+        self.waited = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, wait: float):
+        self.requests += 1
+        if wait > 0.001:
+            self.waited += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "waited": self.waited,
+            "wait_avg_ms": round(self.wait_total / self.requests * 1000, 1) if self.requests else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 1),
+        }
+
+
+class LLMScheduler:
+    """
+    Ограничивает число одновременных запросов к LLM
+
+    Когда все слоты заняты, запросы ждут в очередях по приоритетам;
+    освободившийся слот получает самый старый запрос из самой
+    приоритетной непустой очереди.
+    """
+
+    def __init__(self, max_in_flight: Optional[int] = None):
+        """
+        Args:
+            max_in_flight: Максимум одновременных запросов (по умолчанию LLM_MAX_IN_FLIGHT или 8)
+        """
+        if max_in_flight is None:
+            max_in_flight = int(os.getenv('LLM_MAX_IN_FLIGHT', '8'))
+        self.max_in_flight = max(1, max_in_flight)
+
+        self.in_flight = 0
+        self._waiters: Dict[Priority, Deque[asyncio.Future]] = {p: deque() for p in Priority}
+        self._stats: Dict[Priority, _LaneStats] = {p: _LaneStats() for p in Priority}
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.INTERACTIVE):
+        """Занять слот на время запроса"""
+        await self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def set_max_in_flight(self, value: int):
+        """Изменить лимит параллельных запросов на лету"""
+        self.max_in_flight = max(1, int(value))
+        self._wake()
+
+    def queue_depth(self) -> int:
+        """Сколько запросов сейчас ждут слота"""
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Состояние очередей и время ожидания по полосам"""
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth(),
+            "lanes": {
+                p.name.lower(): dict(self._stats[p].to_dict(), queued=len(self._waiters[p]))
+                for p in Priority
+            },
+        }
+
+    async def _acquire(self, priority: Priority):
+        started = time.monotonic()
+
+        if self.in_flight < self.max_in_flight and not self.queue_depth():
+            self.in_flight += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters[priority].append(future)
+            try:
+                with get_tracer().span("queue_wait", lane=priority.name.lower()):
+                    await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Слот уже выдан, но запрос отменен - возвращаем слот
+                    self._release()
+                elif future in self._waiters[priority]:
+                    self._waiters[priority].remove(future)
+                raise
+
+        self._stats[priority].record(time.monotonic() - started)
+
+    def _release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        for priority in Priority:
+            waiters = self._waiters[priority]
+            while waiters and self.in_flight < self.max_in_flight:
+                future = waiters.popleft()
+                if future.done():
+                    continue
+                self.in_flight += 1
+                future.set_result(None)
+            if self.in_flight >= self.max_in_flight:
+                return
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def get_scheduler() -> LLMScheduler:
+    """Общий планировщик процесса"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler()
+    return _scheduler
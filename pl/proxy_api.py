@@ -3,31 +3,51 @@
 """
 
 import os
-import requests
+import time
+import httpx
 import json
-from typing import Optional, Dict, Any
-from dotenv import load_dotenv
+from typing import Optional, Dict, Any, Iterator, AsyncIterator, TYPE_CHECKING
 
-# Загружаем переменные окружения
-load_dotenv()
+from . import http_pool
+from . import metrics
+from .config import load_config
+from .tracing import get_tracer
+from .retry import RetryExecutor, ProxyAPIError, get_retry_executor
+
+if TYPE_CHECKING:
+    # Планировщик (asyncio) и кэш (sqlite3, hashlib) нужны только асинхронному
+    # клиенту и импортируются при его создании - это ускоряет старт CLI
+    from .llm_scheduler import LLMScheduler, Priority
+    from .response_cache import ResponseCache
 
 
 class ProxyAPIClient:
     """Клиент для работы с ProxyAPI GPT-4o mini"""
     
-    def __init__(self, api_key: Optional[str] = None, system_prompt: Optional[str] = None):
+    # Добавляется к ответу, обрезанному по лимиту max_tokens
+    TRUNCATED_MARK = "…"
+    
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        system_prompt: Optional[str] = None,
+        retry: Optional[RetryExecutor] = None
+    ):
         """
         Инициализация клиента
         
         Args:
             api_key: API ключ. Если не указан, берется из переменной окружения PROXY_API_KEY
             system_prompt: Системный промпт. Если не указан, используется стандартный
+            retry: Политика повторов и circuit breaker. По умолчанию общие для процесса
         """
+        load_config()
         self.api_key = api_key or os.getenv('PROXY_API_KEY')
         if not self.api_key:
             raise ValueError("API ключ не найден. Укажите его в параметре или в переменной окружения PROXY_API_KEY")
         
-        self.base_url = "https://api.proxyapi.ru"
+        # Другой адрес - для локального стенда (нагрузочный тест benchmarks/load_harness.py)
+        self.base_url = os.getenv('PROXY_API_BASE_URL', "https://api.proxyapi.ru").rstrip('/')
         self.model = "gpt-4o-mini"
         
         # Системный промпт
@@ -44,6 +64,8 @@ class ProxyAPIClient:
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        
+        self.retry = retry or get_retry_executor()
     
     def get_balance(self) -> float:
         """
@@ -55,12 +77,17 @@ class ProxyAPIClient:
         url = f"{self.base_url}/proxyapi/balance"
         
         try:
-            response = requests.get(url, headers=self.headers, timeout=30)
+            response = self.retry.call(
+                lambda: http_pool.get_client().get(url, headers=self.headers, timeout=30),
+                idempotent=True
+            )
             response.raise_for_status()
             data = response.json()
             return data.get('balance', 0.0)
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"Ошибка получения баланса: {e}")
+        except httpx.HTTPStatusError as e:
+            raise ProxyAPIError(f"Ошибка получения баланса: {e}", e.response.status_code)
+        except httpx.HTTPError as e:
+            raise ProxyAPIError(f"Ошибка получения баланса: {e}")
     
     def generate_text(
         self, 
@@ -82,8 +109,88 @@ class ProxyAPIClient:
             Сгенерированный текст
         """
         url = f"{self.base_url}/openai/v1/chat/completions"
+        payload = self._build_payload(prompt, temperature, max_tokens, top_p)
         
-        # Формируем сообщения с системным промптом
+        try:
+            response = self.retry.call(
+                lambda: http_pool.get_client().post(url, headers=self.headers, json=payload, timeout=60)
+            )
+            response.raise_for_status()
+            return self._extract_text(response.json())
+            
+        except httpx.HTTPStatusError as e:
+            raise self._status_error(e)
+        except httpx.HTTPError as e:
+            raise self._transport_error(e)
+    
+    def stream_text(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 300,
+        top_p: float = 0.95
+    ) -> Iterator[str]:
+        """
+        Потоковая генерация текста (SSE, stream: true)
+        
+        Args:
+            prompt: Текст запроса
+            temperature: Степень креативности (0.0-1.0)
+            max_tokens: Максимальное количество токенов в ответе
+            top_p: Контроль разнообразия ответа
+            
+        Yields:
+            Фрагменты ответа по мере генерации
+        """
+        url = f"{self.base_url}/openai/v1/chat/completions"
+        payload = self._build_payload(prompt, temperature, max_tokens, top_p, stream=True)
+        
+        client = http_pool.get_client()
+        
+        try:
+            # Повторы возможны только до получения заголовков ответа
+            response = self.retry.call(lambda: client.send(
+                client.build_request("POST", url, headers=self.headers, json=payload, timeout=60),
+                stream=True
+            ))
+            try:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    delta = self._extract_stream_delta(line)
+                    if delta:
+                        yield delta
+            finally:
+                response.close()
+                        
+        except httpx.HTTPStatusError as e:
+            raise self._status_error(e)
+        except httpx.HTTPError as e:
+            raise self._transport_error(e)
+    
+    def _status_error(self, error: httpx.HTTPStatusError) -> ProxyAPIError:
+        """Понятная ошибка для HTTP статуса ответа"""
+        status = error.response.status_code
+        metrics.errors.inc(type=f"http_{status}")
+        if status == 402:
+            return ProxyAPIError("Недостаточно средств на балансе", status)
+        if status == 429:
+            return ProxyAPIError("Превышен лимит запросов к ProxyAPI, попробуйте позже", status)
+        return ProxyAPIError(f"Ошибка API запроса: {error}", status)
+    
+    def _transport_error(self, error: httpx.HTTPError) -> ProxyAPIError:
+        """Ошибка соединения или таймаут"""
+        metrics.errors.inc(type=type(error).__name__)
+        return ProxyAPIError(f"Ошибка API запроса: {error}")
+    
+    def _build_payload(
+        self,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        top_p: float,
+        stream: bool = False
+    ) -> Dict[str, Any]:
+        """Формирование тела запроса chat/completions с системным промптом"""
         messages = [
             {
                 "role": "system",
@@ -102,35 +209,62 @@ class ProxyAPIClient:
             "max_tokens": max_tokens,
             "top_p": top_p
         }
-        
-        try:
-            response = requests.post(url, headers=self.headers, json=payload, timeout=60)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # Извлекаем текст из ответа OpenAI
-            if 'choices' in data and len(data['choices']) > 0:
-                choice = data['choices'][0]
-                
-                # Проверяем причину завершения
-                finish_reason = choice.get('finish_reason', '')
-                if finish_reason == 'length':
-                    raise Exception("Достигнут лимит токенов. Увеличьте max_tokens или сократите запрос.")
-                
-                if 'message' in choice and 'content' in choice['message']:
-                    content = choice['message']['content']
-                    if content:
-                        return content.strip()
-            
-            # Отладочная информация если не удалось извлечь текст
-            print(f"Отладка: полный ответ API = {json.dumps(data, ensure_ascii=False, indent=2)}")
-            raise Exception("Не удалось извлечь текст из ответа API")
+        if stream:
+            payload["stream"] = True
+            # Последний фрагмент потока будет содержать usage
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+    
+    def _extract_text(self, data: Dict[str, Any]) -> str:
+        """Извлечение текста из ответа OpenAI"""
+        if 'choices' in data and len(data['choices']) > 0:
+            choice = data['choices'][0]
             
-        except requests.exceptions.RequestException as e:
-            if hasattr(e, 'response') and e.response is not None and e.response.status_code == 402:
-                raise Exception("Недостаточно средств на балансе")
-            raise Exception(f"Ошибка API запроса: {e}")
+            if 'message' in choice and 'content' in choice['message']:
+                content = choice['message']['content']
+                if content:
+                    # Ответ обрезан по max_tokens: отдаем, что успело сгенерироваться
+                    if choice.get('finish_reason') == 'length':
+                        metrics.llm_truncated.inc()
+                        return content.strip() + self.TRUNCATED_MARK
+                    return content.strip()
+        
+        # Отладочная информация если не удалось извлечь текст
+        print(f"Отладка: полный ответ API = {json.dumps(data, ensure_ascii=False, indent=2)}")
+        raise Exception("Не удалось извлечь текст из ответа API")
+    
+    def _parse_stream_chunk(self, line: str) -> Optional[Dict[str, Any]]:
+        """Разбор строки SSE потока (None для служебных строк и [DONE])"""
+        if not line.startswith('data:'):
+            return None
+        
+        data = line[5:].strip()
+        if not data or data == '[DONE]':
+            return None
+        
+        return json.loads(data)
+    
+    def _extract_stream_delta(self, line: str) -> Optional[str]:
+        """Извлечение фрагмента текста из строки SSE потока"""
+        chunk = self._parse_stream_chunk(line)
+        if chunk is None:
+            return None
+        return self._chunk_delta(chunk)
+    
+    def _chunk_delta(self, chunk: Dict[str, Any]) -> Optional[str]:
+        """Фрагмент текста из разобранного фрагмента потока"""
+        choices = chunk.get('choices') or []
+        if not choices:
+            return None
+        
+        choice = choices[0]
+        content = (choice.get('delta') or {}).get('content')
+        if choice.get('finish_reason') == 'length':
+            # Поток оборван по max_tokens: последним фрагментом помечаем обрыв
+            metrics.llm_truncated.inc()
+            return (content or "") + self.TRUNCATED_MARK
+        
+        return content
     
     def chat(self):
         """Интерактивный чат с GPT-4o mini"""
@@ -176,6 +310,246 @@ class ProxyAPIClient:
                 print(f"\n❌ Ошибка: {e}")
 
 
+class AsyncProxyAPIClient(ProxyAPIClient):
+    """
+    Асинхронный клиент ProxyAPI поверх httpx
+    
+    Не блокирует event loop: пока идет запрос к API, Telethon и FastAPI
+    продолжают обрабатывать другие события. Соединения берутся из общего
+    пула http_pool, поэтому создавать экземпляры можно сколько угодно.
+    Запросы генерации проходят через общий планировщик LLMScheduler
+    с приоритетом клиента.
+    """
+    
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        system_prompt: Optional[str] = None,
+        priority: Optional["Priority"] = None,
+        scheduler: Optional["LLMScheduler"] = None,
+        cache: Optional["ResponseCache"] = None,
+        retry: Optional[RetryExecutor] = None
+    ):
+        """
+        Инициализация клиента
+        
+        Args:
+            api_key: API ключ. Если не указан, берется из переменной окружения PROXY_API_KEY
+            system_prompt: Системный промпт. Если не указан, используется стандартный
+            priority: Полоса приоритета запросов этого клиента (по умолчанию INTERACTIVE)
+            scheduler: Планировщик запросов. По умолчанию общий для процесса
+            cache: Кэш ответов для запросов с use_cache=True. По умолчанию общий
+            retry: Политика повторов и circuit breaker. По умолчанию общие для процесса
+        """
+        from .llm_scheduler import Priority, get_scheduler
+        from .response_cache import get_response_cache
+
+        super().__init__(api_key=api_key, system_prompt=system_prompt, retry=retry)
+        self.priority = priority if priority is not None else Priority.INTERACTIVE
+        self.scheduler = scheduler or get_scheduler()
+        self.cache = cache or get_response_cache()
+    
+    def _record_usage(self, data: Dict[str, Any], mode: str, span=None):
+        """Учесть токены запроса и ответа из поля usage (в метриках и этапе трассы)"""
+        usage = data.get('usage') or {}
+        if usage.get('prompt_tokens'):
+            metrics.llm_tokens.inc(usage['prompt_tokens'], mode=mode, direction="in")
+        if usage.get('completion_tokens'):
+            metrics.llm_tokens.inc(usage['completion_tokens'], mode=mode, direction="out")
+        if span is not None:
+            span.set("tokens_in", usage.get('prompt_tokens', 0))
+            span.set("tokens_out", usage.get('completion_tokens', 0))
+    
+    def _cache_key(self, prompt: str, temperature: float, max_tokens: int, top_p: float) -> str:
+        return self.cache.make_key(
+            self.system_prompt, prompt, self.model, temperature, top_p, max_tokens
+        )
+    
+    async def aget_balance(self) -> float:
+        """
+        Асинхронное получение баланса аккаунта
+        
+        Returns:
+            Баланс в рублях
+        """
+        url = f"{self.base_url}/proxyapi/balance"
+        
+        try:
+            response = await self.retry.acall(
+                lambda: http_pool.get_async_client().get(url, headers=self.headers, timeout=30),
+                idempotent=True
+            )
+            response.raise_for_status()
+            data = response.json()
+            return data.get('balance', 0.0)
+        except httpx.HTTPStatusError as e:
+            raise ProxyAPIError(f"Ошибка получения баланса: {e}", e.response.status_code)
+        except httpx.HTTPError as e:
+            raise ProxyAPIError(f"Ошибка получения баланса: {e}")
+    
+    async def agenerate_text(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 300,
+        top_p: float = 0.95,
+        use_cache: bool = False,
+        mode: Optional[str] = None
+    ) -> str:
+        """
+        Асинхронная генерация текста с помощью GPT-4o mini
+        
+        Args:
+            prompt: Текст запроса
+            temperature: Степень креативности (0.0-1.0)
+            max_tokens: Максимальное количество токенов в ответе
+            top_p: Контроль разнообразия ответа
+            use_cache: Вернуть сохраненный ответ на такой же запрос, если он есть
+            mode: Метка режима для метрик (general, hide, context...). По умолчанию - полоса приоритета
+            
+        Returns:
+            Сгенерированный текст
+        """
+        mode = mode or self.priority.name.lower()
+        cache_key = self._cache_key(prompt, temperature, max_tokens, top_p) if use_cache else None
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                get_tracer().add_span("llm", time.time_ns(), mode=mode, cached=True)
+                return cached
+        
+        url = f"{self.base_url}/openai/v1/chat/completions"
+        payload = self._build_payload(prompt, temperature, max_tokens, top_p)
+        
+        try:
+            async with self.scheduler.slot(self.priority):
+                with metrics.llm_latency.time(mode=mode), get_tracer().span("llm", mode=mode) as span:
+                    response = await self.retry.acall(
+                        lambda: http_pool.get_async_client().post(
+                            url, headers=self.headers, json=payload, timeout=60
+                        )
+                    )
+                    span.set("status", response.status_code)
+            response.raise_for_status()
+            data = response.json()
+            self._record_usage(data, mode, span)
+            text = self._extract_text(data)
+            if cache_key:
+                self.cache.set(cache_key, text)
+            return text
+            
+        except httpx.HTTPStatusError as e:
+            raise self._status_error(e)
+        except httpx.HTTPError as e:
+            raise self._transport_error(e)
+    
+    async def astream_text(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 300,
+        top_p: float = 0.95,
+        use_cache: bool = False,
+        mode: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Асинхронная потоковая генерация текста (SSE, stream: true)
+        
+        Args:
+            prompt: Текст запроса
+            temperature: Степень креативности (0.0-1.0)
+            max_tokens: Максимальное количество токенов в ответе
+            top_p: Контроль разнообразия ответа
+            use_cache: При попадании в кэш весь ответ приходит одним фрагментом
+            mode: Метка режима для метрик (general, hide, context...). По умолчанию - полоса приоритета
+            
+        Yields:
+            Фрагменты ответа по мере генерации
+        """
+        mode = mode or self.priority.name.lower()
+        cache_key = self._cache_key(prompt, temperature, max_tokens, top_p) if use_cache else None
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                get_tracer().add_span("llm", time.time_ns(), mode=mode, cached=True)
+                yield cached
+                return
+        
+        import asyncio  # Не нужен синхронному CLI, импортируется по требованию
+        
+        url = f"{self.base_url}/openai/v1/chat/completions"
+        payload = self._build_payload(prompt, temperature, max_tokens, top_p, stream=True)
+        parts = []
+        
+        client = http_pool.get_async_client()
+        # Фрагменты от чтения потока к потребителю; None - поток закончился
+        queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        
+        async def read_upstream():
+            """
+            Чтение потока независимо от потребителя: слот планировщика и замер
+            задержки заканчиваются вместе с ответом ProxyAPI, а не с правками
+            сообщения в Telegram (и FloodWait) на стороне потребителя
+            """
+            try:
+                async with self.scheduler.slot(self.priority):
+                    started = time.monotonic()
+                    with get_tracer().span("llm", mode=mode, stream=True) as span:
+                        # Повторы возможны только до получения заголовков ответа
+                        response = await self.retry.acall(lambda: client.send(
+                            client.build_request("POST", url, headers=self.headers, json=payload, timeout=60),
+                            stream=True
+                        ))
+                        span.set("status", response.status_code)
+                        try:
+                            response.raise_for_status()
+                            first = True
+                            async for line in response.aiter_lines():
+                                chunk = self._parse_stream_chunk(line)
+                                if chunk is None:
+                                    continue
+                                if chunk.get('usage'):
+                                    self._record_usage(chunk, mode, span)
+                                delta = self._chunk_delta(chunk)
+                                if delta:
+                                    if first:
+                                        first = False
+                                        span.set("first_token_ms", round((time.monotonic() - started) * 1000, 1))
+                                    queue.put_nowait(delta)
+                        finally:
+                            await response.aclose()
+                            metrics.llm_latency.observe(time.monotonic() - started, mode=mode)
+            finally:
+                queue.put_nowait(None)
+        
+        try:
+            producer = asyncio.ensure_future(read_upstream())
+            try:
+                while True:
+                    delta = await queue.get()
+                    if delta is None:
+                        break
+                    parts.append(delta)
+                    yield delta
+                # Ошибка чтения потока (статус, сеть) - после уже полученных фрагментов
+                await producer
+            finally:
+                # Потребитель остановился раньше конца потока (отмена, ошибка правки сообщения)
+                if not producer.done():
+                    producer.cancel()
+                elif not producer.cancelled():
+                    producer.exception()
+            
+            text = "".join(parts).strip()
+            if cache_key and text:
+                self.cache.set(cache_key, text)
+                        
+        except httpx.HTTPStatusError as e:
+            raise self._status_error(e)
+        except httpx.HTTPError as e:
+            raise self._transport_error(e)
+
+
 def main():
     """Основная функция для запуска утилиты"""
     try:
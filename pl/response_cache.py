@@ -0,0 +1,175 @@
+"""
+Кэш ответов LLM для повторяющихся запросов (rewrite, translate, fix, explain, short)
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+
+class ResponseCache:
+    """
+    LRU кэш ответов с ограничением времени жизни
+
+    Ключ - хэш от системного промпта, итогового промпта, модели и
+    параметров генерации. Если задан путь, записи дополнительно
+    хранятся в SQLite и переживают перезапуск.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        path: Optional[str] = None,
+        max_disk_entries: Optional[int] = None
+    ):
+        """
+        Args:
+            max_entries: Размер кэша в памяти (RESPONSE_CACHE_SIZE, по умолчанию 1000)
+            ttl: Время жизни записи в секундах (RESPONSE_CACHE_TTL, по умолчанию сутки)
+            path: Файл SQLite (RESPONSE_CACHE_PATH); пустое значение - только память
+            max_disk_entries: Размер кэша на диске (RESPONSE_CACHE_DISK_SIZE, по умолчанию 20000)
+        """
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('RESPONSE_CACHE_SIZE', '1000'))
+        self.ttl = ttl if ttl is not None else float(os.getenv('RESPONSE_CACHE_TTL', '86400'))
+        self.path = path if path is not None else os.getenv('RESPONSE_CACHE_PATH', '')
+        self.max_disk_entries = (max_disk_entries if max_disk_entries is not None
+                                 else int(os.getenv('RESPONSE_CACHE_DISK_SIZE', '20000')))
+
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+        if self.path:
+            self._open_db()
+
+    @staticmethod
+    def make_key(
+        system_prompt: str,
+        prompt: str,
+        model: str,
+        temperature: float,
+        top_p: float,
+        max_tokens: int
+    ) -> str:
+        """Ключ кэша для запроса"""
+        raw = json.dumps(
+            [system_prompt, prompt, model, temperature, top_p, max_tokens],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Получить ответ из кэша (None, если нет или устарел)"""
+        now = time.time()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[1] > now:
+                self._remember(key, row[0], row[1])
+                self.hits += 1
+                self.disk_hits += 1
+                return row[0]
+
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: str):
+        """Сохранить ответ"""
+        expires_at = time.time() + self.ttl
+        self._remember(key, value, expires_at)
+        self.stores += 1
+
+        if self._db is not None:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, expires_at)
+                )
+                # Периодически чистим устаревшие и лишние записи
+                if self.stores % 100 == 0:
+                    self._prune_db()
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Ошибка записи в кэш ответов: {e}")
+
+    def clear(self):
+        """Очистить кэш"""
+        self._entries.clear()
+        if self._db is not None:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика кэша"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "persistent": self._db is not None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+    def _remember(self, key: str, value: str, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _open_db(self):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Кэш ответов на диске недоступен ({self.path}): {e}")
+            self._db = None
+
+    def _prune_db(self):
+        self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,)
+        )
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Общий кэш ответов процесса"""
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache()
+    return _cache
@@ -0,0 +1,338 @@
+"""
+Повторные попытки запросов к ProxyAPI и circuit breaker
+"""
+
+import os
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict, Any, Callable, Awaitable, Tuple
+
+import httpx
+
+
+class ProxyAPIError(Exception):
+    """Ошибка запроса к ProxyAPI"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(ProxyAPIError):
+    """Запрос не отправлен: ProxyAPI считается недоступным"""
+
+
+# Ошибки, при которых запрос гарантированно не дошел до сервера
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def parse_retry_after(response: httpx.Response) -> Optional[float]:
+    """Значение заголовка Retry-After в секундах (число или HTTP дата)"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Политика повторов: экспоненциальная задержка с джиттером,
+    уважение Retry-After и общий дедлайн на все попытки
+
+    retry_statuses задает для каждого HTTP статуса максимальное число
+    попыток. Неидемпотентные запросы (генерация) повторяются только при
+    ответах, означающих, что запрос не был обработан (429, 502, 503, 504),
+    и при ошибках установки соединения.
+    """
+
+    DEFAULT_STATUSES = {429: 5, 500: 2, 502: 4, 503: 4, 504: 3}
+    SAFE_STATUSES = {429, 502, 503, 504}
+
+    def __init__(
+        self,
+        max_attempts: Optional[int] = None,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        deadline: Optional[float] = None,
+        retry_statuses: Optional[Dict[int, int]] = None
+    ):
+        """
+        Args:
+            max_attempts: Максимум попыток при сетевых ошибках (PROXY_API_RETRY_ATTEMPTS, по умолчанию 4)
+            base_delay: Базовая задержка перед первым повтором
+            max_delay: Максимальная задержка между попытками
+            deadline: Общий лимит времени на все попытки (PROXY_API_RETRY_DEADLINE, по умолчанию 45 сек)
+            retry_statuses: {HTTP статус: максимум попыток}
+        """
+        self.max_attempts = max_attempts or int(os.getenv('PROXY_API_RETRY_ATTEMPTS', '4'))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline or float(os.getenv('PROXY_API_RETRY_DEADLINE', '45'))
+        self.retry_statuses = dict(self.DEFAULT_STATUSES if retry_statuses is None else retry_statuses)
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Задержка перед попыткой attempt + 1 (full jitter)"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def should_retry_status(self, status: int, attempt: int, idempotent: bool) -> bool:
+        if status not in self.retry_statuses:
+            return False
+        if not idempotent and status not in self.SAFE_STATUSES:
+            return False
+        return attempt < self.retry_statuses[status]
+
+    def should_retry_error(self, error: Exception, attempt: int, idempotent: bool) -> bool:
+        if attempt >= self.max_attempts:
+            return False
+        if isinstance(error, _NOT_SENT_ERRORS):
+            return True
+        return idempotent and isinstance(error, httpx.TransportError)
+
+
+class CircuitBreaker:
+    """
+    Размыкается после failure_threshold сбоев подряд и отклоняет запросы
+    reset_timeout секунд, затем пропускает один пробный запрос
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None):
+        self.failure_threshold = failure_threshold or int(os.getenv('PROXY_API_BREAKER_THRESHOLD', '5'))
+        self.reset_timeout = reset_timeout or float(os.getenv('PROXY_API_BREAKER_RESET', '30'))
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос"""
+        return self.acquire()[0]
+
+    def acquire(self) -> Tuple[bool, bool]:
+        """
+        Разрешение на запрос
+
+        Returns:
+            (можно ли отправить запрос, является ли он пробным) - пробный запрос
+            должен закончиться record_success, record_failure или release_probe
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True, False
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True, True
+            return False, False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """Пробный запрос (acquire вернул is_probe) прерван без ответа: пропустить следующий"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            data = {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "times_opened": self.times_opened,
+            }
+            if self.state == self.OPEN:
+                data["retry_in"] = round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+            return data
+
+
+class RetryStats:
+    """Счетчики повторов для веб интерфейса"""
+
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.retries_by_reason: Dict[str, int] = {}
+        self.gave_up = 0
+        self.rejected_by_breaker = 0
+
+    def on_retry(self, reason: str):
+        self.retries += 1
+        self.retries_by_reason[reason] = self.retries_by_reason.get(reason, 0) + 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "retries_by_reason": dict(self.retries_by_reason),
+            "gave_up": self.gave_up,
+            "rejected_by_breaker": self.rejected_by_breaker,
+        }
+
+
+def _is_upstream_failure(status: int) -> bool:
+    """Ответы, которые говорят о проблеме на стороне ProxyAPI"""
+    return status >= 500
+
+
+class RetryExecutor:
+    """Выполняет запрос по политике повторов с учетом circuit breaker"""
+
+    def __init__(self, policy: Optional[RetryPolicy] = None, breaker: Optional[CircuitBreaker] = None):
+        self.policy = policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = RetryStats()
+
+    def _check_breaker(self) -> bool:
+        """Проверить breaker перед попыткой; True, если попытка - пробный запрос"""
+        allowed, probe = self.breaker.acquire()
+        if not allowed:
+            self.stats.rejected_by_breaker += 1
+            raise CircuitOpenError("ProxyAPI временно недоступен, повторите запрос позже")
+        return probe
+
+    def _record(self, response: httpx.Response):
+        if _is_upstream_failure(response.status_code):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def _next_delay(self, started: float, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """Задержка до следующей попытки или None, если дедлайн не позволяет"""
+        delay = self.policy.backoff(attempt, retry_after)
+        if time.monotonic() - started + delay > self.policy.deadline:
+            return None
+        return delay
+
+    def call(self, send: Callable[[], httpx.Response], idempotent: bool = False) -> httpx.Response:
+        """Синхронный запрос с повторами"""
+        self.stats.requests += 1
+        started = time.monotonic()
+        attempt = 0
+
+        while True:
+            attempt += 1
+            probe = self._check_breaker()
+            try:
+                response = send()
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                delay = self._next_delay(started, attempt) if self.policy.should_retry_error(e, attempt, idempotent) else None
+                if delay is None:
+                    self.stats.gave_up += 1
+                    raise
+                self.stats.on_retry(type(e).__name__)
+                time.sleep(delay)
+                continue
+            except BaseException:
+                # Отмена задачи или ошибка вне HTTP: наш пробный запрос не должен
+                # остаться "в полете" навсегда, иначе breaker не закроется.
+                # Чужой пробный запрос не трогаем - он должен быть один
+                if probe:
+                    self.breaker.release_probe()
+                raise
+
+            self._record(response)
+            status = response.status_code
+            if not self.policy.should_retry_status(status, attempt, idempotent):
+                return response
+
+            delay = self._next_delay(started, attempt, parse_retry_after(response))
+            if delay is None:
+                self.stats.gave_up += 1
+                return response
+            response.close()
+            self.stats.on_retry(str(status))
+            time.sleep(delay)
+
+    async def acall(self, send: Callable[[], Awaitable[httpx.Response]], idempotent: bool = False) -> httpx.Response:
+        """Асинхронный запрос с повторами (send может вернуть потоковый ответ)"""
+        import asyncio  # Не нужен синхронному CLI, импортируется по требованию
+
+        self.stats.requests += 1
+        started = time.monotonic()
+        attempt = 0
+
+        while True:
+            attempt += 1
+            probe = self._check_breaker()
+            try:
+                response = await send()
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                delay = self._next_delay(started, attempt) if self.policy.should_retry_error(e, attempt, idempotent) else None
+                if delay is None:
+                    self.stats.gave_up += 1
+                    raise
+                self.stats.on_retry(type(e).__name__)
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Отмена задачи или ошибка вне HTTP: наш пробный запрос не должен
+                # остаться "в полете" навсегда, иначе breaker не закроется.
+                # Чужой пробный запрос не трогаем - он должен быть один
+                if probe:
+                    self.breaker.release_probe()
+                raise
+
+            self._record(response)
+            status = response.status_code
+            if not self.policy.should_retry_status(status, attempt, idempotent):
+                return response
+
+            delay = self._next_delay(started, attempt, parse_retry_after(response))
+            if delay is None:
+                self.stats.gave_up += 1
+                return response
+            await response.aclose()
+            self.stats.on_retry(str(status))
+            await asyncio.sleep(delay)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика повторов и состояние circuit breaker"""
+        data = self.stats.to_dict()
+        data["breaker"] = self.breaker.to_dict()
+        return data
+
+
+_executor: Optional[RetryExecutor] = None
+
+
+def get_retry_executor() -> RetryExecutor:
+    """Общий исполнитель повторов процесса (один breaker на весь ProxyAPI)"""
+    global _executor
+    if _executor is None:
+        _executor = RetryExecutor()
+    return _executor
@@ -0,0 +1,265 @@
+"""
+Постоянное хранилище состояния автоответа (SQLite с отложенной записью)
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from collections import deque
+from typing import Optional, Dict, List, Tuple, Deque, Any
+
+
+class StateStore:
+    """
+    Настройки автоответа, список чатов и обработанные сообщения
+
+    Изменения сразу применяются к копии в памяти, а на диск записываются
+    фоновым потоком пачками раз в flush_interval секунд, поэтому
+    переключение чата в веб интерфейсе не ждет диска. Файл читается
+    целиком один раз при открытии, новый экземпляр бота получает
+    состояние из памяти.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        flush_interval: Optional[float] = None,
+        processed_limit: Optional[int] = None
+    ):
+        """
+        Args:
+            path: Файл SQLite (BOT_STATE_PATH); без него состояние живет только в памяти процесса
+            flush_interval: Период записи изменений в секундах (BOT_STATE_FLUSH_INTERVAL, по умолчанию 1)
+            processed_limit: Сколько последних обработанных сообщений хранить (BOT_STATE_PROCESSED_LIMIT, 5000)
+        """
+        self.path = path if path is not None else os.getenv('BOT_STATE_PATH', '')
+        self.flush_interval = flush_interval or float(os.getenv('BOT_STATE_FLUSH_INTERVAL', '1'))
+        self.processed_limit = processed_limit or int(os.getenv('BOT_STATE_PROCESSED_LIMIT', '5000'))
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()        # Состояние в памяти и очередь изменений
+        self._db_lock = threading.Lock()     # Запись на диск (одна транзакция за раз, по порядку)
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+        # Текущее состояние в памяти - переживает остановку и запуск бота в том же процессе
+        self._settings: Dict[str, Any] = {}
+        self._chats: Dict[int, Dict[str, Any]] = {}
+        self._processed: Deque[Tuple[int, int]] = deque(maxlen=self.processed_limit)
+
+        # Очередь изменений для диска: None в _pending_chats означает удаление
+        self._pending_settings: Optional[Dict[str, Any]] = None
+        self._pending_chats: Dict[int, Optional[Dict[str, Any]]] = {}
+        self._pending_processed: List[Tuple[int, int]] = []
+
+        self.flushes = 0
+        self.rows_written = 0
+
+        if self.path:
+            self._open_db()
+        if self._db is not None:
+            self._read_db()
+
+    @property
+    def persistent(self) -> bool:
+        return self._db is not None
+
+    def load(self) -> Dict[str, Any]:
+        """
+        Последнее сохраненное состояние (файл читается один раз при открытии)
+
+        Returns:
+            {"settings": {...}, "chats": {chat_id: {...}}, "processed": [(chat_id, message_id), ...]}
+        """
+        with self._lock:
+            return {
+                "settings": dict(self._settings),
+                "chats": {chat_id: dict(info) for chat_id, info in self._chats.items()},
+                "processed": list(self._processed),
+            }
+
+    def save_settings(self, settings: Dict[str, Any]):
+        """Запомнить настройки автоответа"""
+        with self._lock:
+            self._settings = dict(settings)
+            if self._db is not None:
+                self._pending_settings = dict(settings)
+        self._schedule_flush()
+
+    def save_chat(self, chat_id: int, info: Dict[str, Any]):
+        """Запомнить чат автоответа"""
+        with self._lock:
+            self._chats[chat_id] = dict(info)
+            if self._db is not None:
+                self._pending_chats[chat_id] = dict(info)
+        self._schedule_flush()
+
+    def delete_chat(self, chat_id: int):
+        """Удалить чат автоответа"""
+        with self._lock:
+            self._chats.pop(chat_id, None)
+            if self._db is not None:
+                self._pending_chats[chat_id] = None
+        self._schedule_flush()
+
+    def add_processed(self, chat_id: int, message_id: int):
+        """Запомнить обработанное входящее сообщение"""
+        with self._lock:
+            self._processed.append((chat_id, message_id))
+            if self._db is not None:
+                self._pending_processed.append((chat_id, message_id))
+        self._schedule_flush()
+
+    def flush(self):
+        """Записать накопленные изменения на диск"""
+        if self._db is None:
+            return
+
+        # Очередь забирается под _lock, а транзакция идет только под _db_lock,
+        # чтобы изменения из обработчиков бота не ждали диска. _db_lock берется
+        # первым: пачки пишутся в том порядке, в котором забраны из очереди
+        with self._db_lock:
+            with self._lock:
+                settings, self._pending_settings = self._pending_settings, None
+                chats, self._pending_chats = self._pending_chats, {}
+                processed, self._pending_processed = self._pending_processed, []
+
+            if settings is None and not chats and not processed:
+                return
+
+            try:
+                with self._db:
+                    if settings is not None:
+                        self._db.executemany(
+                            "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                            [(key, json.dumps(value)) for key, value in settings.items()]
+                        )
+                    for chat_id, info in chats.items():
+                        if info is None:
+                            self._db.execute("DELETE FROM chats WHERE chat_id = ?", (chat_id,))
+                        else:
+                            self._db.execute(
+                                "INSERT OR REPLACE INTO chats (chat_id, name, enabled, last_activity) "
+                                "VALUES (?, ?, ?, ?)",
+                                (chat_id, info.get("name"), int(bool(info.get("enabled"))), info.get("last_activity"))
+                            )
+                    if processed:
+                        self._db.executemany(
+                            "INSERT OR IGNORE INTO processed (chat_id, message_id) VALUES (?, ?)", processed
+                        )
+                        self._db.execute(
+                            "DELETE FROM processed WHERE seq <= "
+                            "(SELECT MAX(seq) FROM processed) - ?", (self.processed_limit,)
+                        )
+                self.flushes += 1
+                self.rows_written += (len(settings) if settings else 0) + len(chats) + len(processed)
+            except sqlite3.Error as e:
+                print(f"⚠️ Ошибка сохранения состояния бота: {e}")
+
+    def close(self):
+        """Остановить фоновую запись и сохранить оставшиеся изменения"""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = (
+                (1 if self._pending_settings is not None else 0)
+                + len(self._pending_chats)
+                + len(self._pending_processed)
+            )
+        return {
+            "path": self.path or None,
+            "persistent": self.persistent,
+            "pending": pending,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+        }
+
+    def _schedule_flush(self):
+        if self._db is None:
+            return
+        if self._thread is None or not self._thread.is_alive():
+            self._closed = False
+            self._thread = threading.Thread(target=self._flush_loop, name="bot-state-writer", daemon=True)
+            self._thread.start()
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _read_db(self):
+        """Загрузить состояние из файла: по одному запросу на таблицу"""
+        try:
+            for key, value in self._db.execute("SELECT key, value FROM settings"):
+                self._settings[key] = json.loads(value)
+            for chat_id, name, enabled, last_activity in self._db.execute(
+                "SELECT chat_id, name, enabled, last_activity FROM chats"
+            ):
+                self._chats[chat_id] = {
+                    "enabled": bool(enabled),
+                    "name": name,
+                    "last_activity": last_activity,
+                }
+            rows = self._db.execute(
+                "SELECT chat_id, message_id FROM processed ORDER BY seq DESC LIMIT ?",
+                (self.processed_limit,)
+            ).fetchall()
+            self._processed.extend(reversed(rows))
+        except (sqlite3.Error, ValueError) as e:
+            print(f"⚠️ Не удалось прочитать состояние бота из {self.path}: {e}")
+
+    def _open_db(self):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(
+                "CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS chats ("
+                "chat_id INTEGER PRIMARY KEY, name TEXT, enabled INTEGER NOT NULL, last_activity REAL);"
+                "CREATE TABLE IF NOT EXISTS processed ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, chat_id INTEGER NOT NULL, message_id INTEGER NOT NULL, "
+                "UNIQUE (chat_id, message_id));"
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Хранилище состояния бота недоступно ({self.path}): {e}")
+            self._db = None
+
+
+_stores: Dict[str, StateStore] = {}
+
+
+def get_state_store(account: str = "default") -> StateStore:
+    """
+    Хранилище состояния аккаунта
+
+    Аккаунт по умолчанию пишет в BOT_STATE_PATH, остальные - в соседние
+    файлы с именем аккаунта: data/bot_state.sqlite3 -> data/bot_state.work.sqlite3
+    """
+    store = _stores.get(account)
+    if store is None:
+        path = os.getenv('BOT_STATE_PATH', '')
+        if path and account != "default":
+            root, ext = os.path.splitext(path)
+            path = f"{root}.{account}{ext}"
+        store = _stores[account] = StateStore(path=path)
+    return store
+
+
+def close_state_stores():
+    """Сохранить и закрыть хранилища всех аккаунтов"""
+    for store in _stores.values():
+        store.close()
@@ -0,0 +1,111 @@
+"""
+Постепенное редактирование сообщений Telegram при потоковой генерации
+"""
+
+import os
+import time
+import asyncio
+from typing import Callable, Optional
+
+from telethon.errors import FloodWaitError, MessageNotModifiedError
+
+from . import metrics
+from .tracing import get_tracer
+
+
+class StreamingMessageEditor:
+    """
+    Редактирует сообщение по мере поступления фрагментов ответа
+
+    Правки объединяются: первая выполняется сразу (чтобы пользователь
+    быстро увидел начало ответа), следующие - не чаще одной за
+    interval_ms и только если накопилось не меньше min_chars новых символов.
+    """
+
+    CURSOR = " ▌"
+
+    def __init__(
+        self,
+        event,
+        render: Callable[[str], str],
+        interval_ms: Optional[int] = None,
+        min_chars: Optional[int] = None
+    ):
+        """
+        Args:
+            event: Событие Telethon, сообщение которого редактируется
+            render: Функция, превращающая текущий текст ответа в текст сообщения
+            interval_ms: Минимальный интервал между правками
+            min_chars: Минимальный прирост текста между правками
+        """
+        self.event = event
+        self.render = render
+        self.interval = (interval_ms if interval_ms is not None
+                         else int(os.getenv('STREAM_EDIT_INTERVAL_MS', '1000'))) / 1000
+        self.min_chars = (min_chars if min_chars is not None
+                          else int(os.getenv('STREAM_EDIT_MIN_CHARS', '40')))
+
+        self.text = ""
+        self.edits = 0
+        self._last_edit_at = 0.0
+        self._last_edit_len = 0
+        self._last_rendered = None
+        self._blocked_until = 0.0
+
+    async def feed(self, delta: str):
+        """Добавить фрагмент ответа и при необходимости обновить сообщение"""
+        self.text += delta
+
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return
+        if self.edits > 0:
+            if now - self._last_edit_at < self.interval:
+                return
+            if len(self.text) - self._last_edit_len < self.min_chars:
+                return
+
+        try:
+            await self._edit(self.render(self.text.strip()) + self.CURSOR)
+        except FloodWaitError as e:
+            # Промежуточные правки пропускаем, пока не истечет ограничение
+            self._blocked_until = time.monotonic() + e.seconds
+            metrics.errors.inc(type="telegram_flood_wait")
+            print(f"⚠️ FloodWait при потоковом редактировании: {e.seconds} сек")
+        except Exception as e:
+            print(f"⚠️ Ошибка промежуточного редактирования: {e}")
+            metrics.errors.inc(type="telegram_edit")
+
+    async def finish(self) -> str:
+        """
+        Выполнить финальную правку с полным ответом
+
+        Returns:
+            Полный текст ответа
+        """
+        response = self.text.strip()
+        if not response:
+            raise Exception("Не удалось извлечь текст из ответа API")
+
+        # Промежуточная правка получила FloodWait - финальная подождет конца
+        # ограничения, иначе она тоже получит FloodWait
+        wait = self._blocked_until - time.monotonic()
+        if wait > 0:
+            print(f"⏳ Финальная правка через {wait:.0f} сек (FloodWait)")
+            await asyncio.sleep(wait)
+
+        await self._edit(self.render(response))
+        return response
+
+    async def _edit(self, text: str):
+        if text == self._last_rendered:
+            return
+        try:
+            with metrics.telegram_latency.time(method="edit"), get_tracer().span("edit"):
+                await self.event.edit(text)
+        except MessageNotModifiedError:
+            pass
+        self._last_rendered = text
+        self._last_edit_at = time.monotonic()
+        self._last_edit_len = len(self.text)
+        self.edits += 1
@@ -4,27 +4,47 @@ Telegram userbot для работы с ProxyAPI GPT-4o mini
 
 import os
 import re
+import time
 import asyncio
 import json
-from typing import Optional, Dict, Set, List
-from telethon import TelegramClient, events
+from collections import OrderedDict
+from typing import Optional, Dict, Set, List, Tuple
+from telethon import TelegramClient, events, utils
 from telethon.tl.types import Message
-from dotenv import load_dotenv
 
-from .proxy_api import ProxyAPIClient
-
-load_dotenv()
+from .proxy_api import AsyncProxyAPIClient
+from .llm_scheduler import Priority
+from .streaming import StreamingMessageEditor
+from .history_cache import ChatHistoryCache
+from .token_budget import TokenBudget, count_tokens, truncate_to_tokens, preload_encoding
+from .events import EventKind, get_event_log
+from . import metrics
+from .tracing import get_tracer
+from .state_store import StateStore, get_state_store
+from .dedupe import RecentKeys
+from .commands import ParsedCommand, parse_command, looks_like_command
+from .dialog_index import DialogIndex
+from .accounts import AccountConfig, default_account
+from .config import load_config
 
 
 class TelegramUserBot:
     """Telegram userbot для обработки команд @pl"""
     
-    def __init__(self):
-        """Инициализация userbot"""
+    def __init__(self, account: Optional[AccountConfig] = None):
+        """
+        Инициализация userbot
+        
+        Args:
+            account: Аккаунт Telegram (по умолчанию - из TELEGRAM_API_ID, TELEGRAM_API_HASH и TELEGRAM_PHONE)
+        """
+        load_config()
+        
         # Telegram API credentials
-        self.api_id = os.getenv('TELEGRAM_API_ID')
-        self.api_hash = os.getenv('TELEGRAM_API_HASH')
-        self.phone = os.getenv('TELEGRAM_PHONE')
+        self.account = account or default_account()
+        self.api_id = self.account.api_id
+        self.api_hash = self.account.api_hash
+        self.phone = self.account.phone
         
         if not all([self.api_id, self.api_hash]):
             raise ValueError(
@@ -33,7 +53,8 @@ class TelegramUserBot:
             )
         
         # Создаем Telegram клиент
-        self.client = TelegramClient('session', int(self.api_id), self.api_hash)
+        self.client = TelegramClient(self.account.session, int(self.api_id), self.api_hash)
+        self.me = None  # Пользователь аккаунта после авторизации
         
         # Системные промпты для разных режимов
         self.normal_system_prompt = (
@@ -57,8 +78,8 @@ class TelegramUserBot:
         )
         
         # ProxyAPI клиенты для разных режимов
-        self.normal_client = ProxyAPIClient(system_prompt=self.normal_system_prompt)
-        self.hide_client = ProxyAPIClient(system_prompt=self.hide_system_prompt)
+        self.normal_client = AsyncProxyAPIClient(system_prompt=self.normal_system_prompt)
+        self.hide_client = AsyncProxyAPIClient(system_prompt=self.hide_system_prompt)
         
         # Паттерн для команд
         self.command_pattern = re.compile(r'^@gpt\s+(.+)', re.IGNORECASE | re.DOTALL)
@@ -69,19 +90,32 @@ class TelegramUserBot:
         
         await self.client.start(phone=self.phone)
         
-        me = await self.client.get_me()
+        me = self.me = await self.client.get_me()
         print(f"✅ Авторизован как: {me.first_name} (@{me.username})")
         print("📱 UserBot активен! Используйте @gpt [ваша команда] в любом чате")
         print("🛑 Для остановки нажмите Ctrl+C")
         
-        # Регистрируем обработчик сообщений
-        @self.client.on(events.NewMessage(outgoing=True))
-        async def handle_message(event):
-            await self._process_message(event)
+        self._register_handlers()
         
         # Запускаем клиент
         await self.client.run_until_disconnected()
     
+    def _register_handlers(self):
+        """Регистрация обработчиков событий Telegram"""
+        # Регистрируем обработчик исходящих сообщений (команды @gpt);
+        # сообщения без @gpt отсеиваются фильтром и не доходят до обработчика
+        @self.client.on(events.NewMessage(outgoing=True, func=self._command_filter))
+        async def handle_outgoing_message(event):
+            await self._process_message(event)
+    
+    def _command_filter(self, event) -> bool:
+        """Фильтр события: исходящее сообщение начинается с @gpt"""
+        message_text = event.message.message
+        if message_text and looks_like_command(message_text):
+            return True
+        metrics.telegram_events.inc(account=self.account.name, handler="command", outcome="filtered")
+        return False
+    
     async def _process_message(self, event):
         """Обработка входящих сообщений"""
         try:
@@ -91,12 +125,12 @@ class TelegramUserBot:
             
             # Проверяем, является ли сообщение командой @gpt
             match = self.command_pattern.match(message_text.strip())
-            if not match:
+            if not match or not match.group(1).strip():
+                metrics.telegram_events.inc(account=self.account.name, handler="command", outcome="dropped")
                 return
             
             command = match.group(1).strip()
-            if not command:
-                return
+            metrics.telegram_events.inc(account=self.account.name, handler="command", outcome="handled")
             
             print(f"\n📝 Получена команда: {command}")
             
@@ -104,17 +138,19 @@ class TelegramUserBot:
             async with self.client.action(event.chat_id, 'typing'):
                 # Отправляем запрос к GPT
                 try:
-                    response = self.proxy_client.generate_text(
+                    response = await self.normal_client.agenerate_text(
                         command,
                         temperature=0.7,
                         max_tokens=500,
-                        top_p=0.9
+                        top_p=0.9,
+                        mode="general"
                     )
                     
                     # Показываем исходный запрос + ответ
                     original_text = event.message.message
                     full_response = f"{original_text}\n\nОтвет GPT:\n{response}"
-                    await event.edit(full_response)
+                    with metrics.telegram_latency.time(method="edit"):
+                        await event.edit(full_response)
                     print(f"✅ Ответ отправлен: {response[:100]}...")
                     
                 except Exception as e:
@@ -124,6 +160,7 @@ class TelegramUserBot:
                     
         except Exception as e:
             print(f"❌ Ошибка обработки сообщения: {e}")
+            metrics.errors.inc(type="command")
     
     async def stop(self):
         """Остановка userbot"""
@@ -135,20 +172,91 @@ class TelegramUserBot:
 class TelegramUserBotAdvanced(TelegramUserBot):
     """Расширенная версия userbot с дополнительными командами"""
     
-    def __init__(self):
-        super().__init__()
-        
-        # Расширенные паттерны команд  
-        self.patterns = {
-            # Команды с контекстом и hide: @gpt-context50-hide команда
-            'context_hide': re.compile(r'^@gpt-context(\d+)-hide\s+(.+)', re.IGNORECASE | re.DOTALL),
-            # Команды с контекстом: @gpt-context50 команда
-            'context': re.compile(r'^@gpt-context(\d+)\s+(.+)', re.IGNORECASE | re.DOTALL),
-            # Обычные команды с hide: @gpt-hide команда
-            'hide': re.compile(r'^@gpt-hide\s+(.+)', re.IGNORECASE | re.DOTALL),
-            # Обычные команды: @gpt команда
-            'general': re.compile(r'^@gpt\s+(.+)', re.IGNORECASE | re.DOTALL),
-        }
+    def __init__(self, account: Optional[AccountConfig] = None):
+        super().__init__(account)
+        
+        # Кэш последних сообщений чатов для контекста
+        self.history = ChatHistoryCache()
+        
+        # Бюджет токенов на запрос с контекстом
+        self.token_budget = TokenBudget()
+        
+        # Кэш имен отправителей для контекста {sender_id: name}, вытесняются давно не встречавшиеся
+        self._sender_names: "OrderedDict[int, str]" = OrderedDict()
+        self.sender_cache_size = 5000
+        
+        # Потоковый вывод ответа с постепенным редактированием сообщения
+        self.stream_responses = os.getenv('STREAM_RESPONSES', '1') != '0'
+        
+        # Журнал событий (общий с веб интерфейсом)
+        self.event_log = get_event_log()
+        
+        # Трассировка этапов обработки команд и автоответов
+        self.tracer = get_tracer()
+    
+    async def start(self):
+        """Запуск userbot (токенизатор загружается до первых обработчиков)"""
+        await preload_encoding()
+        await super().start()
+    
+    def _register_handlers(self):
+        """Регистрация обработчиков: кэш истории чатов и команды @gpt"""
+        # Кэш истории обновляется раньше остальных обработчиков. Это единственный
+        # обработчик NewMessage без фильтра - остальной учет новых сообщений в _on_new_message
+        @self.client.on(events.NewMessage())
+        async def handle_history_new(event):
+            self._on_new_message(event)
+        
+        @self.client.on(events.MessageEdited())
+        async def handle_history_edited(event):
+            self.history.edit(event.chat_id, event.message)
+        
+        @self.client.on(events.MessageDeleted())
+        async def handle_history_deleted(event):
+            self.history.delete(event.chat_id, event.deleted_ids)
+        
+        super()._register_handlers()
+    
+    def _on_new_message(self, event):
+        """Учет любого нового сообщения (входящего и исходящего, во всех чатах)"""
+        self.history.add(event.chat_id, event.message)
+    
+    async def _generate_and_edit(self, event, client: AsyncProxyAPIClient, prompt: str,
+                                 max_tokens: int, render, use_cache: bool = False,
+                                 mode: str = "general") -> str:
+        """
+        Генерация ответа и запись его в сообщение
+        
+        В потоковом режиме сообщение обновляется по мере генерации,
+        иначе редактируется один раз после получения полного ответа.
+        
+        Returns:
+            Полный текст ответа
+        """
+        if not self.stream_responses:
+            response = await client.agenerate_text(
+                prompt,
+                temperature=0.7,
+                max_tokens=max_tokens,
+                top_p=0.9,
+                use_cache=use_cache,
+                mode=mode
+            )
+            with metrics.telegram_latency.time(method="edit"), self.tracer.span("edit"):
+                await event.edit(render(response))
+            return response
+        
+        editor = StreamingMessageEditor(event, render)
+        async for delta in client.astream_text(
+            prompt,
+            temperature=0.7,
+            max_tokens=max_tokens,
+            top_p=0.9,
+            use_cache=use_cache,
+            mode=mode
+        ):
+            await editor.feed(delta)
+        return await editor.finish()
     
     async def _process_message(self, event):
         """Обработка входящих сообщений с расширенными командами"""
@@ -157,157 +265,238 @@ class TelegramUserBotAdvanced(TelegramUserBot):
             if not message_text:
                 return
             
-            # Проверяем специфичные команды
-            for command_type, pattern in self.patterns.items():
-                match = pattern.match(message_text.strip())
-                if match:
-                    print(f"🔍 Найдена команда типа: {command_type}")
-                    
-                    if command_type == 'context_hide':
-                        # Обрабатываем команду с контекстом и флагом hide
-                        context_count = int(match.group(1))
-                        command_text = match.group(2).strip()
-                        await self._handle_context_command(event, context_count, command_text, hide_mode=True)
-                    elif command_type == 'context':
-                        # Обрабатываем команду с контекстом (обычный режим)
-                        context_count = int(match.group(1))
-                        command_text = match.group(2).strip()
-                        await self._handle_context_command(event, context_count, command_text, hide_mode=False)
-                    elif command_type == 'hide':
-                        # Обрабатываем команду с флагом hide
-                        command_text = match.group(1).strip()
-                        await self._handle_hide_command(event, command_text)
-                    else:
-                        # Обычная команда (показываем запрос + ответ)
-                        await self._handle_command(event, command_type, match.group(1).strip())
-                    return
-            
-            print(f"⚠️ Команда не распознана: {message_text[:50]}...")
+            parse_started = time.time_ns()
+            
+            # Режим, контекст, hide, -nocache и подкоманда разбираются за один проход
+            command = parse_command(message_text)
+            if command is None:
+                metrics.telegram_events.inc(account=self.account.name, handler="command", outcome="dropped")
+                print(f"⚠️ Команда не распознана: {message_text[:50]}...")
+                return
+            
+            metrics.telegram_events.inc(account=self.account.name, handler="command", outcome="handled")
+            print(f"🔍 Найдена команда типа: {command.kind}")
+            started = time.monotonic()
+            
+            with self.tracer.trace("command", chat_id=event.chat_id, command=command.kind) as trace:
+                trace.root.start_ns = parse_started
+                self.tracer.add_span("parse", parse_started)
+                await self._dispatch_command(event, command)
+            
+            self.event_log.record(
+                EventKind.COMMAND,
+                f"Команда {command.kind} в чате {event.chat_id}",
+                chat_id=event.chat_id,
+                latency=time.monotonic() - started,
+                account=self.account.name
+            )
                     
         except Exception as e:
             print(f"❌ Ошибка обработки сообщения: {e}")
+            metrics.errors.inc(type="command")
+    
+    async def _dispatch_command(self, event, command: ParsedCommand):
+        """Вызов обработчика распознанной команды"""
+        if command.context_count is not None:
+            # Команда с контекстом (обычный режим или hide)
+            await self._handle_context_command(event, command)
+        elif command.hide:
+            # Команда с флагом hide
+            await self._handle_hide_command(event, command)
+        else:
+            # Обычная команда (показываем запрос + ответ)
+            await self._handle_command(event, command)
+    
+    async def _collect_context_lines(self, event, limit: int, fetch_limit: int,
+                                     skip_ids: Optional[Set[int]] = None) -> List[str]:
+        """
+        Сбор последних текстовых сообщений чата в виде строк "Отправитель: текст"
+        
+        Сообщения берутся из кэша истории; Telegram API вызывается только
+        при первом обращении к чату. Текущее сообщение и skip_ids пропускаются.
+        
+        Returns:
+            Строки от новых к старым (не больше limit)
+        """
+        started = time.monotonic()
+        skip_ids = (skip_ids or set()) | {event.message.id}
+        
+        with self.tracer.span("context", limit=limit) as span:
+            candidates = self.history.recent(event.chat_id, limit, skip_ids=skip_ids)
+            source = "cache"
+            
+            if candidates is None:
+                source = "telegram"
+                # Первое обращение к чату: загружаем историю один раз,
+                # дальше буфер поддерживается событиями
+                history = []
+                with self.tracer.span("iter_messages"):
+                    async for message in self.client.iter_messages(
+                        event.chat_id,
+                        limit=max(fetch_limit, self.history.backfill_limit),
+                        reverse=False  # Получаем в хронологическом порядке (новые сначала)
+                    ):
+                        history.append(message)
+                
+                self.history.backfill(event.chat_id, history)
+                candidates = self.history.recent(event.chat_id, limit, skip_ids=skip_ids)
+            
+            sender_names = await self._resolve_sender_names(candidates)
+            
+            lines = []
+            for message in candidates:
+                if message.out:
+                    sender = "Вы"
+                else:
+                    sender = sender_names.get(message.sender_id, 'Собеседник')
+                lines.append(f"{sender}: {message.message}")
+            
+            span.set("source", source)
+            span.set("messages", len(lines))
+        
+        metrics.context_fetch_latency.observe(time.monotonic() - started, source=source)
+        return lines
+    
+    async def _resolve_sender_names(self, messages: List[Message]) -> Dict[int, str]:
+        """
+        Пакетное определение имен отправителей
+        
+        Имена берутся из кэша, из сущностей, которые Telethon уже получил
+        вместе со страницей истории, а оставшиеся отправители запрашиваются
+        одним вызовом get_entity вместо get_sender() на каждое сообщение.
+        """
+        names: Dict[int, str] = {}
+        missing: Set[int] = set()
+        
+        for message in messages:
+            sender_id = message.sender_id
+            if message.out or sender_id is None or sender_id in names:
+                continue
+            
+            if sender_id in self._sender_names:
+                self._sender_names.move_to_end(sender_id)
+                names[sender_id] = self._sender_names[sender_id]
+            elif message.sender is not None:
+                names[sender_id] = self._remember_sender_name(sender_id, message.sender)
+            else:
+                missing.add(sender_id)
+        
+        if missing:
+            try:
+                with self.tracer.span("get_entity", count=len(missing)):
+                    entities = await self.client.get_entity(list(missing))
+                for entity in entities:
+                    sender_id = utils.get_peer_id(entity)
+                    names[sender_id] = self._remember_sender_name(sender_id, entity)
+            except Exception as e:
+                # Один недоступный отправитель роняет весь пакетный запрос -
+                # запрашиваем остальных по одному
+                print(f"⚠️ Не удалось получить отправителей {len(missing)} одним запросом: {e}")
+                for sender_id in missing:
+                    try:
+                        entity = await self.client.get_entity(sender_id)
+                    except Exception as e:
+                        print(f"⚠️ Не удалось получить отправителя {sender_id}: {e}")
+                        continue
+                    names[sender_id] = self._remember_sender_name(sender_id, entity)
+        
+        return names
     
-    async def _get_context_messages(self, event, limit: int = 5) -> str:
-        """Получение контекста из предыдущих сообщений"""
+    def _remember_sender_name(self, sender_id: int, sender) -> str:
+        """Сохранить имя отправителя в кэше сессии"""
+        name = getattr(sender, 'first_name', 'Собеседник') or 'Собеседник'
+        
+        self._sender_names[sender_id] = name
+        self._sender_names.move_to_end(sender_id)
+        if len(self._sender_names) > self.sender_cache_size:
+            self._sender_names.popitem(last=False)
+        return name
+    
+    async def _get_context_messages(self, event, limit: int = 5, reserved_text: str = "",
+                                    max_reply_tokens: int = 1200) -> Tuple[str, int]:
+        """
+        Получение контекста из предыдущих сообщений
+        
+        Сообщения упаковываются в бюджет токенов: берется столько последних
+        сообщений (не больше limit), сколько помещается вместе с reserved_text
+        (системный промпт и команда) и ответом.
+        
+        Returns:
+            (текст контекста, max_tokens для ответа)
+        """
         if limit <= 0:
-            return ""
+            return "", max_reply_tokens
         
         try:
             # Получаем больше сообщений, чтобы учесть фильтрацию
             fetch_limit = limit * 3  # Берем в 3 раза больше для фильтрации
-            messages = []
-            
-            async for message in self.client.iter_messages(
-                event.chat_id, 
-                limit=fetch_limit,
-                reverse=False  # Получаем в хронологическом порядке (новые сначала)
-            ):
-                # Пропускаем текущее сообщение
-                if message.id == event.message.id:
-                    continue
-                    
-                # Берем только текстовые сообщения
-                if message.message and message.message.strip():
-                    # Определяем отправителя
-                    if message.out:
-                        sender = "Вы"
-                    else:
-                        sender_user = await message.get_sender()
-                        if sender_user:
-                            sender = getattr(sender_user, 'first_name', 'Собеседник') or 'Собеседник'
-                        else:
-                            sender = 'Собеседник'
-                    
-                    messages.append(f"{sender}: {message.message}")
-                    
-                    # Останавливаемся, когда набрали нужное количество
-                    if len(messages) >= limit:
-                        break
+            found = await self._collect_context_lines(event, limit, fetch_limit)
+            messages, max_tokens = self.token_budget.pack(reserved_text, found, max_reply_tokens)
             
             if messages:
                 # Разворачиваем, чтобы показать в хронологическом порядке (старые сначала)
                 context_messages = "\n".join(reversed(messages))
                 context = f"Контекст беседы (последние {len(messages)} сообщений):\n{context_messages}\n\nОтветь на основе этого контекста:\n"
                 
-                if len(messages) < limit:
-                    print(f"⚠️ Найдено только {len(messages)} сообщений из {limit} запрошенных (проверено: {fetch_limit})")
+                if len(messages) < len(found):
+                    print(f"✂️ В бюджет токенов поместилось {len(messages)} сообщений из {len(found)}")
+                if len(found) < limit:
+                    print(f"⚠️ Найдено только {len(found)} сообщений из {limit} запрошенных (проверено: {fetch_limit})")
                 else:
                     print(f"📚 Добавлен контекст из {len(messages)} сообщений (запрошено: {limit}, проверено: {fetch_limit})")
-                return context
+                return context, max_tokens
             
-            return ""
+            return "", max_tokens
             
         except Exception as e:
             print(f"⚠️ Ошибка получения контекста: {e}")
-            return ""
+            return "", max_reply_tokens
     
-    async def _handle_context_command(self, event, context_count: int, command_text: str, hide_mode: bool = False):
+    async def _handle_context_command(self, event, command: ParsedCommand):
         """Обработка команды с контекстом"""
+        hide_mode = command.hide
         mode_text = "hide " if hide_mode else ""
-        print(f"\n📝 Команда с контекстом [{context_count}] {mode_text}: {command_text[:50]}...")
+        print(f"\n📝 Команда с контекстом [{command.context_count}] {mode_text}: {command.text[:50]}...")
         
         # Ограничиваем контекст разумными пределами
-        context_limit = max(0, min(context_count, 50))
-        
-        # Получаем контекст
-        context = await self._get_context_messages(event, context_limit)
-        
-        # Определяем тип команды из текста команды
-        command_type = 'general'
-        content = command_text
-        
-        # Проверяем, начинается ли с известной команды
-        if command_text.startswith('rewrite '):
-            command_type = 'rewrite'
-            content = command_text[8:].strip()
-        elif command_text.startswith('translate '):
-            command_type = 'translate'
-            content = command_text[10:].strip()
-        elif command_text.startswith('explain '):
-            command_type = 'explain'
-            content = command_text[8:].strip()
-        elif command_text.startswith('fix '):
-            command_type = 'fix'
-            content = command_text[4:].strip()
-        elif command_text.startswith('short '):
-            command_type = 'short'
-            content = command_text[6:].strip()
-        
-        # Формируем промпт
-        prompts = {
-            'rewrite': f"Переформулируй этот текст, чтобы он звучал более естественно и грамотно:\n\n{content}",
-            'translate': f"Переведи этот текст на русский язык:\n\n{content}",
-            'explain': f"Объясни простыми словами:\n\n{content}",
-            'fix': f"Исправь ошибки в этом тексте:\n\n{content}",
-            'short': f"Сократи этот текст, сохранив основную мысль:\n\n{content}",
-            'general': content
-        }
+        context_limit = max(0, min(command.context_count, 50))
         
-        base_prompt = prompts.get(command_type, content)
+        base_prompt = command.prompt
+        
+        # Выбираем правильный клиент в зависимости от режима
+        client = self.hide_client if hide_mode else self.normal_client
+        
+        # Получаем контекст в пределах бюджета токенов
+        context, max_tokens = await self._get_context_messages(
+            event, context_limit,
+            reserved_text=client.system_prompt + base_prompt,
+            max_reply_tokens=1200  # Больше токенов для контекста
+        )
         final_prompt = context + base_prompt if context else base_prompt
         
         # Показываем индикатор набора текста
         async with self.client.action(event.chat_id, 'typing'):
             try:
-                # Выбираем правильный клиент в зависимости от режима
-                client = self.hide_client if hide_mode else self.normal_client
+
+                # В режиме hide заменяем сообщение только ответом
+                if hide_mode:
+                    render = lambda text: text
+                else:
+                    # Обычный режим: сохраняем исходный текст + добавляем ответ  
+                    original_text = event.message.message
+                    render = lambda text: f"{original_text}\n\nОтвет GPT:\n{text}"
                 
-                response = client.generate_text(
-                    final_prompt,
-                    temperature=0.7,
-                    max_tokens=1200,  # Больше токенов для контекста
-                    top_p=0.9
+                response = await self._generate_and_edit(
+                    event, client, final_prompt,
+                    max_tokens=max_tokens,
+                    render=render,
+                    use_cache=command.cacheable,
+                    mode="context"
                 )
                 
-                # В режиме hide заменяем сообщение только ответом
                 if hide_mode:
-                    await event.edit(response)
                     print(f"✅ Ответ с контекстом (hide режим) отправлен: {response[:100]}...")
                 else:
-                    # Обычный режим: сохраняем исходный текст + добавляем ответ  
-                    original_text = event.message.message
-                    full_response = f"{original_text}\n\nОтвет GPT:\n{response}"
-                    await event.edit(full_response)
                     print(f"✅ Ответ с контекстом отправлен: {response[:100]}...")
                 
             except Exception as e:
@@ -315,55 +504,23 @@ class TelegramUserBotAdvanced(TelegramUserBot):
                 await event.edit(error_msg)
                 print(f"❌ Ошибка: {e}")
     
-    async def _handle_hide_command(self, event, command_text: str):
+    async def _handle_hide_command(self, event, command: ParsedCommand):
         """Обработка команды с флагом hide (без контекста)"""
-        print(f"\n📝 Hide команда: {command_text[:50]}...")
-        
-        # Определяем тип команды из текста команды
-        command_type = 'general'
-        content = command_text
-        
-        # Проверяем, начинается ли с известной команды
-        if command_text.startswith('rewrite '):
-            command_type = 'rewrite'
-            content = command_text[8:].strip()
-        elif command_text.startswith('translate '):
-            command_type = 'translate'
-            content = command_text[10:].strip()
-        elif command_text.startswith('explain '):
-            command_type = 'explain'
-            content = command_text[8:].strip()
-        elif command_text.startswith('fix '):
-            command_type = 'fix'
-            content = command_text[4:].strip()
-        elif command_text.startswith('short '):
-            command_type = 'short'
-            content = command_text[6:].strip()
-        
-        # Формируем промпт
-        prompts = {
-            'rewrite': f"Переформулируй этот текст, чтобы он звучал более естественно и грамотно:\n\n{content}",
-            'translate': f"Переведи этот текст на русский язык:\n\n{content}",
-            'explain': f"Объясни простыми словами:\n\n{content}",
-            'fix': f"Исправь ошибки в этом тексте:\n\n{content}",
-            'short': f"Сократи этот текст, сохранив основную мысль:\n\n{content}",
-            'general': content
-        }
+        print(f"\n📝 Hide команда: {command.text[:50]}...")
         
-        final_prompt = prompts.get(command_type, content)
+        final_prompt = command.prompt
         
         # Показываем индикатор набора текста
         async with self.client.action(event.chat_id, 'typing'):
             try:
-                response = self.hide_client.generate_text(
-                    final_prompt,
-                    temperature=0.7,
+                # Режим hide: заменяем сообщение только ответом (от лица пользователя)
+                response = await self._generate_and_edit(
+                    event, self.hide_client, final_prompt,
                     max_tokens=1000,
-                    top_p=0.9
+                    render=lambda text: text,
+                    use_cache=command.cacheable,
+                    mode="hide"
                 )
-                
-                # Режим hide: заменяем сообщение только ответом (от лица пользователя)
-                await event.edit(response)
                 print(f"✅ Ответ (hide режим) отправлен: {response[:100]}...")
                 
             except Exception as e:
@@ -371,66 +528,28 @@ class TelegramUserBotAdvanced(TelegramUserBot):
                 await event.edit(error_msg)
                 print(f"❌ Ошибка: {e}")
     
-    async def _handle_command(self, event, command_type: str, content: str):
+    async def _handle_command(self, event, command: ParsedCommand):
         """Обработка конкретной команды"""
-        if not content:
+        if not command.content:
             return
         
-        print(f"\n📝 Команда [{command_type}]: {content[:50]}...")
-        
-        # Для общих команд определяем подтип из содержимого
-        actual_command_type = command_type
-        actual_content = content
-        
-        if command_type == 'general':
-            # Проверяем, начинается ли с известной подкоманды
-            if content.startswith('rewrite '):
-                actual_command_type = 'rewrite'
-                actual_content = content[8:].strip()
-            elif content.startswith('translate '):
-                actual_command_type = 'translate'
-                actual_content = content[10:].strip()
-            elif content.startswith('explain '):
-                actual_command_type = 'explain'
-                actual_content = content[8:].strip()
-            elif content.startswith('fix '):
-                actual_command_type = 'fix'
-                actual_content = content[4:].strip()
-            elif content.startswith('short '):
-                actual_command_type = 'short'
-                actual_content = content[6:].strip()
-        
-        # Логируем результат разбора
-        if actual_command_type != command_type:
-            print(f"📋 Разобрано как: [{actual_command_type}] '{actual_content[:30]}...'")
-        
-        # Формируем промпт в зависимости от типа команды
-        prompts = {
-            'rewrite': f"Переформулируй этот текст, чтобы он звучал более естественно и грамотно:\n\n{actual_content}",
-            'translate': f"Переведи этот текст на русский язык:\n\n{actual_content}",
-            'explain': f"Объясни простыми словами:\n\n{actual_content}",
-            'fix': f"Исправь ошибки в этом тексте:\n\n{actual_content}",
-            'short': f"Сократи этот текст, сохранив основную мысль:\n\n{actual_content}",
-            'general': actual_content
-        }
+        print(f"\n📝 Команда [{command.subcommand}]: {command.content[:50]}...")
         
         # Формируем промпт (без контекста для обычных команд)
-        final_prompt = prompts.get(actual_command_type, actual_content)
+        final_prompt = command.prompt
         
         # Показываем индикатор набора текста
         async with self.client.action(event.chat_id, 'typing'):
             try:
-                response = self.normal_client.generate_text(
-                    final_prompt,
-                    temperature=0.7,
-                    max_tokens=1000,
-                    top_p=0.9
-                )
-                
                 # Обычный режим: показываем исходный запрос + ответ
                 original_text = event.message.message
-                full_response = f"{original_text}\n\nОтвет GPT:\n{response}"
-                await event.edit(full_response)
+                response = await self._generate_and_edit(
+                    event, self.normal_client, final_prompt,
+                    max_tokens=1000,
+                    render=lambda text: f"{original_text}\n\nОтвет GPT:\n{text}",
+                    use_cache=command.cacheable,
+                    mode="general"
+                )
                 print(f"✅ Ответ отправлен: {response[:100]}...")
                 
             except Exception as e:
@@ -442,8 +561,8 @@ class TelegramUserBotAdvanced(TelegramUserBot):
 class TelegramUserBotWithAutoReply(TelegramUserBotAdvanced):
     """Расширенная версия userbot с функцией автоответа"""
     
-    def __init__(self):
-        super().__init__()
+    def __init__(self, account: Optional[AccountConfig] = None, state_store: Optional[StateStore] = None):
+        super().__init__(account)
         
         # Настройки автоответа
         self.auto_reply_chats: Dict[int, Dict] = {}  # {chat_id: {"enabled": True, "name": "Chat Name", "last_activity": timestamp}}
@@ -451,6 +570,8 @@ class TelegramUserBotWithAutoReply(TelegramUserBotAdvanced):
             "delay_min": 5,    # Минимальная задержка в секундах
             "delay_max": 15,   # Максимальная задержка в секундах
             "context_messages": 10,  # Количество сообщений для контекста
+            "context_tokens": 2000,  # Бюджет токенов на запрос (промпт + контекст + ответ)
+            "debounce_seconds": 3,   # Окно объединения сообщений подряд в один ответ
             "enabled": True    # Глобальное включение/выключение
         }
         
@@ -469,10 +590,28 @@ class TelegramUserBotWithAutoReply(TelegramUserBotAdvanced):
             "- В остальных случаях отвечай естественно и по существу"
         )
         
-        self.auto_reply_client = ProxyAPIClient(system_prompt=self.auto_reply_prompt)
+        self.auto_reply_client = AsyncProxyAPIClient(
+            system_prompt=self.auto_reply_prompt,
+            priority=Priority.AUTO_REPLY
+        )
+        
+        # Сохраненные чаты, настройки и обработанные сообщения (переживают перезапуск)
+        self.state_store = state_store or get_state_store(self.account.name)
+        
+        # Последние обработанные сообщения по (chat_id, message_id): id сообщений уникальны только внутри чата
+        self.processed_messages = RecentKeys(self.state_store.processed_limit)
+        
+        # Включенные чаты для фильтра входящих сообщений (пересобирается при изменении списка)
+        self._auto_reply_enabled_chats: frozenset = frozenset()
+        self._load_state()
         
-        # Список последних обработанных сообщений (избегаем дублирования)
-        self.processed_messages: Set[int] = set()
+        # Очередь автоответов по чатам: накопленные сообщения и задачи ответа
+        self._pending_replies: Dict[int, List] = {}
+        self._reply_tasks: Dict[int, asyncio.Task] = {}
+        self._sending_chats: Set[int] = set()
+        
+        # Список диалогов для веб интерфейса, обновляемый событиями
+        self.dialogs = DialogIndex()
     
     async def start(self):
         """Запуск userbot с автоответом"""
@@ -480,61 +619,83 @@ class TelegramUserBotWithAutoReply(TelegramUserBotAdvanced):
         
         await self.client.start(phone=self.phone)
         
-        me = await self.client.get_me()
+        me = self.me = await self.client.get_me()
         print(f"✅ Авторизован как: {me.first_name} (@{me.username})")
         print("📱 UserBot активен!")
         print("🤖 Автоответ включен для выбранных диалогов")
         print("🛑 Для остановки нажмите Ctrl+C")
         
-        # Регистрируем обработчик исходящих сообщений (команды @gpt)
-        @self.client.on(events.NewMessage(outgoing=True))
-        async def handle_outgoing_message(event):
-            await self._process_message(event)
-        
-        # Регистрируем обработчик входящих сообщений (автоответ)
-        @self.client.on(events.NewMessage(incoming=True))
-        async def handle_incoming_message(event):
-            await self._process_auto_reply(event)
+        await preload_encoding()
+        self._register_handlers()
+        self.dialogs.start(self.client)
         
         # Запускаем клиент
         await self.client.run_until_disconnected()
     
+    def _register_handlers(self):
+        """Регистрация обработчиков: команды @gpt, кэш истории и автоответ"""
+        super()._register_handlers()
+        
+        # Список диалогов: активность учитывается в _on_new_message, здесь - переименования чатов
+        @self.client.on(events.ChatAction(func=lambda e: e.new_title is not None))
+        async def handle_chat_renamed(event):
+            self.dialogs.rename(event.chat_id, event.new_title)
+        
+        # Регистрируем обработчик входящих сообщений (автоответ) только для включенных чатов
+        @self.client.on(events.NewMessage(incoming=True, func=self._auto_reply_filter))
+        async def handle_incoming_message(event):
+            await self._process_auto_reply(event)
+    
+    def _on_new_message(self, event):
+        """Кэш истории и активность в списке диалогов - из одного обработчика NewMessage"""
+        super()._on_new_message(event)
+        self.dialogs.on_message(event.chat_id, event.message.date, event.out, event.chat)
+    
+    def _auto_reply_filter(self, event) -> bool:
+        """Фильтр события: автоответ включен глобально и для чата"""
+        if self.auto_reply_settings.get("enabled", True) and event.chat_id in self._auto_reply_enabled_chats:
+            return True
+        metrics.telegram_events.inc(account=self.account.name, handler="auto_reply", outcome="filtered")
+        return False
+    
+    def _sync_auto_reply_filter(self):
+        """Пересобрать множество чатов для фильтра после изменения списка"""
+        self._auto_reply_enabled_chats = frozenset(
+            chat_id for chat_id, info in self.auto_reply_chats.items() if info.get("enabled", False)
+        )
+    
     async def _process_auto_reply(self, event):
         """Обработка входящих сообщений для автоответа"""
         try:
-            # Проверяем глобальное включение автоответа
-            if not self.auto_reply_settings.get("enabled", True):
-                return
-            
             chat_id = event.chat_id
             message_id = event.message.id
             
-            # Избегаем повторной обработки
-            if message_id in self.processed_messages:
-                return
-            
-            # Проверяем, включен ли автоответ для этого чата
-            if chat_id not in self.auto_reply_chats or not self.auto_reply_chats[chat_id].get("enabled", False):
+            # Чат и глобальное включение уже проверены фильтром события; здесь - повторы и пустые сообщения
+            if (chat_id, message_id) in self.processed_messages:
+                metrics.telegram_events.inc(account=self.account.name, handler="auto_reply", outcome="dropped")
                 return
             
             # Проверяем, что это текстовое сообщение
             if not event.message.message or not event.message.message.strip():
+                metrics.telegram_events.inc(account=self.account.name, handler="auto_reply", outcome="dropped")
                 return
             
+            metrics.telegram_events.inc(account=self.account.name, handler="auto_reply", outcome="handled")
+            
             # Добавляем в обработанные
-            self.processed_messages.add(message_id)
+            self.processed_messages.add((chat_id, message_id))
+            self.state_store.add_processed(chat_id, message_id)
             
-            # Ограничиваем размер множества обработанных сообщений
-            if len(self.processed_messages) > 1000:
-                # Оставляем только последние 500
-                self.processed_messages = set(list(self.processed_messages)[-500:])
+            # Трасса автоответа: от получения сообщения до отправки ответа
+            trace = self.tracer.start_trace("auto_reply", chat_id=chat_id)
             
             # Получаем информацию о сообщении
             message_text = event.message.message or ""
             sender_info = "Unknown"
             
             try:
-                sender = await event.get_sender()
+                with self.tracer.activate(trace), self.tracer.span("get_sender"):
+                    sender = await event.get_sender()
                 if sender:
                     sender_info = getattr(sender, 'first_name', 'Unknown') or getattr(sender, 'username', 'Unknown') or 'Unknown'
             except:
@@ -545,11 +706,89 @@ class TelegramUserBotWithAutoReply(TelegramUserBotAdvanced):
             print(f"📝 Текст: '{message_text[:100]}{'...' if len(message_text) > 100 else ''}'")
             print(f"📊 Тип: {type(event.message.media).__name__ if event.message.media else 'текст'}")
             
-            # Получаем контекст
-            context = await self._get_auto_reply_context(event)
+            self._schedule_auto_reply(event, trace)
+            self.event_log.record(
+                EventKind.AUTO_REPLY_RECEIVED,
+                f"Автоответ: получено сообщение в чате {chat_id}",
+                chat_id=chat_id,
+                account=self.account.name
+            )
+                    
+        except Exception as e:
+            print(f"❌ Ошибка обработки автоответа: {e}")
+            self.event_log.record(EventKind.AUTO_REPLY_ERROR, f"Ошибка обработки автоответа: {e}",
+                                  level="ERROR", chat_id=event.chat_id, account=self.account.name)
+    
+    def _schedule_auto_reply(self, event, trace=None):
+        """
+        Поставить сообщение в очередь автоответа чата
+        
+        Сообщения, пришедшие в течение окна debounce_seconds, объединяются
+        в один ход. Если ответ для чата еще готовится, он отменяется и
+        начинается заново уже со всеми новыми сообщениями; ответ, который
+        уже отправляется, не прерывается.
+        """
+        chat_id = event.chat_id
+        self._pending_replies.setdefault(chat_id, []).append(event)
+        
+        wait_for = None
+        previous = self._reply_tasks.get(chat_id)
+        if previous is not None and not previous.done():
+            if chat_id in self._sending_chats:
+                wait_for = previous
+            else:
+                previous.cancel()
+                print(f"🔀 Автоответ для чата {chat_id} перезапущен с новыми сообщениями")
+        
+        self._reply_tasks[chat_id] = asyncio.create_task(self._run_auto_reply(chat_id, wait_for, trace))
+    
+    async def _run_auto_reply(self, chat_id: int, wait_for: Optional[asyncio.Task] = None, trace=None):
+        """Подготовка и отправка одного ответа на накопленные сообщения чата"""
+        trace = trace or self.tracer.start_trace("auto_reply", chat_id=chat_id)
+        trace_tokens = self.tracer.attach(trace)
+        trace_status = "ok"
+        batch: List = []
+        try:
+            if wait_for is not None:
+                # Дожидаемся отправки предыдущего ответа, не отменяя его
+                try:
+                    with self.tracer.span("wait_previous"):
+                        await asyncio.shield(wait_for)
+                except Exception:
+                    pass
+            
+            # Окно накопления сообщений
+            with self.tracer.span("debounce"):
+                await asyncio.sleep(self.auto_reply_settings.get("debounce_seconds", 3))
+            
+            batch = list(self._pending_replies.get(chat_id, []))
+            if not batch:
+                trace_status = "empty"
+                return
+            last_event = batch[-1]
+            trace.root.set("batch_size", len(batch))
+            
+            if len(batch) > 1:
+                print(f"📦 Объединено {len(batch)} сообщений в чате {chat_id}")
+            
+            # Новые сообщения хода (слишком длинные обрезаются)
+            new_messages = "\n".join(
+                truncate_to_tokens(e.message.message, self.token_budget.max_message_tokens) for e in batch
+            )
+            
+            # Получаем контекст (без сообщений текущего хода) в пределах бюджета токенов
+            batch_ids = {e.message.id for e in batch}
+            context, max_tokens = await self._get_auto_reply_context(
+                last_event,
+                skip_ids=batch_ids,
+                reserved_text=self.auto_reply_client.system_prompt + new_messages
+            )
             
             # Формируем промпт
-            prompt = f"{context}\n\nНовое сообщение: {message_text}\n\nОтветь естественно:"
+            if len(batch) == 1:
+                prompt = f"{context}\n\nНовое сообщение: {new_messages}\n\nОтветь естественно:"
+            else:
+                prompt = f"{context}\n\nНовые сообщения:\n{new_messages}\n\nОтветь естественно одним сообщением:"
             
             # Добавляем случайную задержку
             import random
@@ -559,82 +798,148 @@ class TelegramUserBotWithAutoReply(TelegramUserBotAdvanced):
             )
             
             print(f"⏱️ Задержка перед ответом: {delay} сек")
-            await asyncio.sleep(delay)
+            with self.tracer.span("delay", seconds=delay):
+                await asyncio.sleep(delay)
             
             # Показываем индикатор набора текста
             async with self.client.action(chat_id, 'typing'):
-                await asyncio.sleep(1)  # Имитируем печатание
+                with self.tracer.span("typing"):
+                    await asyncio.sleep(1)  # Имитируем печатание
                 
                 try:
-                    response = self.auto_reply_client.generate_text(
+                    started = time.monotonic()
+                    response = await self.auto_reply_client.agenerate_text(
                         prompt,
                         temperature=0.8,
-                        max_tokens=300,
-                        top_p=0.9
+                        max_tokens=max_tokens,
+                        top_p=0.9,
+                        mode="auto_reply"
                     )
+                    latency = time.monotonic() - started
                     
                     # Проверяем, нужно ли пропустить ответ
                     if response.strip().upper() == 'SKIP':
+                        self._finish_batch(chat_id, batch)
+                        trace_status = "skipped"
+                        self.event_log.record(
+                            EventKind.AUTO_REPLY_SKIPPED,
+                            f"Автоответ в чате {chat_id} пропущен",
+                            chat_id=chat_id,
+                            latency=latency,
+                            account=self.account.name
+                        )
+                        message_text = last_event.message.message
                         print("⏭️ GPT решил пропустить этот ответ")
                         print(f"🔍 Возможные причины: стикер, фото без текста, неуместно отвечать")
                         print(f"💭 Сообщение было: '{message_text[:50]}{'...' if len(message_text) > 50 else ''}'")
                         return
                     
-                    # Отправляем ответ
-                    await self.client.send_message(chat_id, response)
+                    # Отправляем ответ (новые сообщения больше не прерывают этот ход)
+                    self._sending_chats.add(chat_id)
+                    try:
+                        self._finish_batch(chat_id, batch)
+                        with metrics.telegram_latency.time(method="send"), self.tracer.span("send"):
+                            await self.client.send_message(chat_id, response)
+                    finally:
+                        self._sending_chats.discard(chat_id)
                     print(f"✅ Автоответ отправлен: {response[:100]}...")
                     print(f"📊 Длина ответа: {len(response)} символов")
+                    self.event_log.record(
+                        EventKind.AUTO_REPLY_SENT,
+                        f"Автоответ отправлен в чат {chat_id}",
+                        chat_id=chat_id,
+                        latency=latency,
+                        tokens=count_tokens(response),
+                        account=self.account.name
+                    )
                     
+                except asyncio.CancelledError:
+                    raise
                 except Exception as e:
                     print(f"❌ Ошибка автоответа: {e}")
+                    metrics.errors.inc(type="auto_reply")
+                    trace_status = "error"
+                    # Не отвечаем на этот ход: иначе сообщения копились бы при каждом сбое
+                    # ProxyAPI и попали бы в ответ на следующее сообщение, возможно через часы
+                    self._finish_batch(chat_id, batch)
+                    self.event_log.record(EventKind.AUTO_REPLY_ERROR, f"Ошибка автоответа в чате {chat_id}: {e}",
+                                          level="ERROR", chat_id=chat_id, account=self.account.name)
                     
+        except asyncio.CancelledError:
+            # Ход перезапущен из-за новых сообщений или бот остановлен
+            trace_status = "cancelled"
         except Exception as e:
             print(f"❌ Ошибка обработки автоответа: {e}")
+            self.event_log.record(EventKind.AUTO_REPLY_ERROR, f"Ошибка обработки автоответа: {e}",
+                                  level="ERROR", chat_id=chat_id, account=self.account.name)
+            trace_status = "error"
+            self._finish_batch(chat_id, batch)
+        finally:
+            self.tracer.detach(trace_tokens)
+            self.tracer.finish(trace, trace_status)
+            if self._reply_tasks.get(chat_id) is asyncio.current_task():
+                del self._reply_tasks[chat_id]
     
-    async def _get_auto_reply_context(self, event, limit: int = None) -> str:
-        """Получение контекста для автоответа"""
+    def _finish_batch(self, chat_id: int, batch: List):
+        """Убрать сообщения хода из очереди чата (повторный вызов ничего не меняет)"""
+        done = {id(event) for event in batch}
+        pending = self._pending_replies.get(chat_id, [])
+        pending[:] = [event for event in pending if id(event) not in done]
+        if not pending:
+            self._pending_replies.pop(chat_id, None)
+    
+    async def _get_auto_reply_context(self, event, limit: int = None, skip_ids: Optional[Set[int]] = None,
+                                      reserved_text: str = "", max_reply_tokens: int = 300) -> Tuple[str, int]:
+        """
+        Получение контекста для автоответа
+        
+        Returns:
+            (текст контекста, max_tokens для ответа)
+        """
         if limit is None:
             limit = self.auto_reply_settings.get("context_messages", 10)
             
         try:
-            messages = []
-            
-            async for message in self.client.iter_messages(
-                event.chat_id,
-                limit=limit + 5,  # Берем больше для фильтрации
-                reverse=False
-            ):
-                # Пропускаем текущее сообщение
-                if message.id == event.message.id:
-                    continue
-                
-                # Берем только текстовые сообщения
-                if message.message and message.message.strip():
-                    # Определяем отправителя
-                    if message.out:
-                        sender = "Вы"
-                    else:
-                        sender_user = await message.get_sender()
-                        if sender_user:
-                            sender = getattr(sender_user, 'first_name', 'Собеседник') or 'Собеседник'
-                        else:
-                            sender = 'Собеседник'
-                    
-                    messages.append(f"{sender}: {message.message}")
-                    
-                    if len(messages) >= limit:
-                        break
+            found = await self._collect_context_lines(event, limit, limit + 5, skip_ids)  # Берем больше для фильтрации
+            messages, max_tokens = self.token_budget.pack(
+                reserved_text, found, max_reply_tokens,
+                total_tokens=self.auto_reply_settings.get("context_tokens", 2000)
+            )
             
             if messages:
                 # Разворачиваем для хронологического порядка
                 context_messages = "\n".join(reversed(messages))
-                return f"Контекст беседы:\n{context_messages}"
+                return f"Контекст беседы:\n{context_messages}", max_tokens
             
-            return "Начало беседы."
+            return "Начало беседы.", max_tokens
             
         except Exception as e:
             print(f"⚠️ Ошибка получения контекста для автоответа: {e}")
-            return "Контекст недоступен."
+            return "Контекст недоступен.", max_reply_tokens
+    
+    async def stop(self):
+        """Остановка userbot с отменой ожидающих автоответов"""
+        for task in list(self._reply_tasks.values()):
+            task.cancel()
+        self._reply_tasks.clear()
+        self._pending_replies.clear()
+        self.state_store.flush()
+        await self.dialogs.stop()
+        
+        await super().stop()
+    
+    def _load_state(self):
+        """Восстановить чаты, настройки и обработанные сообщения из хранилища"""
+        state = self.state_store.load()
+        for key, value in state["settings"].items():
+            if key in self.auto_reply_settings:
+                self.auto_reply_settings[key] = value
+        self.auto_reply_chats.update(state["chats"])
+        self._sync_auto_reply_filter()
+        for key in state["processed"]:
+            self.processed_messages.add(tuple(key))
+        if state["chats"]:
+            print(f"💾 Восстановлено чатов автоответа: {len(state['chats'])}")
     
     def add_auto_reply_chat(self, chat_id: int, chat_name: str = "Unknown") -> bool:
         """Добавить чат для автоответа"""
@@ -644,6 +949,8 @@ class TelegramUserBotWithAutoReply(TelegramUserBotAdvanced):
                 "name": chat_name,
                 "last_activity": None
             }
+            self.state_store.save_chat(chat_id, self.auto_reply_chats[chat_id])
+            self._sync_auto_reply_filter()
             print(f"✅ Добавлен чат для автоответа: {chat_name} ({chat_id})")
             return True
         except Exception as e:
@@ -656,6 +963,8 @@ class TelegramUserBotWithAutoReply(TelegramUserBotAdvanced):
             if chat_id in self.auto_reply_chats:
                 chat_name = self.auto_reply_chats[chat_id].get("name", "Unknown")
                 del self.auto_reply_chats[chat_id]
+                self.state_store.delete_chat(chat_id)
+                self._sync_auto_reply_filter()
                 print(f"✅ Удален чат из автоответа: {chat_name} ({chat_id})")
                 return True
             return False
@@ -669,6 +978,8 @@ class TelegramUserBotWithAutoReply(TelegramUserBotAdvanced):
             if chat_id in self.auto_reply_chats:
                 current_status = self.auto_reply_chats[chat_id].get("enabled", False)
                 self.auto_reply_chats[chat_id]["enabled"] = not current_status
+                self.state_store.save_chat(chat_id, self.auto_reply_chats[chat_id])
+                self._sync_auto_reply_filter()
                 chat_name = self.auto_reply_chats[chat_id].get("name", "Unknown")
                 status = "включен" if not current_status else "выключен"
                 print(f"✅ Автоответ для {chat_name}: {status}")
@@ -691,8 +1002,13 @@ class TelegramUserBotWithAutoReply(TelegramUserBotAdvanced):
                 self.auto_reply_settings["delay_max"] = max(self.auto_reply_settings["delay_min"], int(settings["delay_max"]))
             if "context_messages" in settings:
                 self.auto_reply_settings["context_messages"] = max(1, min(50, int(settings["context_messages"])))
+            if "context_tokens" in settings:
+                self.auto_reply_settings["context_tokens"] = max(500, min(16000, int(settings["context_tokens"])))
+            if "debounce_seconds" in settings:
+                self.auto_reply_settings["debounce_seconds"] = max(0, min(60, int(settings["debounce_seconds"])))
             if "enabled" in settings:
                 self.auto_reply_settings["enabled"] = bool(settings["enabled"])
+            self.state_store.save_settings(self.auto_reply_settings)
             
             print("✅ Настройки автоответа обновлены")
             return True
@@ -704,50 +1020,27 @@ class TelegramUserBotWithAutoReply(TelegramUserBotAdvanced):
         """Получить настройки автоответа"""
         return self.auto_reply_settings.copy()
     
-    async def get_dialogs_list(self, limit: int = 50) -> List[Dict]:
-        """Получить список диалогов пользователя"""
-        try:
-            dialogs = []
-            
-            async for dialog in self.client.iter_dialogs(limit=limit):
-                # Получаем информацию о диалоге
-                chat_id = dialog.id
-                
-                # Определяем название и тип
-                if dialog.is_user:
-                    # Личный диалог
-                    name = dialog.name or f"User {chat_id}"
-                    chat_type = "user"
-                elif dialog.is_group:
-                    # Группа
-                    name = dialog.name or f"Group {chat_id}"
-                    chat_type = "group"
-                elif dialog.is_channel:
-                    # Канал
-                    name = dialog.name or f"Channel {chat_id}"
-                    chat_type = "channel"
-                else:
-                    # Другое
-                    name = dialog.name or f"Chat {chat_id}"
-                    chat_type = "other"
-                
-                # Проверяем, есть ли этот чат в автоответах
-                is_auto_reply_enabled = chat_id in self.auto_reply_chats and self.auto_reply_chats[chat_id].get("enabled", False)
-                
-                dialogs.append({
-                    "chat_id": chat_id,
-                    "name": name,
-                    "type": chat_type,
-                    "unread_count": dialog.unread_count,
-                    "auto_reply_enabled": is_auto_reply_enabled
-                })
-            
-            print(f"📋 Получено {len(dialogs)} диалогов")
-            return dialogs
-            
-        except Exception as e:
-            print(f"❌ Ошибка получения диалогов: {e}")
-            return []
+    async def get_dialogs_list(self, cursor: Optional[str] = None, limit: int = 50,
+                               query: str = "", chat_type: Optional[str] = None) -> Dict:
+        """
+        Страница списка диалогов пользователя из кэша
+        
+        Список загружается один раз при запуске и обновляется событиями и в фоне;
+        запрос ждет Telegram, только если первая загрузка еще не закончилась.
+        
+        Returns:
+            {"dialogs": [...], "next_cursor": ..., "total": ..., "as_of": ..., "refreshing": ...}
+        """
+        await self.dialogs.wait_ready()
+        page = self.dialogs.page(cursor=cursor, limit=limit, query=query, chat_type=chat_type)
+        
+        # Отмечаем чаты с включенным автоответом
+        for dialog in page["dialogs"]:
+            dialog["auto_reply_enabled"] = dialog["chat_id"] in self._auto_reply_enabled_chats
+        
+        stats = self.dialogs.get_stats()
+        page.update(as_of=stats["as_of"], refreshing=stats["refreshing"], error=stats["error"])
+        return page
 
 
 async def main():
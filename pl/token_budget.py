@@ -0,0 +1,133 @@
+"""
+Подсчет токенов и упаковка контекста в бюджет запроса
+"""
+
+import os
+from typing import List, Optional, Tuple
+
+
+# Служебные токены формата chat/completions: роли и разделители сообщений
+MESSAGE_OVERHEAD_TOKENS = 12
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """Токенизатор tiktoken (o200k_base, как у gpt-4o-mini), если пакет установлен"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            # Пакета нет или словарь не скачать - используем оценку
+            _encoding = None
+        _encoding_loaded = True
+    return _encoding
+
+
+async def preload_encoding():
+    """
+    Загрузить токенизатор заранее в пуле потоков
+
+    Первая загрузка словаря (чтение, а то и скачивание) занимает до секунд,
+    поэтому бот вызывает ее при запуске, а не в первом обработчике сообщения.
+    """
+    import asyncio
+    await asyncio.get_running_loop().run_in_executor(None, _get_encoding)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Количество токенов в тексте
+
+    Без tiktoken используется оценка сверху по длине в байтах UTF-8
+    (около 4 байт на токен), чтобы бюджет не превышался.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text.encode('utf-8')) + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Обрезать текст до max_tokens токенов (с многоточием в конце)"""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    encoding = _get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text)[:max_tokens]).rstrip() + "…"
+
+    # Оценка: отрезаем символы, пока длина в байтах не влезет в бюджет
+    limit = max_tokens * 4
+    result = text.encode('utf-8')[:limit].decode('utf-8', errors='ignore')
+    return result.rstrip() + "…"
+
+
+class TokenBudget:
+    """
+    Бюджет токенов на один запрос: системный промпт + контекст + ответ
+
+    Контекст набирается от новых сообщений к старым, пока помещается,
+    длинные сообщения обрезаются, а max_tokens ответа берется из остатка.
+    """
+
+    def __init__(
+        self,
+        total_tokens: Optional[int] = None,
+        max_message_tokens: Optional[int] = None,
+        min_reply_tokens: int = 150
+    ):
+        """
+        Args:
+            total_tokens: Бюджет на весь запрос (CONTEXT_TOKEN_BUDGET, по умолчанию 6000)
+            max_message_tokens: Максимум токенов на одно сообщение контекста
+                (CONTEXT_MESSAGE_MAX_TOKENS, по умолчанию 300)
+            min_reply_tokens: Сколько токенов оставить на ответ в любом случае
+        """
+        self.total_tokens = total_tokens or int(os.getenv('CONTEXT_TOKEN_BUDGET', '6000'))
+        self.max_message_tokens = max_message_tokens or int(os.getenv('CONTEXT_MESSAGE_MAX_TOKENS', '300'))
+        self.min_reply_tokens = min_reply_tokens
+
+    def pack(
+        self,
+        reserved_text: str,
+        lines: List[str],
+        max_reply_tokens: int,
+        total_tokens: Optional[int] = None
+    ) -> Tuple[List[str], int]:
+        """
+        Выбрать строки контекста, помещающиеся в бюджет
+
+        Args:
+            reserved_text: То, что войдет в запрос в любом случае (системный промпт, команда)
+            lines: Строки контекста от новых к старым
+            max_reply_tokens: Желаемый максимум токенов ответа
+            total_tokens: Бюджет на запрос (по умолчанию из настроек)
+
+        Returns:
+            (выбранные строки от новых к старым, max_tokens для ответа)
+        """
+        total = total_tokens or self.total_tokens
+        fixed = count_tokens(reserved_text) + MESSAGE_OVERHEAD_TOKENS
+
+        # Сначала резервируем место под ответ, остальное - под контекст
+        reply_reserve = max(self.min_reply_tokens, min(max_reply_tokens, total - fixed))
+        available = total - fixed - reply_reserve
+
+        packed = []
+        used = 0
+        for line in lines:
+            line = truncate_to_tokens(line, self.max_message_tokens)
+            cost = count_tokens(line) + 1  # + перенос строки
+            if used + cost > available:
+                break
+            packed.append(line)
+            used += cost
+
+        reply_tokens = max(self.min_reply_tokens, min(max_reply_tokens, total - fixed - used))
+        return packed, reply_tokens
@@ -0,0 +1,292 @@
+"""
+Трассировка этапов обработки команд и автоответов
+"""
+
+import os
+import json
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Optional, Dict, List, Tuple, Any
+
+
+class Span:
+    """Один этап обработки"""
+
+    __slots__ = ("span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, parent_id: Optional[str] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value: Any):
+        """Добавить атрибут"""
+        self.attributes[key] = value
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_ns is None:
+            return None
+        return round((self.end_ns - self.start_ns) / 1e6, 1)
+
+    def to_dict(self, trace_start_ns: int) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "offset_ms": round((self.start_ns - trace_start_ns) / 1e6, 1),
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Заглушка, когда активной трассы нет"""
+
+    def set(self, key: str, value: Any):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """Трасса одного запроса: корневой этап и вложенные"""
+
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = os.urandom(16).hex()
+        self.root = Span(name, attributes=attributes)
+        self.spans: List[Span] = [self.root]
+        self.status = "running"
+
+    @property
+    def name(self) -> str:
+        return self.root.name
+
+    def summary(self) -> Dict[str, Any]:
+        """Краткое описание для списка трасс: длительность по этапам"""
+        stages: Dict[str, float] = {}
+        for span in self.spans[1:]:
+            if span.parent_id == self.root.span_id and span.duration_ms is not None:
+                stages[span.name] = round(stages.get(span.name, 0.0) + span.duration_ms, 1)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.root.start_ns / 1e9)),
+            "duration_ms": self.root.duration_ms,
+            "status": self.status,
+            "attributes": self.root.attributes,
+            "stages": stages,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = self.summary()
+        data["spans"] = [span.to_dict(self.root.start_ns) for span in self.spans]
+        return data
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Трасса в формате OTLP/JSON (как в экспорте OpenTelemetry Collector)"""
+        def attributes(values: Dict[str, Any]) -> List[Dict[str, Any]]:
+            result = []
+            for key, value in values.items():
+                if isinstance(value, bool):
+                    typed = {"boolValue": value}
+                elif isinstance(value, int):
+                    typed = {"intValue": str(value)}
+                elif isinstance(value, float):
+                    typed = {"doubleValue": value}
+                else:
+                    typed = {"stringValue": str(value)}
+                result.append({"key": key, "value": typed})
+            return result
+
+        spans = []
+        for span in self.spans:
+            item = {
+                "traceId": self.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns or span.start_ns),
+                "attributes": attributes(span.attributes),
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+            }
+            if span.parent_id:
+                item["parentSpanId"] = span.parent_id
+            spans.append(item)
+
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": attributes({"service.name": "pl-telegram-bot"})},
+                "scopeSpans": [{"scope": {"name": "pl.tracing"}, "spans": spans}],
+            }]
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("pl_current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("pl_current_span", default=None)
+
+
+def _reset(var: ContextVar, token):
+    try:
+        var.reset(token)
+    except ValueError:
+        # Асинхронный генератор закрыт в другом контексте - сбрасывать нечего
+        pass
+
+
+class Tracer:
+    """
+    Создает трассы и хранит последние завершенные
+
+    Активная трасса передается через contextvars, поэтому этапы можно
+    отмечать в любом месте кода (клиент ProxyAPI, планировщик) без
+    передачи объектов трассы. Вне трассы span() ничего не делает.
+    """
+
+    def __init__(self, capacity: Optional[int] = None, export_path: Optional[str] = None):
+        """
+        Args:
+            capacity: Сколько последних трасс хранить (TRACE_STORE_SIZE, по умолчанию 200)
+            export_path: Файл для экспорта в OTLP/JSON, по строке на трассу (TRACE_EXPORT_PATH)
+        """
+        self.capacity = capacity or int(os.getenv('TRACE_STORE_SIZE', '200'))
+        self.export_path = export_path if export_path is not None else os.getenv('TRACE_EXPORT_PATH', '')
+        self._traces: "OrderedDict[str, Trace]" = OrderedDict()
+        self.finished = 0
+
+    def start_trace(self, name: str, **attributes) -> Trace:
+        """Начать трассу (этапы записываются в нее только после activate)"""
+        return Trace(name, attributes)
+
+    def attach(self, trace: Trace) -> Tuple[Token, Token]:
+        """Сделать трассу текущей (парный вызов - detach)"""
+        return _current_trace.set(trace), _current_span.set(trace.root)
+
+    def detach(self, tokens: Tuple[Token, Token]):
+        trace_token, span_token = tokens
+        _reset(_current_span, span_token)
+        _reset(_current_trace, trace_token)
+
+    @contextmanager
+    def activate(self, trace: Trace):
+        """Сделать трассу текущей на время блока"""
+        tokens = self.attach(trace)
+        try:
+            yield trace
+        finally:
+            self.detach(tokens)
+
+    def finish(self, trace: Trace, status: str = "ok"):
+        """Завершить трассу и сохранить ее"""
+        if trace.status != "running":
+            return
+        trace.root.end()
+        if status == "ok" and any(span.error for span in trace.spans):
+            status = "error"
+        trace.status = status
+        if status == "error" and trace.root.error is None:
+            trace.root.error = "error"
+
+        self._traces[trace.trace_id] = trace
+        while len(self._traces) > self.capacity:
+            self._traces.popitem(last=False)
+        self.finished += 1
+
+        if self.export_path:
+            self._export(trace)
+
+    @contextmanager
+    def trace(self, name: str, **attributes):
+        """Трасса на время блока; исключение помечает ее как ошибочную"""
+        trace = self.start_trace(name, **attributes)
+        with self.activate(trace):
+            try:
+                yield trace
+            except BaseException as e:
+                trace.root.error = str(e) or type(e).__name__
+                self.finish(trace, status="error")
+                raise
+        self.finish(trace)
+
+    def add_span(self, name: str, start_ns: int, **attributes):
+        """Записать уже завершившийся этап, начавшийся в start_ns (time.time_ns())"""
+        trace = _current_trace.get()
+        if trace is None:
+            return
+        parent = _current_span.get()
+        span = Span(name, parent.span_id if parent else trace.root.span_id, attributes)
+        span.start_ns = start_ns
+        span.end()
+        trace.spans.append(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Этап внутри текущей трассы"""
+        trace = _current_trace.get()
+        if trace is None:
+            yield _NOOP_SPAN
+            return
+
+        parent = _current_span.get()
+        span = Span(name, parent.span_id if parent else trace.root.span_id, attributes)
+        trace.spans.append(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = str(e) or type(e).__name__
+            raise
+        finally:
+            span.end()
+            _reset(_current_span, token)
+
+    def current_trace(self) -> Optional[Trace]:
+        return _current_trace.get()
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Краткое описание последних трасс, от новых к старым"""
+        traces = list(self._traces.values())[-limit:]
+        return [trace.summary() for trace in reversed(traces)]
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        trace = self._traces.get(trace_id)
+        return trace.to_dict() if trace else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "stored": len(self._traces),
+            "capacity": self.capacity,
+            "finished": self.finished,
+            "export_path": self.export_path or None,
+        }
+
+    def _export(self, trace: Trace):
+        try:
+            with open(self.export_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(trace.to_otlp(), ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"⚠️ Не удалось экспортировать трассу в {self.export_path}: {e}")
+
+
+_tracer: Optional[Tracer] = None
+
+
+def get_tracer() -> Tracer:
+    """Общий трассировщик процесса"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+    return _tracer
@@ -3,32 +3,40 @@
 """
 
 import os
-import asyncio
 import json
 from typing import Optional, Dict, List
 from datetime import datetime
 from fastapi import FastAPI, Request, Form, HTTPException, BackgroundTasks
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 import uvicorn
-from dotenv import load_dotenv
 
 from .telegram_client import TelegramUserBotWithAutoReply
-from .proxy_api import ProxyAPIClient
+from .bot_host import get_bot_host
+from .proxy_api import AsyncProxyAPIClient
+from .llm_scheduler import Priority, get_scheduler
+from .response_cache import get_response_cache
+from .retry import get_retry_executor
+from .balance_service import get_balance_service
+from .events import EventKind, AUTO_REPLY_KINDS, get_event_log
+from . import http_pool
+from . import metrics
+from .tracing import get_tracer
+from .state_store import close_state_stores
+from .config import load_config
 
-load_dotenv()
+# Сервер: хост аккаунтов и журнал событий ниже создаются при импорте и читают окружение
+load_config()
 
 app = FastAPI(title="Telegram Bot Manager", description="Веб интерфейс для управления Telegram ботом")
 
 # Настройка шаблонов
 templates = Jinja2Templates(directory="templates")
 
-# Глобальные переменные для состояния бота
-bot_instance: Optional[TelegramUserBotWithAutoReply] = None
-bot_task: Optional[asyncio.Task] = None
-is_bot_running = False
-bot_logs: List[Dict] = []
+# Боты аккаунтов Telegram (общие планировщик LLM, пул соединений и кэш ответов)
+bot_host = get_bot_host()
+bot_logs = get_event_log()
 
 # Состояние настроек
 bot_settings = {
@@ -38,34 +46,85 @@ bot_settings = {
     "system_prompt_hide": "",
 }
 
+def _queue_depth_metrics():
+    for lane, lane_stats in get_scheduler().get_stats()["lanes"].items():
+        yield (lane,), lane_stats["queued"]
+
+def _cache_metrics():
+    response_stats = get_response_cache().get_stats()
+    yield ("response", "hit"), response_stats["hits"]
+    yield ("response", "miss"), response_stats["misses"]
+    bots = bot_host.running_bots()
+    if bots:
+        history_stats = [bot.history.get_stats() for bot in bots]
+        yield ("history", "hit"), sum(stats["hits"] for stats in history_stats)
+        yield ("history", "miss"), sum(stats["misses"] for stats in history_stats)
+
+def _upstream_metrics():
+    stats = get_retry_executor().get_stats()
+    yield ("requests",), stats["requests"]
+    yield ("retries",), stats["retries"]
+    yield ("gave_up",), stats["gave_up"]
+    yield ("rejected_by_breaker",), stats["rejected_by_breaker"]
+
+def _http_pool_metrics():
+    stats = http_pool.get_stats()
+    yield ("new",), stats["new_connections"]
+    yield ("reused",), stats["reused_connections"]
+
+metrics.registry.callback(
+    "pl_llm_queue_depth", "Запросы к LLM, ожидающие слота планировщика, по полосам приоритета",
+    "gauge", ["lane"], _queue_depth_metrics
+)
+metrics.registry.callback(
+    "pl_llm_in_flight", "Запросы к LLM, выполняющиеся сейчас", "gauge", [],
+    lambda: [((), get_scheduler().in_flight)]
+)
+metrics.registry.callback(
+    "pl_cache_lookups_total", "Обращения к кэшам ответов и истории чатов", "counter",
+    ["cache", "result"], _cache_metrics
+)
+metrics.registry.callback(
+    "pl_upstream_requests_total", "Запросы к ProxyAPI, повторы и отказы circuit breaker", "counter",
+    ["outcome"], _upstream_metrics
+)
+metrics.registry.callback(
+    "pl_upstream_breaker_open", "1, если circuit breaker ProxyAPI разомкнут", "gauge", [],
+    lambda: [((), int(get_retry_executor().breaker.to_dict()["state"] != "closed"))]
+)
+metrics.registry.callback(
+    "pl_http_connections_total", "Новые и переиспользованные соединения пула к ProxyAPI", "counter",
+    ["connection"], _http_pool_metrics
+)
+
 def add_log(level: str, message: str):
     """Добавить запись в лог"""
-    global bot_logs
-    log_entry = {
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "level": level,
-        "message": message
-    }
-    bot_logs.append(log_entry)
-    
-    # Ограничиваем количество логов
-    if len(bot_logs) > 100:
-        bot_logs = bot_logs[-100:]
+    bot_logs.record(EventKind.LOG, message, level=level)
+
+def _get_bot(account: Optional[str] = None) -> Optional[TelegramUserBotWithAutoReply]:
+    """Запущенный бот аккаунта (None - аккаунт по умолчанию)"""
+    try:
+        return bot_host.get(account) if bot_host.is_running(account) else None
+    except Exception:
+        return None
 
 @app.get("/", response_class=HTMLResponse)
-async def main_page(request: Request):
+async def main_page(request: Request, account: Optional[str] = None):
     """Главная страница веб интерфейса"""
-    try:
-        # Получаем информацию о балансе
-        proxy_client = ProxyAPIClient()
-        balance = proxy_client.get_balance()
-        balance_info = f"{balance:.2f} ₽"
-    except Exception as e:
-        balance_info = f"Ошибка: {str(e)}"
+    # Баланс берется из кэша и не задерживает отрисовку страницы
+    balance = get_balance_service().snapshot()
+    if balance["balance"] is not None:
+        balance_info = f"{balance['balance']:.2f} ₽ (на {balance['as_of']})"
+    elif balance["error"]:
+        balance_info = f"Ошибка: {balance['error']}"
+    else:
+        balance_info = "⏳ Обновляется..."
     
     # Получаем информацию об автоответах
     auto_reply_chats = []
     auto_reply_settings = {}
+    account = account if account in bot_host.accounts else bot_host.default_account
+    bot_instance = _get_bot(account)
     if bot_instance:
         auto_reply_chats = [
             {
@@ -79,39 +138,27 @@ async def main_page(request: Request):
     
     return templates.TemplateResponse("index.html", {
         "request": request,
-        "is_bot_running": is_bot_running,
+        "is_bot_running": bot_instance is not None,
+        "account": account,
+        "accounts": bot_host.status(),
         "balance": balance_info,
-        "bot_logs": bot_logs[-10:],  # Последние 10 записей
+        "bot_logs": [event.to_dict() for event in bot_logs.recent(10)],  # Последние 10 записей
+        "last_log_seq": bot_logs.last_seq,
         "settings": bot_settings,
         "auto_reply_chats": auto_reply_chats,
         "auto_reply_settings": auto_reply_settings
     })
 
 @app.post("/bot/start")
-async def start_bot(background_tasks: BackgroundTasks):
-    """Запуск бота"""
-    global bot_instance, bot_task, is_bot_running
-    
-    if is_bot_running:
-        return JSONResponse({"status": "error", "message": "Бот уже запущен"})
-    
+async def start_bot(account: Optional[str] = None):
+    """Запуск бота аккаунта"""
     try:
-        bot_instance = TelegramUserBotWithAutoReply()
-        add_log("INFO", "Создан экземпляр бота с автоответом")
+        account = bot_host.resolve(account)
+        if bot_host.is_running(account):
+            return JSONResponse({"status": "error", "message": "Бот уже запущен"})
         
-        # Запускаем бота в фоновой задаче
-        async def run_bot():
-            global is_bot_running
-            try:
-                is_bot_running = True
-                add_log("INFO", "Бот запускается...")
-                await bot_instance.start()
-            except Exception as e:
-                add_log("ERROR", f"Ошибка при работе бота: {str(e)}")
-                is_bot_running = False
-        
-        bot_task = asyncio.create_task(run_bot())
-        add_log("INFO", "Бот успешно запущен")
+        await bot_host.start(account)
+        add_log("INFO", f"Бот аккаунта {account} запускается...")
         
         return JSONResponse({"status": "success", "message": "Бот запущен"})
     
@@ -120,29 +167,15 @@ async def start_bot(background_tasks: BackgroundTasks):
         return JSONResponse({"status": "error", "message": str(e)})
 
 @app.post("/bot/stop")
-async def stop_bot():
-    """Остановка бота"""
-    global bot_instance, bot_task, is_bot_running
-    
-    if not is_bot_running:
-        return JSONResponse({"status": "error", "message": "Бот не запущен"})
-    
+async def stop_bot(account: Optional[str] = None):
+    """Остановка бота аккаунта"""
     try:
-        is_bot_running = False
-        
-        if bot_instance:
-            await bot_instance.stop()
-            add_log("INFO", "Бот остановлен")
-        
-        if bot_task and not bot_task.done():
-            bot_task.cancel()
-            try:
-                await bot_task
-            except asyncio.CancelledError:
-                pass
+        account = bot_host.resolve(account)
+        if not bot_host.is_running(account):
+            return JSONResponse({"status": "error", "message": "Бот не запущен"})
         
-        bot_instance = None
-        bot_task = None
+        await bot_host.stop(account)
+        add_log("INFO", f"Бот аккаунта {account} остановлен")
         
         return JSONResponse({"status": "success", "message": "Бот остановлен"})
     
@@ -151,20 +184,77 @@ async def stop_bot():
         return JSONResponse({"status": "error", "message": str(e)})
 
 @app.get("/bot/status")
-async def bot_status():
+async def bot_status(account: Optional[str] = None):
     """Получить статус бота"""
     return JSONResponse({
-        "is_running": is_bot_running,
+        "is_running": _get_bot(account) is not None,
         "logs_count": len(bot_logs)
     })
 
+@app.get("/api/accounts")
+async def get_accounts():
+    """Аккаунты процесса и состояние их ботов"""
+    return JSONResponse({"status": "success", "accounts": bot_host.status()})
+
+@app.get("/metrics")
+async def get_metrics():
+    """Метрики в формате Prometheus"""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/api/balance")
-async def get_balance():
-    """Получить баланс ProxyAPI"""
+async def get_balance(refresh: bool = False):
+    """
+    Получить баланс ProxyAPI
+
+    Возвращает кэшированное значение с временем получения (as_of);
+    refresh=true запрашивает свежее значение, но ждет его не дольше 10 секунд.
+    """
+    balance = await get_balance_service().get(force=refresh)
+    if balance["balance"] is None:
+        return JSONResponse({
+            "status": "error",
+            "message": balance["error"] or "Баланс еще не получен, попробуйте позже"
+        })
+    return JSONResponse(dict(balance, status="success"))
+
+@app.get("/api/http/stats")
+async def get_http_stats():
+    """Статистика пула HTTP соединений к ProxyAPI"""
+    return JSONResponse({"status": "success", "stats": http_pool.get_stats()})
+
+@app.get("/api/upstream/status")
+async def get_upstream_status():
+    """Повторы запросов к ProxyAPI и состояние circuit breaker"""
+    return JSONResponse({"status": "success", "stats": get_retry_executor().get_stats()})
+
+@app.get("/api/llm/scheduler")
+async def get_llm_scheduler_stats():
+    """Состояние планировщика запросов к LLM: слоты, очереди, время ожидания"""
+    return JSONResponse({"status": "success", "stats": get_scheduler().get_stats()})
+
+@app.post("/api/llm/scheduler")
+async def update_llm_scheduler(request: Request):
+    """Изменить лимит одновременных запросов к LLM"""
     try:
-        proxy_client = ProxyAPIClient()
-        balance = proxy_client.get_balance()
-        return JSONResponse({"status": "success", "balance": balance})
+        data = await request.json()
+        get_scheduler().set_max_in_flight(int(data["max_in_flight"]))
+        add_log("INFO", f"Лимит параллельных запросов к LLM: {data['max_in_flight']}")
+        return JSONResponse({"status": "success", "stats": get_scheduler().get_stats()})
+    except Exception as e:
+        return JSONResponse({"status": "error", "message": str(e)})
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Статистика кэша ответов LLM"""
+    return JSONResponse({"status": "success", "stats": get_response_cache().get_stats()})
+
+@app.post("/api/cache/clear")
+async def clear_cache():
+    """Очистить кэш ответов LLM"""
+    try:
+        get_response_cache().clear()
+        add_log("INFO", "Кэш ответов очищен")
+        return JSONResponse({"status": "success", "message": "Кэш очищен"})
     except Exception as e:
         return JSONResponse({"status": "error", "message": str(e)})
 
@@ -178,8 +268,8 @@ async def test_gpt(request: Request):
         if not prompt:
             return JSONResponse({"status": "error", "message": "Не указан prompt"})
         
-        proxy_client = ProxyAPIClient()
-        response = proxy_client.generate_text(
+        proxy_client = AsyncProxyAPIClient(priority=Priority.WEB)
+        response = await proxy_client.agenerate_text(
             prompt,
             temperature=bot_settings.get("temperature", 0.7),
             max_tokens=bot_settings.get("max_tokens", 500)
@@ -193,34 +283,97 @@ async def test_gpt(request: Request):
         return JSONResponse({"status": "error", "message": str(e)})
 
 @app.get("/api/logs")
-async def get_logs():
-    """Получить логи"""
-    return JSONResponse({"logs": bot_logs})
+async def get_logs(since: int = 0):
+    """Получить логи (только записи с номером больше since)"""
+    return JSONResponse({
+        "logs": [event.to_dict() for event in bot_logs.since(since)],
+        "last_seq": bot_logs.last_seq
+    })
+
+@app.get("/api/logs/stream")
+async def stream_logs(request: Request, since: Optional[int] = None):
+    """
+    Поток новых записей лога (Server-Sent Events)
+
+    Начальная позиция - заголовок Last-Event-ID, если он есть, иначе параметр
+    since, иначе текущий конец журнала. Браузер переподключается по тому же
+    адресу (с исходным since) и передает Last-Event-ID, поэтому заголовок
+    важнее параметра - иначе каждое переподключение повторяло бы журнал.
+    """
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        since = int(last_event_id)
+    elif since is None:
+        since = bot_logs.last_seq
+
+    async def events():
+        seq = since
+        while not await request.is_disconnected():
+            if await bot_logs.wait(seq, timeout=15):
+                for event in bot_logs.since(seq):
+                    seq = event.seq
+                    yield f"id: {seq}\ndata: {json.dumps(event.to_dict(), ensure_ascii=False)}\n\n"
+            else:
+                # Комментарий SSE, чтобы прокси не закрывали простаивающее соединение
+                yield ": ping\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/api/auto-reply/stats")
-async def get_auto_reply_stats():
-    """Получить статистику автоответов"""
-    if not bot_instance:
+async def get_auto_reply_stats(account: Optional[str] = None):
+    """Получить статистику автоответов аккаунта"""
+    bot = _get_bot(account)
+    if not bot:
         return JSONResponse({"status": "error", "message": "Бот не запущен"})
     
     try:
-        # Подсчитываем статистику из логов
-        auto_reply_logs = [log for log in bot_logs if "автоответ" in log["message"].lower()]
-        skip_logs = [log for log in bot_logs if "пропустить" in log["message"].lower()]
-        sent_logs = [log for log in bot_logs if "автоответ отправлен" in log["message"].lower()]
-        
+        # Счетчики ведутся журналом событий при записи, отдельно по каждому аккаунту
+        name = bot.account.name
+        sent = bot_logs.kind_stats(EventKind.AUTO_REPLY_SENT, account=name)
         stats = {
-            "total_auto_replies": len(auto_reply_logs),
-            "skipped_messages": len(skip_logs),
-            "sent_messages": len(sent_logs),
-            "active_chats": len(bot_instance.get_auto_reply_chats()),
-            "recent_activity": auto_reply_logs[-5:] if auto_reply_logs else []
+            "account": name,
+            "total_auto_replies": bot_logs.count(EventKind.AUTO_REPLY_RECEIVED, account=name),
+            "skipped_messages": bot_logs.count(EventKind.AUTO_REPLY_SKIPPED, account=name),
+            "sent_messages": sent["count"],
+            "errors": bot_logs.count(EventKind.AUTO_REPLY_ERROR, account=name),
+            "reply_latency_avg_ms": sent["latency_avg_ms"],
+            "reply_tokens_total": sent["tokens_total"],
+            "active_chats": len(bot.get_auto_reply_chats()),
+            # Входящие сообщения, отсеянные фильтром события и отброшенные в обработчике
+            "filtered_events": metrics.telegram_events.get(account=name, handler="auto_reply", outcome="filtered"),
+            "dropped_events": metrics.telegram_events.get(account=name, handler="auto_reply", outcome="dropped"),
+            "recent_activity": [
+                event.to_dict() for event in bot_logs.recent(5, kinds=AUTO_REPLY_KINDS, account=name)
+            ]
         }
         
         return JSONResponse({"status": "success", "stats": stats})
     except Exception as e:
         return JSONResponse({"status": "error", "message": str(e)})
 
+@app.get("/api/events/stats")
+async def get_event_stats():
+    """Счетчики журнала событий по типам и уровням"""
+    return JSONResponse({"status": "success", "stats": bot_logs.get_stats()})
+
+@app.get("/api/traces")
+async def get_traces(limit: int = 50):
+    """Последние трассы команд и автоответов с длительностью этапов"""
+    tracer = get_tracer()
+    return JSONResponse({"status": "success", "traces": tracer.recent(limit), "stats": tracer.get_stats()})
+
+@app.get("/api/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """Все этапы одной трассы"""
+    trace = get_tracer().get(trace_id)
+    if trace is None:
+        return JSONResponse({"status": "error", "message": "Трасса не найдена"})
+    return JSONResponse({"status": "success", "trace": trace})
+
 @app.post("/api/settings")
 async def update_settings(request: Request):
     """Обновить настройки бота"""
@@ -254,13 +407,14 @@ async def get_settings():
 # === API для управления автоответами ===
 
 @app.get("/api/auto-reply/chats")
-async def get_auto_reply_chats():
+async def get_auto_reply_chats(account: Optional[str] = None):
     """Получить список чатов с автоответом"""
-    if not bot_instance:
+    bot = _get_bot(account)
+    if not bot:
         return JSONResponse({"status": "error", "message": "Бот не запущен"})
     
     try:
-        chats = bot_instance.get_auto_reply_chats()
+        chats = bot.get_auto_reply_chats()
         chats_list = [
             {
                 "chat_id": chat_id,
@@ -275,22 +429,30 @@ async def get_auto_reply_chats():
         return JSONResponse({"status": "error", "message": str(e)})
 
 @app.get("/api/dialogs")
-async def get_dialogs():
-    """Получить список всех диалогов пользователя"""
-    if not bot_instance:
+async def get_dialogs(cursor: Optional[str] = None, limit: int = 50, q: str = "",
+                      type: Optional[str] = None, refresh: bool = False, account: Optional[str] = None):
+    """Страница диалогов пользователя (курсор - next_cursor предыдущей страницы)"""
+    bot = _get_bot(account)
+    if not bot:
         return JSONResponse({"status": "error", "message": "Бот не запущен"})
     
     try:
-        dialogs = await bot_instance.get_dialogs_list(limit=100)
-        return JSONResponse({"status": "success", "dialogs": dialogs})
+        if refresh:
+            # Перезагрузка идет в фоне, ответ - из текущего списка
+            bot.dialogs.request_refresh()
+        page = await bot.get_dialogs_list(
+            cursor=cursor, limit=max(1, min(limit, 200)), query=q, chat_type=type or None
+        )
+        return JSONResponse({"status": "success", **page})
     except Exception as e:
         add_log("ERROR", f"Ошибка получения диалогов: {str(e)}")
         return JSONResponse({"status": "error", "message": str(e)})
 
 @app.post("/api/auto-reply/chats/add")
-async def add_auto_reply_chat(request: Request):
+async def add_auto_reply_chat(request: Request, account: Optional[str] = None):
     """Добавить чат для автоответа"""
-    if not bot_instance:
+    bot = _get_bot(account)
+    if not bot:
         return JSONResponse({"status": "error", "message": "Бот не запущен"})
     
     try:
@@ -301,7 +463,7 @@ async def add_auto_reply_chat(request: Request):
         if chat_id == 0:
             return JSONResponse({"status": "error", "message": "Неверный ID чата"})
         
-        success = bot_instance.add_auto_reply_chat(chat_id, chat_name)
+        success = bot.add_auto_reply_chat(chat_id, chat_name)
         
         if success:
             add_log("INFO", f"Добавлен чат для автоответа: {chat_name}")
@@ -314,16 +476,17 @@ async def add_auto_reply_chat(request: Request):
         return JSONResponse({"status": "error", "message": str(e)})
 
 @app.post("/api/auto-reply/chats/remove")
-async def remove_auto_reply_chat(request: Request):
+async def remove_auto_reply_chat(request: Request, account: Optional[str] = None):
     """Удалить чат из автоответа"""
-    if not bot_instance:
+    bot = _get_bot(account)
+    if not bot:
         return JSONResponse({"status": "error", "message": "Бот не запущен"})
     
     try:
         data = await request.json()
         chat_id = int(data.get("chat_id", 0))
         
-        success = bot_instance.remove_auto_reply_chat(chat_id)
+        success = bot.remove_auto_reply_chat(chat_id)
         
         if success:
             add_log("INFO", f"Удален чат из автоответа: {chat_id}")
@@ -336,19 +499,20 @@ async def remove_auto_reply_chat(request: Request):
         return JSONResponse({"status": "error", "message": str(e)})
 
 @app.post("/api/auto-reply/chats/toggle")
-async def toggle_auto_reply_chat(request: Request):
+async def toggle_auto_reply_chat(request: Request, account: Optional[str] = None):
     """Переключить статус автоответа для чата"""
-    if not bot_instance:
+    bot = _get_bot(account)
+    if not bot:
         return JSONResponse({"status": "error", "message": "Бот не запущен"})
     
     try:
         data = await request.json()
         chat_id = int(data.get("chat_id", 0))
         
-        success = bot_instance.toggle_auto_reply_chat(chat_id)
+        success = bot.toggle_auto_reply_chat(chat_id)
         
         if success:
-            chats = bot_instance.get_auto_reply_chats()
+            chats = bot.get_auto_reply_chats()
             status = "включен" if chats[chat_id]["enabled"] else "выключен"
             add_log("INFO", f"Автоответ для чата {chat_id}: {status}")
             return JSONResponse({"status": "success", "message": f"Автоответ {status}"})
@@ -360,27 +524,29 @@ async def toggle_auto_reply_chat(request: Request):
         return JSONResponse({"status": "error", "message": str(e)})
 
 @app.get("/api/auto-reply/settings")
-async def get_auto_reply_settings():
+async def get_auto_reply_settings(account: Optional[str] = None):
     """Получить настройки автоответа"""
-    if not bot_instance:
+    bot = _get_bot(account)
+    if not bot:
         return JSONResponse({"status": "error", "message": "Бот не запущен"})
     
     try:
-        settings = bot_instance.get_auto_reply_settings()
+        settings = bot.get_auto_reply_settings()
         return JSONResponse({"status": "success", "settings": settings})
     except Exception as e:
         return JSONResponse({"status": "error", "message": str(e)})
 
 @app.post("/api/auto-reply/settings")
-async def update_auto_reply_settings(request: Request):
+async def update_auto_reply_settings(request: Request, account: Optional[str] = None):
     """Обновить настройки автоответа"""
-    if not bot_instance:
+    bot = _get_bot(account)
+    if not bot:
         return JSONResponse({"status": "error", "message": "Бот не запущен"})
     
     try:
         data = await request.json()
         
-        success = bot_instance.update_auto_reply_settings(data)
+        success = bot.update_auto_reply_settings(data)
         
         if success:
             add_log("INFO", "Настройки автоответа обновлены")
@@ -392,6 +558,19 @@ async def update_auto_reply_settings(request: Request):
         add_log("ERROR", f"Ошибка обновления настроек автоответа: {str(e)}")
         return JSONResponse({"status": "error", "message": str(e)})
 
+@app.on_event("startup")
+async def start_balance_refresh():
+    """Запустить фоновое обновление баланса"""
+    get_balance_service().start()
+
+@app.on_event("shutdown")
+async def close_http_pool():
+    """Остановить ботов и закрыть общий пул соединений при остановке сервера"""
+    await bot_host.stop_all()
+    await get_balance_service().stop()
+    await http_pool.aclose()
+    close_state_stores()
+
 def run_web_interface(host: str = "127.0.0.1", port: int = 8000):
     """Запуск веб интерфейса"""
     print(f"🌐 Запуск веб интерфейса на http://{host}:{port}")
@@ -0,0 +1,56 @@
+"""
+Тесты разбора команд @gpt
+"""
+
+import pytest
+
+from pl.commands import ParsedCommand, PROMPT_TEMPLATES, parse_command
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("@gpt как дела?", ParsedCommand("general", None, False, True, "general", "как дела?")),
+    ("@gpt rewrite привет", ParsedCommand("general", None, False, True, "rewrite", "привет")),
+    ("@GPT explain что такое DNS", ParsedCommand("general", None, False, True, "explain", "что такое DNS")),
+    ("@gpt-hide fix я не знаю", ParsedCommand("hide", None, True, True, "fix", "я не знаю")),
+    ("@gpt-nocache short текст", ParsedCommand("general", None, False, False, "short", "текст")),
+    ("@gpt-context15 о чем мы?", ParsedCommand("context", 15, False, True, "general", "о чем мы?")),
+    ("@gpt-context50-hide коротко", ParsedCommand("context_hide", 50, True, True, "general", "коротко")),
+    ("@gpt-context10-nocache short итоги", ParsedCommand("context", 10, False, False, "short", "итоги")),
+    ("@gpt-hide-nocache explain ну", ParsedCommand("hide", None, True, False, "explain", "ну")),
+    ("@gpt rewrite", ParsedCommand("general", None, False, True, "general", "rewrite")),
+    ("  @gpt   fix  ашибка  ", ParsedCommand("general", None, False, True, "fix", "ашибка")),
+    ("@gpt Translate это", ParsedCommand("general", None, False, True, "general", "Translate это")),
+    ("@gpt\nмного\nстрок", ParsedCommand("general", None, False, True, "general", "много\nстрок")),
+])
+def test_parse_command(text, expected):
+    assert parse_command(text) == expected
+
+
+def test_prompt_uses_template():
+    command = parse_command("@gpt translate Hello")
+    assert command.prompt == PROMPT_TEMPLATES["translate"] + "Hello"
+    assert command.text == "translate Hello"
+    assert command.cacheable
+    assert not parse_command("@gpt-nocache translate Hello").cacheable
+    assert not parse_command("@gpt просто вопрос").cacheable
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("@gpt-hide-context5 ответь", ParsedCommand("context_hide", 5, True, True, "general", "ответь")),
+    ("@gpt-nocache-hide explain что", ParsedCommand("hide", None, True, False, "explain", "что")),
+    ("@gpt-nocache-context5-hide ответь", ParsedCommand("context_hide", 5, True, False, "general", "ответь")),
+    ("@GPT-HIDE-NOCACHE-CONTEXT5 ответь", ParsedCommand("context_hide", 5, True, False, "general", "ответь")),
+])
+def test_flags_in_any_order(text, expected):
+    assert parse_command(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "привет", "", "👍", "@username глянь", "@gptbot это не команда", "@gpt", "@gpt-hide",
+    "@gpt-hide-hide ответь",
+    "@gpt-context5-context7 ответь",
+    "@gpt-nocache-hide-nocache ответь",
+    "@gpt-unknown ответь",
+])
+def test_not_a_command(text):
+    assert parse_command(text) is None
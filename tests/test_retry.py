@@ -0,0 +1,86 @@
+"""
+Тесты circuit breaker и исполнителя повторов
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from pl.retry import RetryExecutor, RetryPolicy, CircuitBreaker, CircuitOpenError
+
+
+def _half_open_executor() -> RetryExecutor:
+    """Исполнитель с breaker, который сразу пропускает пробный запрос"""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    breaker.opened_at -= 1
+    return RetryExecutor(policy=RetryPolicy(max_attempts=1), breaker=breaker)
+
+
+def _ok_response() -> httpx.Response:
+    return httpx.Response(200, request=httpx.Request("POST", "http://test"))
+
+
+def test_cancelled_probe_releases_breaker():
+    executor = _half_open_executor()
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def main():
+        task = asyncio.ensure_future(executor.acall(hang))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        async def send():
+            return _ok_response()
+
+        return await executor.acall(send)
+
+    assert asyncio.run(main()).status_code == 200
+    assert executor.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_probe_failing_outside_http_releases_breaker():
+    executor = _half_open_executor()
+
+    def broken():
+        raise ValueError("ошибка сборки запроса")
+
+    with pytest.raises(ValueError):
+        executor.call(broken)
+
+    assert executor.call(_ok_response).status_code == 200
+    assert executor.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_only_one_probe_in_flight():
+    executor = _half_open_executor()
+    assert executor.breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        executor.call(_ok_response)
+
+
+def test_cancelled_regular_request_keeps_foreign_probe():
+    executor = _half_open_executor()
+    executor.breaker.state = CircuitBreaker.CLOSED
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def main():
+        # Обычный запрос ушел, пока breaker был замкнут
+        task = asyncio.ensure_future(executor.acall(hang))
+        await asyncio.sleep(0)
+        # Затем breaker разомкнулся, и другой запрос взял пробу
+        executor.breaker.state = CircuitBreaker.OPEN
+        assert executor.breaker.acquire() == (True, True)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert executor.breaker.acquire() == (False, False)